@@ -1,39 +1,130 @@
 import os
+import functools
 import uuid
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from werkzeug.utils import secure_filename
-from models import store, Lagu, UserSession
+import hashlib
+from itertools import islice
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response
+from markupsafe import Markup
+import metrics
+from images import simpan_upload, pilih_varian, versi_varian
+from audio import simpan_audio, allowed_audio, rentang, header_stream, etag_audio, RentangFile, \
+    AudioTidakValid, STREAM_CHUNK
+from models import store, Lagu, UserSession, DatabaseManager, DoublyLinkedList, LibrarySnapshot, ConnectionPool, \
+    SEARCH_PAGE_SIZE, LIBRARY_PAGE_SIZE, SHUFFLE_RECENT, format_durasi
 
 app = Flask(__name__)
 app.secret_key = 'kunci_rahasia_sqlite_remusic'
 
+# Instrumentasi (nonaktif kecuali REMUSIC_METRICS=1 atau dinyalakan dari /admin/metrics)
+metrics.daftarkan(DatabaseManager)
+metrics.daftarkan(DoublyLinkedList)
+metrics.daftarkan(LibrarySnapshot)
+metrics.daftarkan_pool(ConnectionPool)
+metrics.pasang(app)
+
 app.config['UPLOAD_FOLDER'] = 'static/images'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+# Di luar static: audio hanya bisa diambil lewat /stream (harus login)
+app.config['AUDIO_FOLDER'] = 'media/audio'
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(app.config['AUDIO_FOLDER'], exist_ok=True)
+
+# SSE /events membuat tiap browser memegang satu koneksi terbuka. Server WSGI
+# memakai satu thread/worker per koneksi, jadi default hanya aktif di mode
+# ASGI (asgi.py); REMUSIC_SSE=1 menyalakannya di server WSGI.
+app.config['SSE_ENABLED'] = os.environ.get('REMUSIC_SSE') == '1'
+
+ADMIN_PAGE_SIZE = 100
+STATIC_MAX_AGE = 365 * 24 * 3600
+API_QUEUE_PREVIEW = 10
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+@app.template_filter('cover')
+def cover_url(filename, variant='thumb'):
+    # URL gambar di static/images, memakai varian kecil (WebP) jika sudah tersedia
+    return url_for('static', filename='images/' + pilih_varian(app.config['UPLOAD_FOLDER'], filename, variant))
+
+# --- HTTP CACHE ---
+_static_versions = {}
+_grid_cache = {}
+
+@app.url_defaults
+def versi_static(endpoint, values):
+    # url_for('static', ...) diberi ?v=<mtime> supaya bisa di-cache jangka panjang
+    if endpoint != 'static' or 'v' in values or not values.get('filename'):
+        return
+    filename = values['filename']
+    v = _static_versions.get(filename)
+    if v is None:
+        try:
+            v = format(int(os.stat(os.path.join(app.static_folder, filename)).st_mtime), 'x')
+        except OSError:
+            return
+        _static_versions[filename] = v
+    values['v'] = v
+
+@app.after_request
+def cache_static(response):
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code == 200:
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
+def etag_halaman(user, *keys):
+    """ETag dari versi data di `keys` + state user yang tampil di layout.
+
+    None jika ada flash message (halaman harus dirender ulang)."""
+    if session.get('_flashes'):
+        return None
+    state = (user.email, user.username, user.profile_pic, user.active_playlist_id,
+             user.current_song.id if user.current_song else None)
+    # versi_varian: URL cover berubah ke WebP setelah varian selesai dibuat
+    raw = repr((store.versi(*keys), versi_varian(), state, request.full_path))
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+def not_modified(etag):
+    if etag and etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+def dengan_etag(html, etag):
+    response = make_response(html)
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def grid_halaman_pertama():
+    # Grid halaman pertama sama untuk semua user; dirender sekali per versi
+    # library dan per versi varian cover (URL cover dipilih saat render)
+    key = (store.versi('library'), versi_varian())
+    cached = _grid_cache.get('grid')
+    if not cached or cached[0] != key:
+        songs, next_cursor = store.library.halaman(None, LIBRARY_PAGE_SIZE)
+        cached = (key, songs, next_cursor, Markup(render_template('_song_grid.html', songs=songs)))
+        _grid_cache['grid'] = cached
+    return cached[1:]
+
+def muat_user(email):
+    # UserSession aktif; dibuat dari profil user jika belum ada
+    user = store.active_sessions.get(email)
+    if user is None:
+        data = store.get_user(email)
+        if not data:
+            return None
+        user = store.active_sessions.setdefault(
+            email, UserSession(data['username'], email, data['role'], data['profile_pic']))
+    return user
+
 def get_current_user():
     if 'email' in session:
-        email = session['email']
-        if email not in store.active_sessions:
-            conn = store.get_connection()
-            c = conn.cursor()
-            try:
-                c.execute("SELECT username, role, profile_pic FROM users WHERE email=?", (email,))
-            except:
-                 c.execute("SELECT username, role FROM users WHERE email=?", (email,))
-            data = c.fetchone()
-            conn.close()
-            if data:
-                p_pic = data['profile_pic'] if 'profile_pic' in data.keys() else None
-                store.active_sessions[email] = UserSession(data['username'], email, data['role'], p_pic)
-            else:
-                return None
-        return store.active_sessions[email]
+        return muat_user(session['email'])
     return None
 
 @app.route('/')
@@ -51,8 +142,8 @@ def login():
         if user_data:
             session['email'] = user_data['email']
             session['role'] = user_data['role']
-            if email not in store.active_sessions:
-                store.active_sessions[email] = UserSession(user_data['username'], email, user_data['role'])
+            store.active_sessions.setdefault(email, UserSession(user_data['username'], email, user_data['role'],
+                                                                user_data['profile_pic']))
             if user_data['role'] == 'admin':
                 return redirect(url_for('admin_dashboard'))
             return redirect(url_for('main'))
@@ -83,13 +174,33 @@ def logout():
 def main():
     user = get_current_user()
     if not user: return redirect(url_for('login'))
-    all_songs = store.library.get_all()
+    etag = etag_halaman(user, 'library', f'playlists:{user.email}')
+    cached = not_modified(etag)
+    if cached: return cached
     search_query = request.args.get('q')
+    page = max(request.args.get('page', 1, type=int), 1)
+    total_pages = 1
+    next_cursor = None
+    grid_html = None
     if search_query:
-        search_query = search_query.lower()
-        all_songs = [s for s in all_songs if search_query in s.judul.lower() or search_query in s.artis.lower()]
+        all_songs, total = store.search_songs(search_query, page)
+        total_pages = max((total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE, 1)
+    else:
+        # Halaman pertama saja, sisanya diambil lewat /api/songs (infinite scroll)
+        all_songs, next_cursor, grid_html = grid_halaman_pertama()
     playlists = store.get_user_playlists(user.email)
-    return render_template('main.html', user=user, songs=all_songs, playlists=playlists)
+    return dengan_etag(render_template('main.html', user=user, songs=all_songs, playlists=playlists,
+                                       page=page, total_pages=total_pages, next_cursor=next_cursor,
+                                       grid_html=grid_html), etag)
+
+@app.route('/api/songs')
+def api_songs():
+    user = get_current_user()
+    if not user: return jsonify(error='Silakan login terlebih dahulu'), 401
+    limit = min(max(request.args.get('limit', LIBRARY_PAGE_SIZE, type=int), 1), 200)
+    songs, next_cursor = store.library.halaman(request.args.get('after'), limit)
+    return jsonify(songs=[dict(s.to_dict(), cover=cover_url(s.image) if s.image else None) for s in songs],
+                   next=next_cursor)
 
 @app.route('/profile')
 def profile():
@@ -104,8 +215,7 @@ def update_avatar():
     if 'avatar_file' in request.files and request.files['avatar_file'].filename != '':
         file = request.files['avatar_file']
         if file and allowed_file(file.filename):
-            filename = secure_filename(f"avatar_{user.username}_{file.filename}")
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            filename = simpan_upload(file, app.config['UPLOAD_FOLDER'])
             store.update_user_avatar(user.email, filename)
             flash("Foto profil berhasil diupload!")
     elif 'avatar_preset' in request.form:
@@ -114,143 +224,333 @@ def update_avatar():
         flash("Avatar berhasil diganti!")
     return redirect(url_for('profile'))
 
-# --- LOGIKA PLAY DIPERBARUI ---
-@app.route('/play/<song_id>')
-def play_song(song_id):
-    user = get_current_user()
-    if not user: return redirect(url_for('login'))
-
+# --- LOGIKA PEMUTAR ---
+# Dipakai oleh route biasa (redirect) dan API JSON (/api/...).
+
+def terkunci(fn):
+    # Satu request per user yang mengubah/membaca queue & history pada satu waktu
+    @functools.wraps(fn)
+    def wrapper(user, *args, **kwargs):
+        with user.lock:
+            return fn(user, *args, **kwargs)
+    return wrapper
+
+def mengubah(fn):
+    # Seperti terkunci, lalu session ditandai berubah dan state baru dikirim ke
+    # tab/perangkat lain milik user (SSE /events) sebelum lock dilepas, jadi
+    # urutan event = urutan perubahan
+    @functools.wraps(fn)
+    def wrapper(user, *args, **kwargs):
+        with user.lock:
+            hasil = fn(user, *args, **kwargs)
+            simpan_perubahan(user)
+            return hasil
+    return wrapper
+
+def simpan_perubahan(user):
+    # Dipanggil di bawah user.lock setelah queue/history/lagu aktif berubah.
+    # Hanya jalur ini yang menandai session untuk ditulis ke backend (request
+    # baca tidak menimpa state dari worker lain dengan salinan lama).
+    store.active_sessions.tandai(user.email, user)
+    umumkan(user)
+
+def umumkan(user):
+    if store.event_hub.punya_pelanggan(user.email):
+        store.event_hub.terbitkan(user.email, 'player', state_pemutar(user))
+
+def mulai_putar(user, lagu):
+    user.current_song = lagu
+    store.play_log.catat(user.email, lagu.id)
+
+@mengubah
+def putar_lagu(user, song_id, playlist_id=None):
     node = store.library.cari(song_id)
-    if node:
-        # Masukkan lagu saat ini ke history sebelum diganti
-        if user.current_song:
-            user.history.push(user.current_song)
-        
-        user.current_song = node.lagu
-        
-        # CEK CONTEXT: Apakah play dari playlist atau halaman utama?
-        playlist_id = request.args.get('playlist_id')
-        if playlist_id:
-            user.active_playlist_id = int(playlist_id) # Set context Playlist
-        else:
-            user.active_playlist_id = None # Set context Umum (Library)
+    if not node:
+        return False
+    # Masukkan lagu saat ini ke history sebelum diganti
+    if user.current_song:
+        user.history.push(user.current_song)
     
-    return redirect(request.referrer or url_for('main'))
-
-# --- LOGIKA NEXT DIPERBARUI (QUEUE -> PLAYLIST -> GENRE) ---
-@app.route('/next')
-def next_song():
-    user = get_current_user()
-    if not user: return redirect(url_for('login'))
+    mulai_putar(user, node.lagu)
+    
+    # CEK CONTEXT: Apakah play dari playlist atau halaman utama?
+    if playlist_id:
+        user.active_playlist_id = int(playlist_id) # Set context Playlist
+    else:
+        user.active_playlist_id = None # Set context Umum (Library)
+    return True
 
+# URUTAN NEXT: QUEUE -> PLAYLIST -> GENRE -> URUTAN LIBRARY
+@mengubah
+def lagu_berikutnya(user):
     # 1. PRIORITAS UTAMA: Cek Queue Manual
     next_song_obj = user.queue.dequeue()
     if next_song_obj:
         if user.current_song:
             user.history.push(user.current_song)
-        user.current_song = next_song_obj
-        return redirect(request.referrer or url_for('main'))
+        mulai_putar(user, next_song_obj)
+        return
 
     # Jika Queue Kosong, Cek Context
-    if user.current_song:
+    if not user.current_song:
+        return
         
-        # 2. KONTEKS PLAYLIST: Cari lagu berikutnya di playlist
-        if user.active_playlist_id:
-            playlist_songs = store.get_playlist_songs(user.active_playlist_id)
-            # Cari index lagu saat ini di playlist
-            current_index = -1
-            for i, s in enumerate(playlist_songs):
-                if s.id == user.current_song.id:
-                    current_index = i
-                    break
-            
-            # Jika ketemu dan bukan lagu terakhir
-            if current_index != -1 and current_index < len(playlist_songs) - 1:
-                user.history.push(user.current_song)
-                user.current_song = playlist_songs[current_index + 1]
-            else:
-                # Jika sudah lagu terakhir di playlist, bisa stop atau loop (disini kita stop/tetap)
-                pass 
+    # 2. KONTEKS PLAYLIST: Cari lagu berikutnya di playlist
+    if user.active_playlist_id:
+        next_in_playlist = store.playlist_neighbor(user.active_playlist_id, user.current_song.id, 1)
 
-        # 3. KONTEKS UMUM/LIBRARY: Cari lagu MIRIP (Genre sama)
+        # Jika ketemu dan bukan lagu terakhir. Jika sudah lagu terakhir di
+        # playlist, bisa stop atau loop (disini kita stop/tetap)
+        if next_in_playlist:
+            user.history.push(user.current_song)
+            mulai_putar(user, next_in_playlist)
+
+    # 3. KONTEKS UMUM/LIBRARY: Cari lagu MIRIP (sering satu playlist, lalu genre sama)
+    else:
+        recent = [s.id for s in islice(user.history, SHUFFLE_RECENT)]
+        similar_song = (store.get_similar_song(user.current_song.id, set(recent))
+                        or store.get_random_song_by_genre(user.current_song.genre, user.current_song.id, recent))
+        if similar_song:
+            user.history.push(user.current_song)
+            mulai_putar(user, similar_song)
         else:
-            similar_song = store.get_random_song_by_genre(user.current_song.genre, user.current_song.id)
-            if similar_song:
+            # Jika tidak ada lagu genre sama, fallback ke urutan library biasa (linked list)
+            next_in_library = store.library.berikutnya(user.current_song.id)
+            if next_in_library:
                 user.history.push(user.current_song)
-                user.current_song = similar_song
-            else:
-                # Jika tidak ada lagu genre sama, fallback ke urutan library biasa (linked list)
-                current_node = store.library.cari(user.current_song.id)
-                if current_node and current_node.next:
-                    user.history.push(user.current_song)
-                    user.current_song = current_node.next.lagu
-
-    return redirect(request.referrer or url_for('main'))
-
-# --- LOGIKA PREV DIPERBARUI ---
-@app.route('/prev')
-def prev_song():
-    user = get_current_user()
-    if not user: return redirect(url_for('login'))
+                mulai_putar(user, next_in_library)
 
+@mengubah
+def lagu_sebelumnya(user):
     # 1. PRIORITAS: Cek History (Lagu yang baru saja diputar)
     prev_song_obj = user.history.pop()
     if prev_song_obj:
-        user.current_song = prev_song_obj
+        mulai_putar(user, prev_song_obj)
     
     # 2. Jika History Kosong tapi sedang di Playlist
     elif user.current_song and user.active_playlist_id:
-         playlist_songs = store.get_playlist_songs(user.active_playlist_id)
-         current_index = -1
-         for i, s in enumerate(playlist_songs):
-            if s.id == user.current_song.id:
-                current_index = i
-                break
-         
-         if current_index > 0:
-             user.current_song = playlist_songs[current_index - 1]
+         prev_in_playlist = store.playlist_neighbor(user.active_playlist_id, user.current_song.id, -1)
+         if prev_in_playlist:
+             mulai_putar(user, prev_in_playlist)
+
+@mengubah
+def tambah_antrian(user, song_id):
+    node = store.library.cari(song_id)
+    if node:
+        user.queue.enqueue(node.lagu)
+    return node is not None
+
+def ringkas_lagu(lagu):
+    if not lagu:
+        return None
+    return {'id': lagu.id, 'judul': lagu.judul, 'artis': lagu.artis, 'durasi': lagu.durasi,
+            'cover': cover_url(lagu.image) if lagu.image else None,
+            'stream': url_for('stream', song_id=lagu.id) if lagu.audio else None}
+
+@terkunci
+def state_pemutar(user):
+    # Respons ringkas untuk API pemutar: lagu aktif, awal antrian, puncak history
+    return {'current': ringkas_lagu(user.current_song),
+            'queue': [ringkas_lagu(s) for s in islice(user.queue, API_QUEUE_PREVIEW)],
+            'queue_size': len(user.queue),
+            'history_head': ringkas_lagu(user.history.peek()),
+            'playlist_id': user.active_playlist_id}
 
+@app.route('/play/<song_id>')
+def play_song(song_id):
+    user = get_current_user()
+    if not user: return redirect(url_for('login'))
+    putar_lagu(user, song_id, request.args.get('playlist_id'))
     return redirect(request.referrer or url_for('main'))
-# ------------------------------------------------
 
-@app.route('/queue')
-def queue_view():
+@app.route('/next')
+def next_song():
+    user = get_current_user()
+    if not user: return redirect(url_for('login'))
+    lagu_berikutnya(user)
+    return redirect(request.referrer or url_for('main'))
+
+@app.route('/prev')
+def prev_song():
     user = get_current_user()
     if not user: return redirect(url_for('login'))
-    return render_template('queue.html', user=user, queue=user.queue.get_all())
+    lagu_sebelumnya(user)
+    return redirect(request.referrer or url_for('main'))
 
 @app.route('/add_to_queue/<song_id>')
 def add_to_queue(song_id):
     user = get_current_user()
-    node = store.library.cari(song_id)
-    if node:
-        user.queue.enqueue(node.lagu)
+    if not user: return redirect(url_for('login'))
+    tambah_antrian(user, song_id)
     return redirect(request.referrer or url_for('main'))
 
+# --- STREAMING AUDIO ---
+@app.route('/stream/<song_id>', methods=['GET', 'HEAD'])
+def stream(song_id):
+    if 'email' not in session:
+        return app.response_class(status=401)
+    node = store.library.cari(song_id)
+    if not node or not node.lagu.audio:
+        return app.response_class(status=404)
+    filename = node.lagu.audio
+    path = os.path.join(app.config['AUDIO_FOLDER'], filename)
+    try:
+        ukuran = os.stat(path).st_size
+    except OSError:
+        return app.response_class(status=404)
+    etag = etag_audio(filename)
+    if 'Range' not in request.headers and etag in request.if_none_match:
+        return app.response_class(status=304, headers=[('ETag', f'"{etag}"')])
+    status, awal, panjang = rentang(request.headers.get('Range'), request.headers.get('If-Range'), etag, ukuran)
+    headers = header_stream(filename, status, awal, panjang, ukuran)
+    if status == 416 or request.method == 'HEAD':
+        body = []
+    elif 'wsgi.file_wrapper' in request.environ:
+        # Server (gunicorn, uWSGI, mod_wsgi) mengirim dengan sendfile dari posisi
+        # file saat ini sebanyak Content-Length
+        f = open(path, 'rb')
+        f.seek(awal)
+        body = request.environ['wsgi.file_wrapper'](f, STREAM_CHUNK)
+    else:
+        body = RentangFile(path, awal, panjang)
+    return app.response_class(body, status=status, headers=headers, direct_passthrough=True)
+
+# --- SSE: STATE PEMUTAR REAL-TIME (lihat event_hub.py) ---
+def respons_sse(user):
+    if not app.config['SSE_ENABLED']:
+        return app.response_class(status=404)
+    # Langganan dibuat di bawah lock user: tidak ada perubahan yang terlewat
+    # antara state awal dan event berikutnya
+    with user.lock:
+        pelanggan = store.event_hub.langganan(user.email, 'player', state_pemutar(user))
+    return app.response_class(pelanggan, mimetype='text/event-stream', direct_passthrough=True,
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/events')
+def events():
+    user = get_current_user()
+    if not user: return app.response_class(status=401)
+    return respons_sse(user)
+
+# --- API PEMUTAR (JSON, tanpa redirect/render ulang halaman) ---
+def api_user():
+    user = get_current_user()
+    if not user:
+        return None, (jsonify(error='Silakan login terlebih dahulu'), 401)
+    return user, None
+
+@app.route('/api/player')
+def api_player():
+    user, error = api_user()
+    if error: return error
+    return jsonify(state_pemutar(user))
+
+@app.route('/api/play/<song_id>', methods=['POST'])
+def api_play(song_id):
+    user, error = api_user()
+    if error: return error
+    if not putar_lagu(user, song_id, request.args.get('playlist_id', type=int)):
+        return jsonify(error='Lagu tidak ditemukan'), 404
+    return jsonify(state_pemutar(user))
+
+@app.route('/api/next', methods=['POST'])
+def api_next():
+    user, error = api_user()
+    if error: return error
+    lagu_berikutnya(user)
+    return jsonify(state_pemutar(user))
+
+@app.route('/api/prev', methods=['POST'])
+def api_prev():
+    user, error = api_user()
+    if error: return error
+    lagu_sebelumnya(user)
+    return jsonify(state_pemutar(user))
+
+@app.route('/api/queue/<song_id>', methods=['POST'])
+def api_add_to_queue(song_id):
+    user, error = api_user()
+    if error: return error
+    if not tambah_antrian(user, song_id):
+        return jsonify(error='Lagu tidak ditemukan'), 404
+    return jsonify(state_pemutar(user))
+
+# Statistik dari tabel rollup (diperbarui berkala, lihat play_log.py)
+@app.route('/api/stats/top')
+def api_top():
+    user, error = api_user()
+    if error: return error
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    return jsonify(songs=[dict(ringkas_lagu(lagu), plays=plays) for lagu, plays in store.most_played(limit)],
+                   genres=[{'genre': genre, 'plays': plays} for genre, plays in store.most_played_genres(limit)])
+
+@app.route('/api/stats/recent')
+def api_recent():
+    user, error = api_user()
+    if error: return error
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify(songs=[dict(ringkas_lagu(lagu), last_played=last_played, plays=plays)
+                          for lagu, last_played, plays in store.recently_played(user.email, limit)])
+# ------------------------------------------------
+
+@app.route('/queue')
+def queue_view():
+    user = get_current_user()
+    if not user: return redirect(url_for('login'))
+    with user.lock:
+        queue = list(user.queue)
+    return render_template('queue.html', user=user, queue=queue)
+
+@app.route('/queue/remove/<int:pos>')
+def remove_from_queue(pos):
+    user = get_current_user()
+    if not user: return redirect(url_for('login'))
+    with user.lock:
+        user.queue.hapus_posisi(pos)
+        simpan_perubahan(user)
+    return redirect(url_for('queue_view'))
+
+@app.route('/queue/move/<int:pos>/<int:to>')
+def move_in_queue(pos, to):
+    user = get_current_user()
+    if not user: return redirect(url_for('login'))
+    with user.lock:
+        user.queue.pindah(pos, to)
+        simpan_perubahan(user)
+    return redirect(url_for('queue_view'))
+
 @app.route('/history')
 def history_view():
     user = get_current_user()
     if not user: return redirect(url_for('login'))
-    return render_template('history.html', user=user, history=user.history.get_all())
+    with user.lock:
+        history = list(user.history)
+    return render_template('history.html', user=user, history=history)
 
 @app.route('/playlists')
 def my_playlists():
     user = get_current_user()
     if not user: return redirect(url_for('login'))
+    etag = etag_halaman(user, f'playlists:{user.email}')
+    cached = not_modified(etag)
+    if cached: return cached
     search_query = request.args.get('q')
     playlists = store.get_user_playlists(user.email, search_query)
-    return render_template('playlists.html', user=user, playlists=playlists)
+    return dengan_etag(render_template('playlists.html', user=user, playlists=playlists), etag)
 
 @app.route('/playlist/<int:playlist_id>')
 def playlist_detail(playlist_id):
     user = get_current_user()
     if not user: return redirect(url_for('login'))
+    etag = etag_halaman(user, 'library', f'playlist:{playlist_id}')
+    cached = not_modified(etag)
+    if cached: return cached
     playlist = store.get_playlist_by_id(playlist_id)
     if not playlist:
         flash("Playlist tidak ditemukan!")
         return redirect(url_for('my_playlists'))
     songs = store.get_playlist_songs(playlist_id)
-    return render_template('playlist_detail.html', user=user, playlist=playlist, songs=songs)
+    return dengan_etag(render_template('playlist_detail.html', user=user, playlist=playlist, songs=songs), etag)
 
 @app.route('/playlists/create', methods=['POST'])
 def create_playlist():
@@ -281,8 +581,40 @@ def remove_from_playlist(song_id, playlist_id):
 def admin_dashboard():
     if 'role' not in session or session['role'] != 'admin':
         return redirect(url_for('login'))
-    all_songs = store.library.get_all()
-    return render_template('admin_dashboard.html', songs=all_songs)
+    all_songs, next_cursor = store.library.halaman(request.args.get('after'), ADMIN_PAGE_SIZE)
+    return render_template('admin_dashboard.html', songs=all_songs, next_cursor=next_cursor)
+
+@app.route('/admin/metrics', methods=['GET', 'POST'])
+def admin_metrics():
+    if 'role' not in session or session['role'] != 'admin':
+        return redirect(url_for('login'))
+    if request.method == 'POST':
+        if 'aktif' in request.form:
+            metrics.aktifkan(request.form['aktif'] == '1')
+        if request.form.get('reset') == '1':
+            metrics.reset()
+    # ?format=prometheus (atau Accept: text/plain) untuk format teks Prometheus
+    if request.args.get('format') == 'prometheus' or \
+            request.accept_mimetypes.best_match(['application/json', 'text/plain']) == 'text/plain':
+        return app.response_class(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics.ringkasan())
+
+def simpan_audio_form(durasi_audio=None):
+    # (nama file audio, durasi). Durasi dari file audio jika diupload; lagu
+    # yang sudah punya audio (durasi_audio) tetap memakai durasi file itu,
+    # selain itu dari isian form.
+    file = request.files.get('audio')
+    if file and file.filename != '':
+        if not allowed_audio(file.filename):
+            raise AudioTidakValid("format audio tidak didukung")
+        filename, detik = simpan_audio(file, app.config['AUDIO_FOLDER'])
+        return filename, format_durasi(detik)
+    if durasi_audio:
+        return None, durasi_audio
+    durasi = request.form.get('durasi', '').strip()
+    if not durasi:
+        raise AudioTidakValid("isi durasi atau upload file audio")
+    return None, durasi
 
 @app.route('/admin/add', methods=['GET', 'POST'])
 def add_song():
@@ -295,17 +627,14 @@ def add_song():
             judul = request.form['judul']
             artis = request.form['artis']
             album = "Single" 
-            durasi = request.form['durasi']
             genre = request.form['genre']
+            audio_filename, durasi = simpan_audio_form()
             image_filename = None 
             if 'cover' in request.files:
                 file = request.files['cover']
                 if file and file.filename != '' and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    unique_filename = f"{id}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                    image_filename = unique_filename
-            new_song = Lagu(id, judul, artis, album, durasi, genre)
+                    image_filename = simpan_upload(file, app.config['UPLOAD_FOLDER'])
+            new_song = Lagu(id, judul, artis, album, durasi, genre, audio=audio_filename)
             new_song.image = image_filename 
             store.add_song_db(new_song)
             flash("Lagu berhasil ditambahkan!")
@@ -321,6 +650,13 @@ def delete_song(song_id):
     store.delete_song_db(song_id)
     return redirect(url_for('admin_dashboard'))
 
+@app.route('/admin/resync')
+def resync_library():
+    if 'role' not in session or session['role'] != 'admin': return redirect(url_for('login'))
+    store.resync()
+    flash("Library disinkronkan ulang dari database.")
+    return redirect(url_for('admin_dashboard'))
+
 @app.route('/admin/edit/<song_id>', methods=['GET', 'POST'])
 def edit_song(song_id):
     if 'role' not in session or session['role'] != 'admin': 
@@ -334,16 +670,17 @@ def edit_song(song_id):
         judul = request.form['judul']
         artis = request.form['artis']
         genre = request.form['genre']
-        durasi = request.form['durasi']
+        try:
+            audio_filename, durasi = simpan_audio_form(song.durasi if song.audio else None)
+        except AudioTidakValid as e:
+            flash(f"Gagal menyimpan audio: {e}")
+            return redirect(url_for('edit_song', song_id=song_id))
         image_filename = None
         if 'cover' in request.files:
             file = request.files['cover']
             if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                unique_filename = f"{song_id}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                image_filename = unique_filename
-        store.update_song_db(song_id, judul, artis, genre, durasi, image_filename)
+                image_filename = simpan_upload(file, app.config['UPLOAD_FOLDER'])
+        store.update_song_db(song_id, judul, artis, genre, durasi, image_filename, audio_filename)
         flash("Lagu berhasil diperbarui!")
         return redirect(url_for('admin_dashboard'))
     return render_template('edit_song.html', song=song)
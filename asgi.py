@@ -0,0 +1,397 @@
+"""Mode ASGI REMusic.
+
+Jalankan: uvicorn asgi:app --port 5000
+(atau server ASGI lain: hypercorn asgi:app, daphne asgi:app)
+
+Route yang sering dipanggil dan banyak menunggu database/disk dijalankan
+sebagai coroutine di event loop (lihat NATIVE): API pemutar, halaman playlist,
+upload avatar, streaming audio dan SSE /events (koneksi idle hanya coroutine
+yang menunggu, lihat event_hub.py). Query dan tulis file lewat AsyncStore, jadi
+ribuan request bisa menunggu bersamaan tanpa satu thread per request. Route
+lain tetap view Flask biasa, dijalankan di thread pool (WSGI_THREADS) lewat
+jembatan WSGI di bawah. Kedua jalur memakai app, hook, session cookie dan
+template yang sama, jadi perilakunya sama dengan `python app.py`.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request, session, jsonify, render_template, redirect, url_for, flash
+
+import app as aplikasi
+from async_store import AsyncStore
+from audio import RentangFile
+from event_hub import Pelanggan
+from images import simpan_data
+
+WSGI_THREADS = 32
+# Body request lebih besar dari ini ditampung di file sementara, bukan di memori
+BODY_MEMORY = 1024 * 1024
+
+flask_app = aplikasi.app
+# Koneksi SSE idle murah di sini (coroutine, bukan thread); REMUSIC_SSE=0 mematikan
+flask_app.config['SSE_ENABLED'] = os.environ.get('REMUSIC_SSE', '1') != '0'
+db = AsyncStore(lambda: aplikasi.store)
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+# Aksi pemutar (mengambil user.lock) punya pool sendiri seukuran jembatan WSGI:
+# upload, hash password dan baca stream di io_executor tidak menahan klik play/next
+player_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="player")
+
+
+# --- Route async ---
+async def user_async():
+    email = session.get('email')
+    if not email:
+        return None
+    user = aplikasi.store.active_sessions.cached(email)
+    if user is None:
+        user = await db.jalankan(aplikasi.muat_user, email)
+    return user
+
+
+async def api_user_async():
+    user = await user_async()
+    if not user:
+        return None, (jsonify(error='Silakan login terlebih dahulu'), 401)
+    return user, None
+
+
+async def siapkan_playlist(user, playlist_id=None):
+    # Urutan playlist dimuat lewat executor agar next/prev tidak query di event loop
+    playlist_id = playlist_id or user.active_playlist_id
+    if playlist_id and playlist_id not in aplikasi.store.playlist_orders:
+        await db.baca('get_playlist_order', playlist_id)
+
+
+async def di_thread(fn, *args):
+    # Untuk fungsi yang mengambil user.lock (app.terkunci/mengubah): thread
+    # jembatan WSGI bisa sedang memegang lock user yang sama, dan menunggunya
+    # di event loop menghentikan semua koneksi. Konteks request ikut (url_for).
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(player_executor, functools.partial(contextvars.copy_context().run, fn, *args))
+
+
+async def aksi_pemutar(user, fn, *args):
+    # Aksi + state pemutar sesudahnya dalam satu perjalanan ke executor
+    def aksi():
+        return fn(user, *args), aplikasi.state_pemutar(user)
+    return await di_thread(aksi)
+
+
+async def api_player():
+    user, error = await api_user_async()
+    if error: return error
+    return jsonify(await di_thread(aplikasi.state_pemutar, user))
+
+
+async def api_play(song_id):
+    user, error = await api_user_async()
+    if error: return error
+    playlist_id = request.args.get('playlist_id', type=int)
+    await siapkan_playlist(user, playlist_id)
+    ok, state = await aksi_pemutar(user, aplikasi.putar_lagu, song_id, playlist_id)
+    if not ok:
+        return jsonify(error='Lagu tidak ditemukan'), 404
+    return jsonify(state)
+
+
+async def api_next():
+    user, error = await api_user_async()
+    if error: return error
+    await siapkan_playlist(user)
+    _, state = await aksi_pemutar(user, aplikasi.lagu_berikutnya)
+    return jsonify(state)
+
+
+async def api_prev():
+    user, error = await api_user_async()
+    if error: return error
+    await siapkan_playlist(user)
+    _, state = await aksi_pemutar(user, aplikasi.lagu_sebelumnya)
+    return jsonify(state)
+
+
+async def api_add_to_queue(song_id):
+    user, error = await api_user_async()
+    if error: return error
+    ok, state = await aksi_pemutar(user, aplikasi.tambah_antrian, song_id)
+    if not ok:
+        return jsonify(error='Lagu tidak ditemukan'), 404
+    return jsonify(state)
+
+
+async def my_playlists():
+    user = await user_async()
+    if not user: return redirect(url_for('login'))
+    etag = aplikasi.etag_halaman(user, f'playlists:{user.email}')
+    cached = aplikasi.not_modified(etag)
+    if cached: return cached
+    playlists = await db.baca('get_user_playlists', user.email, request.args.get('q'))
+    return aplikasi.dengan_etag(render_template('playlists.html', user=user, playlists=playlists), etag)
+
+
+async def playlist_detail(playlist_id):
+    user = await user_async()
+    if not user: return redirect(url_for('login'))
+    etag = aplikasi.etag_halaman(user, 'library', f'playlist:{playlist_id}')
+    cached = aplikasi.not_modified(etag)
+    if cached: return cached
+    playlist, songs = await asyncio.gather(db.baca('get_playlist_by_id', playlist_id),
+                                           db.baca('get_playlist_songs', playlist_id))
+    if not playlist:
+        flash("Playlist tidak ditemukan!")
+        return redirect(url_for('my_playlists'))
+    return aplikasi.dengan_etag(render_template('playlist_detail.html', user=user, playlist=playlist, songs=songs), etag)
+
+
+async def update_avatar():
+    user = await user_async()
+    if not user: return redirect(url_for('login'))
+    # Body sudah dibaca secara async; parsing form di memori, tulis file di executor
+    if 'avatar_file' in request.files and request.files['avatar_file'].filename != '':
+        file = request.files['avatar_file']
+        if file and aplikasi.allowed_file(file.filename):
+            filename = await db.jalankan(simpan_data, file.read(), file.filename,
+                                         flask_app.config['UPLOAD_FOLDER'])
+            await db.tulis('update_user_avatar', user.email, filename)
+            flash("Foto profil berhasil diupload!")
+    elif 'avatar_preset' in request.form:
+        await db.tulis('update_user_avatar', user.email, request.form['avatar_preset'])
+        flash("Avatar berhasil diganti!")
+    return redirect(url_for('profile'))
+
+
+async def stream(song_id):
+    # Hanya header (stat file); isi file dikirim oleh kirim_file
+    return aplikasi.stream(song_id)
+
+
+async def events():
+    # Koneksi SSE dilayani kirim_sse: coroutine idle, tanpa thread per koneksi
+    user = await user_async()
+    if not user: return flask_app.response_class(status=401)
+    return await di_thread(aplikasi.respons_sse, user)
+
+
+# endpoint Flask -> versi async; endpoint lain lewat jembatan WSGI
+NATIVE = {
+    'api_player': api_player,
+    'api_play': api_play,
+    'api_next': api_next,
+    'api_prev': api_prev,
+    'api_add_to_queue': api_add_to_queue,
+    'my_playlists': my_playlists,
+    'playlist_detail': playlist_detail,
+    'update_avatar': update_avatar,
+    'stream': stream,
+    'events': events,
+}
+
+
+# --- ASGI <-> Flask ---
+def buat_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name, value = name.decode('latin1'), value.decode('latin1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            environ[key] += ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        else:
+            environ[key] = value
+    return environ
+
+
+async def baca_body(receive):
+    # File berisi body request (SpooledTemporaryFile): upload besar tidak
+    # ditampung di memori. Setelah melewati BODY_MEMORY, tulis ke disk di executor.
+    body = tempfile.SpooledTemporaryFile(max_size=BODY_MEMORY)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        chunk = message.get('body', b'')
+        if body.tell() + len(chunk) > BODY_MEMORY:
+            await db.jalankan(body.write, chunk)
+        elif chunk:
+            body.write(chunk)
+        if not message.get('more_body'):
+            body.seek(0)
+            return body
+
+
+def _header_asgi(headers):
+    return [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]
+
+
+async def kirim_file(scope, body, send):
+    # sendfile jika server menawarkan ekstensi zerocopysend (uvicorn tidak);
+    # selain itu memoryview ke mmap diambil di executor agar event loop tidak
+    # menunggu disk, dan mmap baru ditutup setelah chunk terakhir terkirim
+    if 'http.response.zerocopysend' in scope.get('extensions', {}):
+        with open(body.path, 'rb') as f:
+            await send({'type': 'http.response.zerocopysend', 'file': f,
+                        'offset': body.awal, 'count': body.panjang})
+        return
+    potongan = body.potongan()
+    try:
+        while True:
+            chunk = await db.jalankan(next, potongan, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        chunk = None
+        body.close()
+
+
+async def kirim_sse(receive, pelanggan, send):
+    # Server tidak memberi tahu klien putus lewat send(); coroutine kedua
+    # menunggu http.disconnect lalu menutup pelanggan (aliran() selesai)
+    async def tunggu_putus():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        pelanggan.close()
+
+    putus = asyncio.ensure_future(tunggu_putus())
+    try:
+        async for data in pelanggan.aliran():
+            await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+    except OSError:
+        pass
+    finally:
+        putus.cancel()
+        pelanggan.close()
+
+
+async def jalankan_native(handler, scope, environ, receive, send):
+    ctx = flask_app.request_context(environ)
+    ctx.push()
+    error = None
+    try:
+        # Sama seperti Flask.wsgi_app/full_dispatch_request, dengan view async
+        try:
+            try:
+                rv = flask_app.preprocess_request()
+                if rv is None:
+                    rv = await handler(**(request.view_args or {}))
+            except Exception as e:
+                rv = flask_app.handle_user_exception(e)
+            response = flask_app.finalize_request(rv)
+        except Exception as e:
+            error = e
+            response = flask_app.handle_exception(e)
+    finally:
+        ctx.pop(error)
+    await send({'type': 'http.response.start', 'status': response.status_code,
+                'headers': _header_asgi(response.headers.to_wsgi_list())})
+    if isinstance(response.response, RentangFile):
+        return await kirim_file(scope, response.response, send)
+    if isinstance(response.response, Pelanggan):
+        return await kirim_sse(receive, response.response, send)
+    body = b'' if environ['REQUEST_METHOD'] == 'HEAD' else response.get_data()
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def jembatan_wsgi(environ, send):
+    # View Flask biasa di thread pool. Response dikirim per chunk agar
+    # response streaming tidak ditampung seluruhnya di memori.
+    loop = asyncio.get_running_loop()
+    status = {}
+
+    def start_response(status_line, headers, exc_info=None):
+        status['code'] = int(status_line.split(' ', 1)[0])
+        status['headers'] = headers
+        return lambda data: None
+
+    def mulai():
+        hasil = flask_app(environ, start_response)
+        iterator = iter(hasil)
+        return hasil, iterator, lanjut(hasil, iterator)
+
+    def lanjut(hasil, iterator):
+        # Chunk berikutnya (kosong dilewati); None = selesai dan sudah di-close
+        for chunk in iterator:
+            if chunk:
+                return chunk
+        if hasattr(hasil, 'close'):
+            hasil.close()
+        return None
+
+    hasil, iterator, chunk = await loop.run_in_executor(wsgi_executor, mulai)
+    try:
+        await send({'type': 'http.response.start', 'status': status['code'],
+                    'headers': _header_asgi(status['headers'])})
+        while chunk is not None:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await loop.run_in_executor(wsgi_executor, lanjut, hasil, iterator)
+        await send({'type': 'http.response.body', 'body': b''})
+    except BaseException:
+        if chunk is not None and hasattr(hasil, 'close'):
+            await loop.run_in_executor(wsgi_executor, hasil.close)
+        raise
+
+
+def endpoint_untuk(environ):
+    try:
+        endpoint, _ = flask_app.url_map.bind_to_environ(environ).match()
+    except Exception:
+        return None   # 404/405/redirect ditangani Flask lewat jembatan
+    return endpoint
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await db.jalankan(aplikasi.store.active_sessions.flush)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    body = await baca_body(receive)
+    if body is None:
+        return
+    try:
+        environ = buat_environ(scope, body)
+        handler = NATIVE.get(endpoint_untuk(environ))
+        if handler is None:
+            await jembatan_wsgi(environ, send)
+        else:
+            await jalankan_native(handler, scope, environ, receive, send)
+    finally:
+        body.close()
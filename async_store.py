@@ -0,0 +1,88 @@
+"""Facade async untuk DatabaseManager (dipakai mode ASGI, lihat asgi.py).
+
+Semua panggilan sqlite3 tetap sinkron, tapi dijalankan di thread executor
+khusus database sehingga event loop tidak pernah menunggu disk:
+
+- baca(...)  : query baca. Permintaan yang datang dalam satu putaran event
+               loop dibagi rata ke DB_READ_WORKERS thread (satu kali pindah
+               thread per bagian, bukan per query), dan panggilan identik
+               yang sedang berjalan digabung (hasilnya dipakai bersama).
+- tulis(...) : query tulis, satu thread saja (SQLite hanya punya satu writer),
+               jadi tidak ada antrian lock "database is locked" antar thread.
+- jalankan(fn, ...) : pekerjaan blocking lain (hash password, tulis file).
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+DB_READ_WORKERS = 4
+IO_WORKERS = 4
+READ_BATCH_SIZE = 64
+
+
+class AsyncStore:
+    def __init__(self, get_store):
+        # get_store: fungsi yang mengembalikan DatabaseManager aktif
+        self.get_store = get_store
+        self.read_executor = ThreadPoolExecutor(max_workers=DB_READ_WORKERS, thread_name_prefix="db-read")
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        self.io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+        self.inflight = {}     # (method, args) -> Future yang sedang berjalan
+        self.antrian = []      # batch baca yang belum dikirim
+        self.batch_terjadwal = False
+
+    @property
+    def store(self):
+        return self.get_store()
+
+    async def baca(self, method, *args):
+        key = (method, args)
+        fut = self.inflight.get(key)
+        if fut is None:
+            loop = asyncio.get_running_loop()
+            fut = self.inflight[key] = loop.create_future()
+            # Konteks pemanggil ikut ke thread (mis. hitungan query per request di metrics)
+            self.antrian.append((key, fut, contextvars.copy_context()))
+            if not self.batch_terjadwal:
+                self.batch_terjadwal = True
+                loop.call_soon(self._kirim_batch, loop)
+        # shield: request yang dibatalkan tidak membatalkan hasil untuk yang lain
+        return await asyncio.shield(fut)
+
+    def _kirim_batch(self, loop):
+        self.batch_terjadwal = False
+        antrian, self.antrian = self.antrian, []
+        # Bagi rata agar semua thread baca bekerja paralel, paling banyak
+        # READ_BATCH_SIZE query per batch
+        ukuran = min(READ_BATCH_SIZE, -(-len(antrian) // DB_READ_WORKERS))
+        for i in range(0, len(antrian), ukuran):
+            loop.run_in_executor(self.read_executor, self._jalankan_batch, loop, antrian[i:i + ukuran])
+
+    def _jalankan_batch(self, loop, batch):
+        store = self.store
+        for key, fut, ctx in batch:
+            method, args = key
+            try:
+                hasil, error = ctx.run(getattr(store, method), *args), None
+            except Exception as e:
+                hasil, error = None, e
+            loop.call_soon_threadsafe(self._selesai, key, fut, hasil, error)
+
+    def _selesai(self, key, fut, hasil, error):
+        self.inflight.pop(key, None)
+        if fut.done():
+            return
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(hasil)
+
+    async def tulis(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.write_executor, functools.partial(
+            contextvars.copy_context().run, getattr(self.store, method), *args))
+
+    async def jalankan(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, functools.partial(contextvars.copy_context().run, fn, *args))
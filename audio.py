@@ -0,0 +1,360 @@
+"""Penyimpanan dan streaming file audio lagu.
+
+Upload ditulis per chunk (CHUNK_SIZE) ke file sementara sambil di-hash, lalu
+dipindah ke `<sha256>.<ext>`: memori tetap kecil berapa pun ukuran file, dan
+file yang sama hanya tersimpan sekali. Durasi dibaca dari header file saat
+upload (mutagen jika terpasang; tanpa mutagen: MP3, WAV, FLAC, OGG, M4A),
+bukan dari isian form.
+
+Streaming (/stream/<song_id>) mendukung Range dan If-Range. Isi file tidak
+lewat Python bila server mendukungnya: server WSGI dengan wsgi.file_wrapper
+(gunicorn, uWSGI, mod_wsgi) memakai sendfile, dan mode ASGI memakai ekstensi
+http.response.zerocopysend jika ditawarkan server. Selain itu file dibaca
+lewat mmap per STREAM_CHUNK.
+"""
+import hashlib
+import mimetypes
+import mmap
+import os
+import struct
+import tempfile
+
+try:
+    import mutagen
+except ImportError:  # mutagen tidak terpasang, pakai parser header di bawah
+    mutagen = None
+
+AUDIO_EXTENSIONS = {'mp3', 'm4a', 'ogg', 'oga', 'opus', 'wav', 'flac'}
+CHUNK_SIZE = 1024 * 1024
+STREAM_CHUNK = 256 * 1024
+HASH_LENGTH = 20
+
+mimetypes.add_type('audio/mp4', '.m4a')
+mimetypes.add_type('audio/ogg', '.oga')
+mimetypes.add_type('audio/ogg', '.opus')
+mimetypes.add_type('audio/flac', '.flac')
+
+
+class AudioTidakValid(ValueError):
+    pass
+
+
+def allowed_audio(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in AUDIO_EXTENSIONS
+
+
+def simpan_audio(file, folder):
+    """Simpan FileStorage audio per chunk. Mengembalikan (nama file, durasi detik).
+
+    AudioTidakValid jika durasi tidak bisa dibaca (bukan file audio)."""
+    ext = os.path.splitext(file.filename)[1].lower()
+    os.makedirs(folder, exist_ok=True)
+    # Nama unik dari mkstemp: aman untuk banyak thread maupun proses worker
+    fd, tmp = tempfile.mkstemp(prefix='.upload.', suffix='.tmp', dir=folder)
+    h = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+                f.write(chunk)
+        durasi = baca_durasi(tmp, ext)
+        if not durasi:
+            raise AudioTidakValid(f"durasi {file.filename} tidak bisa dibaca, bukan file audio yang didukung")
+        filename = h.hexdigest()[:HASH_LENGTH] + ext
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp)
+        else:
+            os.chmod(tmp, 0o644)   # mkstemp membuat file 0600
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return filename, int(round(durasi))
+
+
+# --- Durasi dari header file ---
+def baca_durasi(path, ext=None):
+    """Durasi file audio dalam detik (float), None jika tidak dikenali."""
+    if mutagen is not None:
+        try:
+            info = mutagen.File(path)
+            if info is not None and info.info.length:
+                return info.info.length
+        except Exception:
+            pass
+    ext = (ext or os.path.splitext(path)[1]).lower()
+    with open(path, 'rb') as f:
+        awal = f.read(16)
+        f.seek(0)
+        try:
+            if awal.startswith(b'RIFF') and awal[8:12] == b'WAVE':
+                return _durasi_wav(f)
+            if awal.startswith(b'fLaC'):
+                return _durasi_flac(f)
+            if awal.startswith(b'OggS'):
+                return _durasi_ogg(f)
+            if awal[4:8] == b'ftyp':
+                return _durasi_mp4(f)
+            if ext == '.mp3' or awal.startswith(b'ID3') or (awal[:1] == b'\xff' and awal[1] & 0xE0 == 0xE0):
+                return _durasi_mp3(f)
+        except (struct.error, ValueError, IndexError, ZeroDivisionError):
+            return None
+    return None
+
+
+def _durasi_wav(f):
+    f.seek(12)
+    byte_rate = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        nama, ukuran = header[:4], struct.unpack('<I', header[4:])[0]
+        if nama == b'fmt ':
+            fmt = f.read(ukuran)
+            byte_rate = struct.unpack('<I', fmt[8:12])[0]
+            if ukuran % 2:
+                f.seek(1, 1)
+        elif nama == b'data':
+            if not byte_rate:
+                return None
+            # Header data sering 0/0xFFFFFFFF pada rekaman streaming: pakai ukuran file
+            sisa = os.fstat(f.fileno()).st_size - f.tell()
+            if ukuran == 0 or ukuran > sisa:
+                ukuran = sisa
+            return ukuran / byte_rate
+        else:
+            f.seek(ukuran + ukuran % 2, 1)
+
+
+def _durasi_flac(f):
+    # Blok metadata pertama selalu STREAMINFO
+    f.seek(4)
+    header = f.read(4)
+    if header[0] & 0x7F != 0:
+        return None
+    info = f.read(34)
+    x = int.from_bytes(info[10:18], 'big')
+    sample_rate = x >> 44
+    total = x & ((1 << 36) - 1)
+    return total / sample_rate if sample_rate and total else None
+
+
+def _durasi_ogg(f):
+    # Sample rate dari header codec di halaman pertama, jumlah sample dari
+    # granule position halaman terakhir
+    halaman = f.read(4096)
+    segmen = halaman[26]
+    data = halaman[27 + segmen:]
+    preskip = 0
+    if data.startswith(b'\x01vorbis'):
+        rate = struct.unpack('<I', data[12:16])[0]
+    elif data.startswith(b'OpusHead'):
+        rate = 48000
+        preskip = struct.unpack('<H', data[10:12])[0]
+    elif data.startswith(b'\x7fFLAC'):
+        rate = int.from_bytes(data[27:30], 'big') >> 4
+    else:
+        return None
+    ukuran = os.fstat(f.fileno()).st_size
+    f.seek(max(0, ukuran - 65536))
+    ekor = f.read()
+    i = ekor.rfind(b'OggS')
+    if i < 0 or len(ekor) < i + 14:
+        return None
+    granule = struct.unpack('<q', ekor[i + 6:i + 14])[0]
+    return (granule - preskip) / rate if granule > preskip else None
+
+
+def _durasi_mp4(f):
+    # moov/mvhd: timescale dan duration film
+    ukuran_file = os.fstat(f.fileno()).st_size
+    pos = 0
+    while pos + 8 <= ukuran_file:
+        f.seek(pos)
+        ukuran, nama = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if ukuran == 1:
+            ukuran = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif ukuran == 0:
+            ukuran = ukuran_file - pos
+        if ukuran < header:
+            return None
+        if nama == b'moov':
+            moov = f.read(ukuran - header)
+            i = moov.find(b'mvhd')
+            if i < 4:
+                return None
+            mvhd = moov[i + 4:]
+            if mvhd[0] == 1:
+                timescale, durasi = struct.unpack('>IQ', mvhd[20:32])
+            else:
+                timescale, durasi = struct.unpack('>II', mvhd[12:20])
+            return durasi / timescale if timescale else None
+        pos += ukuran
+    return None
+
+
+# kbps per indeks bitrate, Layer III
+_BITRATE_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATE_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_SAMPLE_RATE = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _durasi_mp3(f):
+    ukuran_file = os.fstat(f.fileno()).st_size
+    header = f.read(10)
+    awal = 0
+    if header.startswith(b'ID3'):
+        # Ukuran tag ID3v2 (syncsafe integer), + footer jika ada
+        awal = 10 + ((header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9])
+        if header[5] & 0x10:
+            awal += 10
+    f.seek(awal)
+    data = f.read(65536)
+    for i in range(len(data) - 4):
+        if data[i] != 0xFF or data[i + 1] & 0xE0 != 0xE0:
+            continue
+        versi = (data[i + 1] >> 3) & 3
+        layer = (data[i + 1] >> 1) & 3
+        indeks_bitrate = data[i + 2] >> 4
+        indeks_rate = (data[i + 2] >> 2) & 3
+        if versi == 1 or layer != 1 or indeks_bitrate in (0, 15) or indeks_rate == 3:
+            continue  # bukan header frame Layer III yang valid
+        sample_rate = _SAMPLE_RATE[versi][indeks_rate]
+        mono = (data[i + 3] >> 6) == 3
+        sample_per_frame = 1152 if versi == 3 else 576
+        # Header VBR (Xing/Info atau VBRI) menyimpan jumlah frame
+        side = (17 if mono else 32) if versi == 3 else (9 if mono else 17)
+        xing = data[i + 4 + side:i + 4 + side + 12]
+        if xing[:4] in (b'Xing', b'Info') and struct.unpack('>I', xing[4:8])[0] & 1:
+            return struct.unpack('>I', xing[8:12])[0] * sample_per_frame / sample_rate
+        vbri = data[i + 36:i + 36 + 18]
+        if vbri[:4] == b'VBRI':
+            return struct.unpack('>I', vbri[14:18])[0] * sample_per_frame / sample_rate
+        # CBR: ukuran audio / bitrate (tag ID3v1 128 byte di akhir diabaikan).
+        # Frame berikutnya harus diawali sync juga, kalau tidak ini bukan MP3.
+        bitrate = (_BITRATE_V1 if versi == 3 else _BITRATE_V2)[indeks_bitrate] * 1000
+        panjang_frame = (144 if versi == 3 else 72) * bitrate // sample_rate + ((data[i + 2] >> 1) & 1)
+        j = i + panjang_frame
+        if j + 1 < len(data) and (data[j] != 0xFF or data[j + 1] & 0xE0 != 0xE0):
+            continue
+        return (ukuran_file - awal - i) * 8 / bitrate
+    return None
+
+
+# --- Streaming dengan Range ---
+def etag_audio(filename):
+    # Nama file berasal dari hash isinya
+    return os.path.splitext(filename)[0]
+
+
+def rentang(range_header, if_range, etag, ukuran):
+    """(status, awal, panjang) untuk request dengan header Range.
+
+    Range yang tidak bisa dipenuhi -> (416, 0, 0). Lebih dari satu rentang
+    atau If-Range yang tidak cocok -> seluruh file (200)."""
+    if not range_header or ukuran == 0:
+        return 200, 0, ukuran
+    if if_range and if_range.strip().strip('"') != etag:
+        return 200, 0, ukuran
+    satuan, _, spek = range_header.partition('=')
+    if satuan.strip().lower() != 'bytes' or ',' in spek:
+        return 200, 0, ukuran
+    awal, _, akhir = spek.strip().partition('-')
+    try:
+        if awal == '':
+            # bytes=-N: N byte terakhir
+            panjang = min(int(akhir), ukuran)
+            if panjang <= 0:
+                return 416, 0, 0
+            return 206, ukuran - panjang, panjang
+        awal = int(awal)
+        akhir = int(akhir) if akhir else None
+    except ValueError:
+        return 200, 0, ukuran
+    if akhir is not None and akhir < awal:
+        return 200, 0, ukuran   # spek tidak valid: abaikan Range
+    if awal >= ukuran:
+        return 416, 0, 0
+    akhir = ukuran - 1 if akhir is None else min(akhir, ukuran - 1)
+    return 206, awal, akhir - awal + 1
+
+
+def header_stream(filename, status, awal, panjang, ukuran):
+    headers = [('Content-Type', mimetypes.guess_type(filename)[0] or 'application/octet-stream'),
+               ('Accept-Ranges', 'bytes'),
+               ('ETag', f'"{etag_audio(filename)}"'),
+               ('Cache-Control', 'private, max-age=0, must-revalidate')]
+    if status == 416:
+        headers.append(('Content-Range', f'bytes */{ukuran}'))
+        headers.append(('Content-Length', '0'))
+        return headers
+    if status == 206:
+        headers.append(('Content-Range', f'bytes {awal}-{awal + panjang - 1}/{ukuran}'))
+    headers.append(('Content-Length', str(panjang)))
+    return headers
+
+
+class RentangFile:
+    """Isi file[awal:awal+panjang] sebagai iterable WSGI, dibaca lewat mmap.
+
+    Mode ASGI mengenali objek ini: zerocopysend jika server menawarkannya,
+    selain itu chunk memoryview dari potongan()."""
+
+    def __init__(self, path, awal, panjang):
+        self.path = path
+        self.awal = awal
+        self.panjang = panjang
+        self._iterator = None
+
+    def __iter__(self):
+        # WSGI mewajibkan bytes
+        self._iterator = baca_mmap(self.path, self.awal, self.panjang)
+        return self._iterator
+
+    def potongan(self):
+        """Chunk memoryview ke mmap tanpa salinan per chunk (untuk ASGI)."""
+        self._iterator = baca_mmap(self.path, self.awal, self.panjang, view=True)
+        return self._iterator
+
+    def close(self):
+        if self._iterator is not None:
+            self._iterator.close()
+
+
+def baca_mmap(path, awal, panjang, chunk=STREAM_CHUNK, view=False):
+    """Generator isi file[awal:awal+panjang] per chunk lewat mmap.
+
+    view=True menghasilkan memoryview; mmap tetap terpetakan selama chunk
+    masih dipegang pengirim, walau generator sudah ditutup."""
+    if panjang <= 0:
+        return
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    sumber = memoryview(mm) if view else mm
+    try:
+        pos, akhir = awal, awal + panjang
+        while pos < akhir:
+            berikut = min(pos + chunk, akhir)
+            if view and hasattr(mm, 'madvise'):
+                # Minta kernel membaca halaman di thread ini, bukan saat
+                # server menulis chunk di event loop
+                mulai = pos - pos % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_WILLNEED, mulai, berikut - mulai)
+            yield sumber[pos:berikut]
+            pos = berikut
+    finally:
+        if view:
+            sumber.release()
+        try:
+            mm.close()
+        except BufferError:
+            # Chunk terakhir masih dipegang; unmap saat view itu dibebaskan
+            pass
@@ -0,0 +1,64 @@
+"""Hash dan verifikasi password REMusic.
+
+Password disimpan sebagai hash bersalt format Werkzeug
+(`pbkdf2:sha256:<iterasi>$<salt>$<hash>`). Biaya hash diatur lewat env
+REMUSIC_PASSWORD_HASH (mis. "pbkdf2:sha256:600000" atau "scrypt"); hash lama
+dengan biaya berbeda di-hash ulang saat login berhasil, begitu juga password
+plaintext dari database versi lama.
+
+Hash dihitung di thread pool kecil: hashlib melepas GIL selama PBKDF2, jadi
+request lain tetap jalan, dan jumlah login yang menghitung hash bersamaan
+dibatasi AUTH_WORKERS.
+"""
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+HASH_METHOD = os.environ.get("REMUSIC_PASSWORD_HASH", "pbkdf2:sha256:600000")
+AUTH_WORKERS = 4
+PREFIX_HASH = ("pbkdf2:", "scrypt:")
+
+executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+
+
+def is_hash(stored):
+    return bool(stored) and stored.startswith(PREFIX_HASH)
+
+
+def hash_password(password):
+    return executor.submit(generate_password_hash, password, HASH_METHOD).result()
+
+
+def perlu_rehash(stored):
+    # Plaintext lama, atau hash dengan metode/biaya yang sudah berubah
+    return not is_hash(stored) or not stored.startswith(_awalan_metode())
+
+
+def _awalan_metode():
+    # generate_password_hash menulis "scrypt" sebagai "scrypt:32768:8:1"
+    if HASH_METHOD == "scrypt":
+        return "scrypt:32768:8:1$"
+    return HASH_METHOD + "$"
+
+
+_dummy = []
+
+
+def _cocok(stored, password):
+    if stored is None:
+        # Email tidak terdaftar: tetap hitung hash supaya waktu responsnya sama
+        if not _dummy:
+            _dummy.append(generate_password_hash("", HASH_METHOD))
+        check_password_hash(_dummy[0], password)
+        return False
+    if is_hash(stored):
+        return check_password_hash(stored, password)
+    # Baris lama: password masih plaintext
+    return hmac.compare_digest(stored.encode(), password.encode())
+
+
+def verifikasi(stored, password):
+    """True jika `password` cocok dengan nilai kolom password `stored`."""
+    return executor.submit(_cocok, stored, password).result()
@@ -0,0 +1,1318 @@
+"""Micro-benchmark struktur data REMusic.
+
+Jalankan: python benchmark.py library
+          python benchmark.py shuffle
+          python benchmark.py playlists
+          python benchmark.py playback
+          python benchmark.py memory
+          python benchmark.py suite --sizes 1000,100000 --json hasil.json
+          python benchmark.py compare sebelum.json sesudah.json
+          python benchmark.py asgi --concurrency 64
+          python benchmark.py plays --events 100000
+          python benchmark.py stress --seconds 10
+          python benchmark.py rekomendasi --songs 100000 --entries 1000000
+          python benchmark.py startup --sizes 1000,10000,100000
+          python benchmark.py sse --connections 5000
+          python benchmark.py sessions
+
+Semua benchmark memakai database sementara, remusic.db tidak disentuh.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import random
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# store global (models.store) diarahkan ke database sementara
+os.environ["REMUSIC_DB"] = os.path.join(tempfile.mkdtemp(prefix="remusic-bench-"), "store.db")
+
+import models
+from models import Lagu, DoublyLinkedList, DatabaseManager
+
+GENRES = ["pop", "pop punk", "rock alternative", "jazz", "indie", "hip hop", "metal", "edm"]
+
+
+def buat_katalog(n):
+    return [Lagu(f"s{i:07d}", f"Judul {i}", f"Artis {i % 500}", "Single", "3:00", GENRES[i % len(GENRES)])
+            for i in range(n)]
+
+
+def buat_db(n):
+    # Database sementara berisi n lagu sintetis
+    path = os.path.join(tempfile.mkdtemp(prefix="remusic-bench-"), "bench.db")
+    db = DatabaseManager(path)
+    isi_katalog(db, n)
+    return db
+
+
+def isi_katalog(db, n):
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO songs (id, judul, artis, album, durasi, genre, image) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [(l.id, l.judul, l.artis, l.album, l.durasi, l.genre, l.image) for l in buat_katalog(n)])
+    db.resync()
+
+
+def ukur(fn, ulang):
+    mulai = time.perf_counter()
+    for _ in range(ulang):
+        fn()
+    return (time.perf_counter() - mulai) / ulang * 1e9  # ns per operasi
+
+
+def bench_library(sizes, lookups):
+    print(f"{'songs':>9} {'cari (ns)':>11} {'linear (ns)':>12} {'berikutnya (ns)':>16} {'hapus+tambah (ns)':>18}")
+    for n in sizes:
+        lib = DoublyLinkedList()
+        for lagu in buat_katalog(n):
+            lib.tambah_last(lagu)
+        ids = [f"s{random.randrange(n):07d}" for _ in range(lookups)]
+        it = iter(ids * 2)
+
+        cari = ukur(lambda: lib.cari(next(it)), lookups)
+        it = iter(ids)
+        berikutnya = ukur(lambda: lib.berikutnya(next(it)), lookups)
+
+        def linear(id):
+            # Cara lama: telusuri node satu per satu
+            p = lib.head
+            while p:
+                if p.lagu.id == id:
+                    return p
+                p = p.next
+
+        sample = ids[:max(1, min(lookups, 200_000 // n))]
+        it = iter(sample)
+        lama = ukur(lambda: linear(next(it)), len(sample))
+
+        it = iter(ids)
+
+        def pindah():
+            node = lib.cari(next(it))
+            if node:
+                lib.hapus(node.lagu.id)
+                lib.tambah_last(node.lagu)
+        churn = ukur(pindah, lookups)
+        print(f"{n:>9} {cari:>11.0f} {lama:>12.0f} {berikutnya:>16.0f} {churn:>18.0f}")
+
+
+def bench_shuffle(sizes, picks):
+    print(f"{'songs':>9} {'ORDER BY RANDOM() (us)':>23} {'GenreIndex (us)':>16} {'+hindari 20 (us)':>17}")
+    for n in sizes:
+        db = buat_db(n)
+        ids = [f"s{random.randrange(n):07d}" for _ in range(picks)]
+
+        def sql(id):
+            # Cara lama: scan tabel + sort semua baris yang cocok
+            with db.get_connection() as conn:
+                return conn.execute("SELECT * FROM songs WHERE genre LIKE ? AND id != ? ORDER BY RANDOM() LIMIT 1",
+                                    ("%pop%", id)).fetchone()
+
+        sample = ids[:max(5, min(picks, 2_000_000 // n))]
+        it = iter(sample)
+        lama = ukur(lambda: sql(next(it)), len(sample)) / 1000
+        it = iter(ids)
+        baru = ukur(lambda: db.get_random_song_by_genre("pop", next(it)), picks) / 1000
+        recent = ids[:20]
+        it = iter(ids)
+        dengan_riwayat = ukur(lambda: db.get_random_song_by_genre("pop", next(it), recent), picks) / 1000
+        print(f"{n:>9} {lama:>23.1f} {baru:>16.1f} {dengan_riwayat:>17.1f}")
+        db.pool.close_all()
+
+
+PLAYLIST_QUERIES = {
+    "get_user_playlists": ("SELECT * FROM playlists WHERE user_email=?", lambda r: (f"user{r.randrange(1000)}@x",)),
+    "add_song (cek duplikat)": ("SELECT * FROM playlist_songs WHERE playlist_id=? AND song_id=?",
+                                lambda r: (r.randrange(1, 5001), f"s{r.randrange(20000):07d}")),
+    "remove_song": ("DELETE FROM playlist_songs WHERE playlist_id=? AND song_id=?",
+                    lambda r: (r.randrange(1, 5001), "tidak-ada")),
+    "get_playlist_songs": ("""SELECT s.* FROM songs s JOIN playlist_songs ps ON s.id = ps.song_id
+                              WHERE ps.playlist_id = ? ORDER BY ps.position""", lambda r: (r.randrange(1, 5001),)),
+}
+
+
+def bench_playlists(entries, ulang):
+    # Skema lama (tanpa indeks/primary key), lalu migrasi ke skema terbaru
+    path = os.path.join(tempfile.mkdtemp(prefix="remusic-bench-"), "bench.db")
+    conn = sqlite3.connect(path)
+    conn.executescript('''CREATE TABLE users (email TEXT PRIMARY KEY, username TEXT, password TEXT, role TEXT);
+                           CREATE TABLE songs (id TEXT PRIMARY KEY, judul TEXT, artis TEXT, album TEXT, durasi TEXT, genre TEXT, image TEXT);
+                           CREATE TABLE playlists (id INTEGER PRIMARY KEY AUTOINCREMENT, user_email TEXT, name TEXT);
+                           CREATE TABLE playlist_songs (playlist_id INTEGER, song_id TEXT);''')
+    conn.executemany("INSERT INTO songs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [(l.id, l.judul, l.artis, l.album, l.durasi, l.genre, l.image) for l in buat_katalog(20000)])
+    conn.executemany("INSERT INTO playlists (user_email, name) VALUES (?, ?)",
+                     [(f"user{i % 1000}@x", f"Playlist {i}") for i in range(5000)])
+    r = random.Random(1)
+    rows = {(r.randrange(1, 5001), f"s{r.randrange(20000):07d}") for _ in range(entries)}
+    conn.executemany("INSERT INTO playlist_songs VALUES (?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+    def jalankan(label, conn):
+        print(f"\n== {label} ({len(rows)} baris playlist_songs) ==")
+        for nama, (sql, args) in PLAYLIST_QUERIES.items():
+            if "position" in sql and label.startswith("sebelum"):
+                sql = sql.replace(" ORDER BY ps.position", "")
+            plan = " | ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, args(r)))
+            waktu = ukur(lambda: conn.execute(sql, args(r)).fetchall(), ulang) / 1000
+            print(f"{nama:<24} {waktu:>9.1f} us   {plan}")
+        conn.rollback()
+
+    conn = sqlite3.connect(path)
+    jalankan("sebelum migrasi", conn)
+    conn.close()
+    db = DatabaseManager(path)
+    with db.get_connection() as conn:
+        jalankan("sesudah migrasi", conn)
+    db.pool.close_all()
+
+
+def bench_playback(n, jumlah, workers):
+    # Alur lama (GET /next -> redirect -> render /main) vs API JSON (POST /api/next)
+    import models
+    isi_katalog(models.store, n)
+    from app import app
+
+    def klien(i):
+        c = app.test_client()
+        email = f"bench{i}@remusic.com"
+        models.store.add_user(f"bench{i}", email, "bench")
+        c.post("/login", data={"email": email, "password": "bench"})
+        c.get("/play/s0000000")
+        return c
+
+    def redirect_flow(c):
+        r = c.get("/next", headers={"Referer": "/main"}, follow_redirects=True)
+        return sum(len(h.get_data()) for h in r.history) + len(r.get_data())
+
+    def api_flow(c):
+        return len(c.post("/api/next").get_data())
+
+    print(f"katalog {n} lagu, {workers} worker, {jumlah} request per worker")
+    print(f"{'alur':<10} {'req/s':>9} {'bytes/req':>10}")
+    for nama, fn in (("redirect", redirect_flow), ("api", api_flow)):
+        clients = [klien(i) for i in range(workers)]
+        total_bytes = [0] * workers
+
+        def kerja(i):
+            for _ in range(jumlah):
+                total_bytes[i] += fn(clients[i])
+        threads = [threading.Thread(target=kerja, args=(i,)) for i in range(workers)]
+        mulai = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        durasi = time.perf_counter() - mulai
+        total = jumlah * workers
+        print(f"{nama:<10} {total / durasi:>9.0f} {sum(total_bytes) / total:>10.0f}")
+
+
+class LaguLama:
+    # Lagu sebelum __slots__/intern: __dict__ per objek, durasi berupa teks
+    def __init__(self, id, judul, artis, album, durasi, genre, image=None):
+        self.id = id
+        self.judul = judul
+        self.artis = artis
+        self.album = album
+        self.durasi = durasi
+        self.genre = genre
+        self.image = image
+
+
+class NodeLama:
+    def __init__(self, lagu, lahir=0):
+        self.lagu = lagu
+        self.prev = None
+        self.next = None
+        self.lahir = lahir
+        self.mati = None
+        self.lama = None
+
+
+def bench_memory(n, playlists):
+    # Memori library per lagu + objek Lagu ekstra dari query playlist
+    db = buat_db(n)
+
+    def library_lama():
+        lib = DoublyLinkedList()
+        asli, models.Node = models.Node, NodeLama
+        try:
+            with db.get_connection() as conn:
+                for row in conn.execute("SELECT * FROM songs").fetchall():
+                    lib.tambah_last(LaguLama(*row))
+        finally:
+            models.Node = asli
+        return lib
+
+    def playlist_lama(songs):
+        return [LaguLama(l.id, l.judul, l.artis, l.album, l.durasi, l.genre, l.image) for l in songs]
+
+    def ukur_memori(fn):
+        tracemalloc.start()
+        hasil = fn()
+        ukuran = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return hasil, ukuran
+
+    db.library = DoublyLinkedList().terbitkan()
+    lib_lama, lama = ukur_memori(library_lama)
+    del lib_lama
+    db.library = DoublyLinkedList().terbitkan()
+    _, baru = ukur_memori(db.reload_library)
+
+    # `playlists` playlist masing-masing 50 lagu, semuanya dimuat sekaligus
+    ids = [f"s{i:07d}" for i in range(n)]
+    r = random.Random(1)
+    with db.get_connection() as conn:
+        for p in range(playlists):
+            pid = conn.execute("INSERT INTO playlists (user_email, name) VALUES (?, ?)", ("bench@x", f"P{p}")).lastrowid
+            conn.executemany("INSERT INTO playlist_songs (playlist_id, song_id, position) VALUES (?, ?, ?)",
+                             [(pid, id, i) for i, id in enumerate(r.sample(ids, 50))])
+    _, pl_baru = ukur_memori(lambda: [db.get_playlist_songs(p) for p in range(1, playlists + 1)])
+    _, pl_lama = ukur_memori(lambda: [playlist_lama(db.get_playlist_songs(p)) for p in range(1, playlists + 1)])
+
+    print(f"katalog {n} lagu, {playlists} playlist x 50 lagu")
+    print(f"{'':<22} {'lama':>12} {'baru':>12}")
+    print(f"{'library (MB)':<22} {lama / 2**20:>12.1f} {baru / 2**20:>12.1f}")
+    print(f"{'library (byte/lagu)':<22} {lama / n:>12.0f} {baru / n:>12.0f}")
+    print(f"{'per 100k lagu (MB)':<22} {lama / n * 1e5 / 2**20:>12.1f} {baru / n * 1e5 / 2**20:>12.1f}")
+    print(f"{'playlist dimuat (MB)':<22} {pl_lama / 2**20:>12.1f} {pl_baru / 2**20:>12.1f}")
+    db.pool.close_all()
+
+
+# --- Suite: library, query DatabaseManager, route end-to-end ---
+SUITE_PLAYLIST_SIZE = 30
+
+
+def buat_dataset(n, users, playlists, seed=1):
+    """DatabaseManager sementara berisi n lagu, `users` user dan `playlists`
+    playlist (masing-masing SUITE_PLAYLIST_SIZE lagu, dibagi rata ke user)."""
+    db = buat_db(n)
+    r = random.Random(seed)
+    ids = [f"s{i:07d}" for i in range(n)]
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO users (email, username, password, role) VALUES (?, ?, ?, 'user')",
+                         [(f"user{u}@bench", f"user{u}", "bench") for u in range(users)])
+        for p in range(playlists):
+            pid = conn.execute("INSERT INTO playlists (user_email, name) VALUES (?, ?)",
+                               (f"user{p % users}@bench", f"Playlist {p}")).lastrowid
+            conn.executemany("INSERT INTO playlist_songs (playlist_id, song_id, position) VALUES (?, ?, ?)",
+                             [(pid, id, i) for i, id in enumerate(r.sample(ids, min(SUITE_PLAYLIST_SIZE, n)))])
+    return db
+
+
+def statistik(nama, n, latensi, durasi=None):
+    # latensi: list detik per operasi; durasi: wall clock total (untuk beban konkuren)
+    latensi = sorted(latensi)
+    jumlah = len(latensi)
+    total = durasi if durasi is not None else sum(latensi)
+
+    def persentil(p):
+        return latensi[min(jumlah - 1, int(p * jumlah))] * 1e6
+    return {'name': nama, 'songs': n, 'ops': jumlah,
+            'ops_per_s': round(jumlah / total, 1) if total else None,
+            'mean_us': round(sum(latensi) / jumlah * 1e6, 2),
+            'p50_us': round(persentil(0.50), 2), 'p95_us': round(persentil(0.95), 2),
+            'p99_us': round(persentil(0.99), 2)}
+
+
+def ukur_per_operasi(fn, args):
+    latensi = []
+    timer = time.perf_counter
+    for a in args:
+        mulai = timer()
+        fn(a)
+        latensi.append(timer() - mulai)
+    return latensi
+
+
+def suite_library(db, n, ops, r):
+    lib = db.library
+    ids = [f"s{r.randrange(n):07d}" for _ in range(ops)]
+    hasil = [statistik('library.cari', n, ukur_per_operasi(lib.cari, ids)),
+             statistik('library.berikutnya', n, ukur_per_operasi(lib.berikutnya, ids)),
+             statistik('library.halaman', n, ukur_per_operasi(lambda id: lib.halaman(id), ids))]
+
+    def pindah(id):
+        # Termasuk menerbitkan snapshot baru, seperti tulis admin
+        with db.ubah_library() as dasar:
+            node = dasar.cari(id)
+            dasar.hapus(id)
+            dasar.tambah_last(node.lagu)
+    hasil.append(statistik('library.hapus+tambah_last', n, ukur_per_operasi(pindah, ids)))
+    return hasil
+
+
+def suite_queries(db, n, users, playlists, ops, r):
+    ops = max(1, ops // 10)   # query SQLite jauh lebih lambat dari operasi di memori
+    pids = [r.randrange(1, playlists + 1) for _ in range(ops)]
+    ids = [f"s{r.randrange(n):07d}" for _ in range(ops)]
+    hasil = [
+        statistik('db.search_songs', n, ukur_per_operasi(
+            lambda i: db.search_songs(f"Judul {i}"), [r.randrange(n) for _ in range(ops)])),
+        statistik('db.get_user_playlists', n, ukur_per_operasi(
+            db.get_user_playlists, [f"user{r.randrange(users)}@bench" for _ in range(ops)])),
+        statistik('db.get_playlist_songs', n, ukur_per_operasi(db.get_playlist_songs, pids)),
+        statistik('db.get_random_song_by_genre', n, ukur_per_operasi(
+            lambda id: db.get_random_song_by_genre(GENRES[0], id), ids)),
+    ]
+    # Urutan playlist sudah di cache (kasus umum saat lagu diputar berurutan)
+    posisi = [(pid, r.choice(db.get_playlist_order(pid).song_ids)) for pid in pids]
+    hasil.append(statistik('db.playlist_neighbor', n, ukur_per_operasi(
+        lambda a: db.playlist_neighbor(*a), posisi)))
+    pasangan = list(zip(pids, ids))
+    hasil.append(statistik('db.add_song_to_playlist', n, ukur_per_operasi(
+        lambda a: db.add_song_to_playlist(*a), pasangan)))
+    hasil.append(statistik('db.remove_song_from_playlist', n, ukur_per_operasi(
+        lambda a: db.remove_song_from_playlist(*a), pasangan)))
+    return hasil
+
+
+def suite_routes(db, n, workers, jumlah, r):
+    import app as aplikasi
+    aplikasi.store = db
+    aplikasi._grid_cache.clear()
+    with db.get_connection() as conn:
+        milik = {}
+        for pid, email in conn.execute("SELECT id, user_email FROM playlists"):
+            milik.setdefault(email, []).append(pid)
+    pertama = {pid: ids[0] for pid, ids in ((pid, db.get_playlist_order(pid).song_ids)
+                                          for daftar in milik.values() for pid in daftar) if ids}
+
+    def klien(i):
+        c = aplikasi.app.test_client()
+        c.post("/login", data={"email": f"user{i}@bench", "password": "bench"})
+        return c
+
+    def acak_lagu():
+        return f"s{r.randrange(n):07d}"
+
+    def siapkan_library(c, i):
+        c.get(f"/play/{acak_lagu()}")
+
+    def siapkan_playlist(c, i):
+        pid = milik[f"user{i}@bench"][0]
+        c.get(f"/play/{pertama[pid]}?playlist_id={pid}")
+
+    # nama -> (persiapan per klien/ulang, request)
+    routes = {
+        'route.main': (None, lambda c, i: c.get("/main")),
+        'route.main_search': (None, lambda c, i: c.get(f"/main?q=Judul {r.randrange(n)}")),
+        'route.play': (None, lambda c, i: c.get(f"/play/{acak_lagu()}")),
+        'route.next_library': (siapkan_library, lambda c, i: c.get("/next")),
+        'route.next_playlist': (siapkan_playlist, lambda c, i: c.get("/next")),
+        'route.api_next': (siapkan_library, lambda c, i: c.post("/api/next")),
+        'route.playlist_detail': (None, lambda c, i: c.get(f"/playlist/{milik[f'user{i}@bench'][0]}")),
+    }
+    clients = [klien(i) for i in range(workers)]
+    hasil = []
+    for nama, (siapkan, kirim) in routes.items():
+        latensi = [[] for _ in range(workers)]
+
+        def kerja(i):
+            c = clients[i]
+            for k in range(jumlah):
+                # Konteks playlist berhenti di lagu terakhir; mulai ulang di luar pengukuran
+                if siapkan and k % (SUITE_PLAYLIST_SIZE - 1) == 0:
+                    siapkan(c, i)
+                mulai = time.perf_counter()
+                resp = kirim(c, i)
+                latensi[i].append(time.perf_counter() - mulai)
+                if resp.status_code >= 400:
+                    raise RuntimeError(f"{nama}: HTTP {resp.status_code}")
+        threads = [threading.Thread(target=kerja, args=(i,)) for i in range(workers)]
+        mulai = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        durasi = time.perf_counter() - mulai
+        hasil.append(statistik(nama, n, [x for l in latensi for x in l], durasi))
+    return hasil
+
+
+def info_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_suite(sizes, users, playlists, workers, jumlah, ops, output, seed):
+    users = max(users, workers)
+    hasil = {'meta': {'commit': info_commit(), 'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                      'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                      'params': {'sizes': sizes, 'users': users, 'playlists': playlists, 'workers': workers,
+                                 'requests': jumlah, 'ops': ops, 'seed': seed}},
+             'results': []}
+    for n in sizes:
+        r = random.Random(seed)
+        mulai = time.perf_counter()
+        db = buat_dataset(n, users, playlists, seed)
+        print(f"== {n} lagu (dataset {time.perf_counter() - mulai:.1f} s) ==", file=sys.stderr)
+        for bagian in (suite_library(db, n, ops, r),
+                       suite_queries(db, n, users, playlists, ops, r),
+                       suite_routes(db, n, workers, jumlah, r)):
+            for baris in bagian:
+                print(f"{baris['name']:<30} {baris['ops_per_s']:>11} ops/s  p50 {baris['p50_us']:>9} us  "
+                      f"p95 {baris['p95_us']:>9} us", file=sys.stderr)
+            hasil['results'].extend(bagian)
+        db.pool.close_all()
+    teks = json.dumps(hasil, indent=2)
+    if output and output != '-':
+        with open(output, 'w') as f:
+            f.write(teks + "\n")
+        print(f"hasil ditulis ke {output}", file=sys.stderr)
+    else:
+        print(teks)
+
+
+def bench_compare(sebelum, sesudah, ambang):
+    """Bandingkan dua file JSON suite; exit code 1 jika ada regresi p50 > ambang."""
+    with open(sebelum) as f:
+        lama = {(b['name'], b['songs']): b for b in json.load(f)['results']}
+    with open(sesudah) as f:
+        baru = json.load(f)['results']
+    regresi = 0
+    print(f"{'benchmark':<30} {'songs':>8} {'p50 lama':>10} {'p50 baru':>10} {'rasio':>7}")
+    for b in baru:
+        a = lama.get((b['name'], b['songs']))
+        if not a or not a['p50_us']:
+            continue
+        rasio = b['p50_us'] / a['p50_us']
+        tanda = ''
+        if rasio > 1 + ambang:
+            tanda = '  REGRESI'
+            regresi += 1
+        print(f"{b['name']:<30} {b['songs']:>8} {a['p50_us']:>10} {b['p50_us']:>10} {rasio:>7.2f}{tanda}")
+    return 1 if regresi else 0
+
+
+def bench_plays(n, events):
+    # Catat putar: commit per event vs PlayLog (buffer + executemany), lalu
+    # query "paling sering diputar" dari rollup vs GROUP BY di log mentah
+    db = buat_db(n)
+    r = random.Random(1)
+    sampel = [(f"user{r.randrange(1000)}@bench", f"s{min(int(r.paretovariate(1.2)) - 1, n - 1):07d}")
+              for _ in range(events)]
+
+    def per_event(a):
+        with db.get_connection() as conn:
+            conn.execute("INSERT INTO play_events (user_email, song_id, played_at) VALUES (?, ?, ?)",
+                         (a[0], a[1], time.time()))
+    sedikit = sampel[:min(events, 5000)]
+    lama = ukur_per_operasi(per_event, sedikit)
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM play_events")
+    baru = ukur_per_operasi(lambda a: db.play_log.catat(*a), sampel)
+    mulai = time.perf_counter()
+    db.play_log.flush()
+    flush = time.perf_counter() - mulai
+    mulai = time.perf_counter()
+    jumlah = db.play_log.rollup()
+    rollup = time.perf_counter() - mulai
+
+    def top_mentah(_):
+        with db.get_connection() as conn:
+            return conn.execute("SELECT song_id, COUNT(*) AS c FROM play_events GROUP BY song_id "
+                                "ORDER BY c DESC LIMIT 10").fetchall()
+    mentah = ukur_per_operasi(top_mentah, range(20))
+    top = ukur_per_operasi(lambda _: db.most_played(10), range(2000))
+    recent = ukur_per_operasi(lambda i: db.recently_played(f"user{i % 1000}@bench", 20), range(2000))
+    print(f"katalog {n} lagu, {events} event putar")
+    print(f"{'commit per event (us/putar)':<34} {sum(lama) / len(lama) * 1e6:>10.1f}")
+    print(f"{'PlayLog.catat (us/putar)':<34} {sum(baru) / len(baru) * 1e6:>10.1f}")
+    print(f"{'flush buffer (ms, sekali)':<34} {flush * 1000:>10.1f}")
+    label = f"rollup {jumlah} event (ms)"
+    print(f"{label:<34} {rollup * 1000:>10.1f}")
+    print(f"{'top 10, GROUP BY log mentah (us)':<34} {statistik('', n, mentah)['p50_us']:>10.1f}")
+    print(f"{'top 10, rollup (us)':<34} {statistik('', n, top)['p50_us']:>10.1f}")
+    print(f"{'recently_played, rollup (us)':<34} {statistik('', n, recent)['p50_us']:>10.1f}")
+    db.pool.close_all()
+
+
+def bench_rekomendasi(n, entries, ukuran, selera):
+    """Indeks co-occurrence: waktu muat + hitung top-k, memori, latensi mirip()."""
+    db = buat_db(n)
+    r = random.Random(1)
+    # Lagu dikelompokkan per "selera"; playlist sintetis 80% dari satu selera
+    per_selera = max(ukuran, n // selera)
+    playlists = entries // ukuran
+    mulai = time.perf_counter()
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO playlists (id, user_email, name) VALUES (?, 'bench@bench', ?)",
+                         [(p, f"Playlist {p}") for p in range(1, playlists + 1)])
+
+        def baris():
+            for p in range(1, playlists + 1):
+                awal = r.randrange(0, n - per_selera + 1, per_selera)
+                ids = set(r.sample(range(awal, awal + per_selera), ukuran * 4 // 5))
+                while len(ids) < ukuran:
+                    ids.add(r.randrange(n))
+                for pos, i in enumerate(ids):
+                    yield p, f"s{i:07d}", pos
+        conn.executemany("INSERT INTO playlist_songs (playlist_id, song_id, position) VALUES (?, ?, ?)", baris())
+    print(f"katalog {n} lagu, {playlists} playlist x {ukuran} = {playlists * ukuran} entri "
+          f"(dataset {time.perf_counter() - mulai:.1f} s)")
+
+    rek = db.rekomendasi
+    rek.reset()
+    mulai = time.perf_counter()
+    rek.muat()
+    muat = time.perf_counter() - mulai
+    mulai = time.perf_counter()
+    rek.hitung_semua()
+    hitung = time.perf_counter() - mulai
+
+    ids = [f"s{r.randrange(n):07d}" for _ in range(20000)]
+    warm = ukur_per_operasi(rek.mirip, ids)
+    similar = ukur_per_operasi(lambda id: db.get_similar_song(id), ids)
+    # Tambah lagu ke playlist: lagu di playlist itu kotor, mirip() pertama menghitung ulang
+    kotor = []
+    for p in r.sample(range(1, playlists + 1), 200):
+        db.add_song_to_playlist(p, f"s{r.randrange(n):07d}")
+        id = rek.ids[rek.isi_playlist[p][0]]
+        kotor += ukur_per_operasi(rek.mirip, [id])
+
+    def satu_selera(a, b):
+        return b is not None and int(a[1:]) // per_selera == int(b.id[1:]) // per_selera
+    sampel = ids[:2000]
+    tepat = sum(satu_selera(id, db.get_similar_song(id)) for id in sampel)
+    tepat_genre = sum(satu_selera(id, db.get_random_song_by_genre(db.library.cari(id).lagu.genre, id))
+                      for id in sampel)
+
+    # Memori: bangun ulang indeks di bawah tracemalloc
+    rek.reset()
+    tracemalloc.start()
+    rek.hitung_semua()
+    memori = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{'muat playlist_songs (s)':<36} {muat:>10.2f}")
+    print(f"{'hitung top-' + str(rek.top_k) + ' semua lagu (s)':<36} {hitung:>10.2f}")
+    print(f"{'memori indeks + top-k (MB)':<36} {memori / 2**20:>10.1f}")
+    print(f"{'mirip(), top-k tersimpan (us p50)':<36} {statistik('', n, warm)['p50_us']:>10.1f}")
+    print(f"{'get_similar_song (us p50)':<36} {statistik('', n, similar)['p50_us']:>10.1f}")
+    print(f"{'mirip() setelah playlist berubah (us)':<36} {statistik('', n, kotor)['p50_us']:>10.1f}")
+    print(f"{'next satu selera: co-occurrence':<36} {tepat / len(sampel):>10.0%}")
+    print(f"{'next satu selera: genre acak':<36} {tepat_genre / len(sampel):>10.0%}")
+    db.pool.close_all()
+
+
+STARTUP_SCRIPT = """
+import json, sys, time
+mulai = time.perf_counter()
+import models
+impor = time.perf_counter() - mulai
+mulai = time.perf_counter()
+n = len(models.store.library)
+pertama = time.perf_counter() - mulai
+print(json.dumps({'import': impor, 'first_use': pertama, 'songs': n}))
+"""
+
+
+def ukur_startup(path):
+    # Proses baru (cold start sungguhan), REMUSIC_DB menunjuk ke katalog uji
+    env = dict(os.environ, REMUSIC_DB=path)
+    keluaran = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], env=env, check=True,
+                              capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(keluaran.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(sizes, ulang):
+    """Waktu import models + pemakaian pertama store.library pada proses baru."""
+    print(f"{'lagu':>8} {'kondisi':<22} {'import (ms)':>12} {'pakai pertama (ms)':>19} {'total (ms)':>11}")
+    for n in sizes:
+        db = buat_db(n)
+        path = db.pool.db_name
+        db.pool.close_all()
+        kondisi = [('tanpa snapshot', lambda: hapus_snapshot(path)),
+                   ('snapshot valid', lambda: None),
+                   ('snapshot basi', lambda: ubah_katalog(path))]
+        for label, siapkan in kondisi:
+            hasil = []
+            for _ in range(ulang):
+                siapkan()
+                hasil.append(ukur_startup(path))
+            impor = sorted(h['import'] for h in hasil)[len(hasil) // 2]
+            pakai = sorted(h['first_use'] for h in hasil)[len(hasil) // 2]
+            print(f"{n:>8} {label:<22} {impor * 1000:>12.1f} {pakai * 1000:>19.1f} {(impor + pakai) * 1000:>11.1f}")
+        snapshot = path + models.SNAPSHOT_SUFFIX
+        if os.path.exists(snapshot):
+            print(f"{'':>8} ukuran snapshot {os.path.getsize(snapshot) / 2**20:.1f} MB")
+
+
+def hapus_snapshot(path):
+    try:
+        os.remove(path + models.SNAPSHOT_SUFFIX)
+    except (OSError, AttributeError):
+        pass
+
+
+def ubah_katalog(path):
+    # Tulisan dari luar server (mis. import CLI): snapshot jadi basi
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE songs SET judul = judul || '' WHERE rowid = 1")
+    conn.close()
+
+
+def periksa_snapshot(lib):
+    # Snapshot harus konsisten dan tidak berubah selama dibaca walau library
+    # diubah bersamaan: list, cari(), halaman() dan jumlah berisi lagu yang sama
+    songs = lib.get_all()
+    if len(songs) != len(lib):
+        raise AssertionError(f"ukuran tidak konsisten: list {len(songs)}, len {len(lib)}")
+    for lagu in songs:
+        node = lib.cari(lagu.id)
+        if node is None or node.lagu is not lagu:
+            raise AssertionError(f"node {lagu.id} tidak konsisten")
+    if (lib.tail.lagu if lib.tail else None) is not (songs[-1] if songs else None):
+        raise AssertionError("tail tidak konsisten")
+    halaman, cursor = lib.halaman(None, 1000)
+    while cursor:
+        lanjut, cursor = lib.halaman(cursor, 1000)
+        halaman += lanjut
+    if halaman != songs or lib.get_all() != songs:
+        raise AssertionError("isi snapshot berubah selama dibaca")
+
+
+def periksa_library(db):
+    # Di bawah lock penulis: library terbaru, GenreIndex dan snapshot terpasang sama
+    with db._library_lock:
+        lib, dasar = db.library, db.library.dasar
+        periksa_snapshot(lib)
+        ids = {lagu.id for lagu in lib.get_all()}
+        if ids != {lagu.id for lagu in dasar.get_all()} or ids != set(dasar.genres.posisi):
+            raise AssertionError(f"library terbaru tidak konsisten: snapshot {len(ids)}, list {len(dasar)}, "
+                                 f"genre {len(dasar.genres.posisi)}")
+        return ids
+
+
+def uji_kursor_terhapus(aplikasi, db):
+    """/api/songs?after=<id> tetap berlanjut jika lagu cursor dihapus di antara
+    dua halaman, baik node-nya masih tertunda maupun sudah dilepas dari list."""
+    c = aplikasi.app.test_client()
+    c.post("/login", data={"email": "user0@bench", "password": "bench"})
+    urutan = [lagu.id for lagu in db.library.get_all()]
+    for lepas in (False, True):
+        cursor = c.get("/api/songs?limit=10").get_json()['next']
+        lagu = db.library.cari(cursor).lagu
+        db.delete_song_db(cursor)
+        if lepas:
+            with db.ubah_library() as library:
+                library._bersihkan()
+        halaman = c.get(f"/api/songs?after={cursor}&limit=10").get_json()
+        i = urutan.index(cursor)
+        if [s['id'] for s in halaman['songs']] != urutan[i + 1:i + 11] or not halaman['next']:
+            raise AssertionError(f"cursor terhapus {cursor}: {halaman}")
+        db.add_song_db(lagu)
+        urutan.remove(cursor)
+        urutan.append(cursor)
+
+
+def bench_stress(n, workers, detik):
+    """Play/next/queue dari banyak user + edit admin + pembaca snapshot, bersamaan."""
+    import app as aplikasi
+    db = buat_dataset(n, workers, workers * 2)
+    aplikasi.store = db
+    aplikasi._grid_cache.clear()
+    uji_kursor_terhapus(aplikasi, db)
+    with db.get_connection() as conn:
+        milik = {email: pid for pid, email in conn.execute("SELECT id, user_email FROM playlists")}
+    selesai = threading.Event()
+    errors = []
+    hitung = {'player': 0, 'admin': 0, 'snapshot': 0, 'state': 0}
+    kunci_hitung = threading.Lock()
+
+    def catat(jenis, jumlah=1):
+        with kunci_hitung:
+            hitung[jenis] += jumlah
+
+    def jalankan(jenis, fn):
+        def loop():
+            r = random.Random(jenis + threading.current_thread().name)
+            while not selesai.is_set():
+                try:
+                    fn(r)
+                    catat(jenis)
+                except Exception as e:
+                    errors.append(f"{jenis}: {type(e).__name__}: {e}")
+                    if len(errors) > 50:
+                        selesai.set()
+        return loop
+
+    def player(i):
+        c = aplikasi.app.test_client()
+        with c.session_transaction() as sess:
+            sess['email'], sess['role'] = f"user{i}@bench", 'user'
+        pid = milik[f"user{i}@bench"]
+
+        def langkah(r):
+            lib = db.library
+            id = lib.tail.lagu.id if r.random() < 0.1 else f"s{r.randrange(n):07d}"
+            aksi = r.randrange(9)
+            if aksi == 0: resp = c.post(f"/api/play/{id}")
+            elif aksi == 1: resp = c.post(f"/api/play/{id}?playlist_id={pid}")
+            elif aksi == 2: resp = c.post("/api/next")
+            elif aksi == 3: resp = c.post("/api/prev")
+            elif aksi == 4: resp = c.post(f"/api/queue/{id}")
+            elif aksi == 5: resp = c.get("/queue/move/1/0")
+            elif aksi == 6: resp = c.get("/queue/remove/0")
+            elif aksi == 7: resp = c.get(f"/api/songs?after={id}")
+            else: resp = c.get(f"/playlist/{pid}")
+            if resp.status_code >= 500:
+                raise AssertionError(f"HTTP {resp.status_code} pada aksi {aksi}")
+        return langkah
+
+    baru = []
+
+    def admin(r):
+        aksi = r.randrange(10)
+        if aksi < 4 or not baru:
+            lagu = Lagu(f"x{r.randrange(10**9):09d}", "Stress", "Admin", "Single", "3:00", r.choice(GENRES))
+            db.add_song_db(lagu)
+            baru.append(lagu.id)
+        elif aksi < 7:
+            id = r.choice(baru)
+            db.update_song_db(id, "Stress edit", "Admin", r.choice(GENRES), "2:30")
+        elif aksi < 9:
+            db.delete_song_db(baru.pop(r.randrange(len(baru))))
+        else:
+            db.reload_library()
+
+    def snapshot(r):
+        periksa_snapshot(db.library)
+
+    def state(r):
+        for user, _ in list(db.active_sessions.sessions.values()):
+            user.to_state()
+
+    threads = [threading.Thread(target=jalankan('player', player(i)), name=f"player{i}") for i in range(workers)]
+    threads += [threading.Thread(target=jalankan('admin', admin), name="admin"),
+                threading.Thread(target=jalankan('snapshot', snapshot), name="snapshot"),
+                threading.Thread(target=jalankan('state', state), name="state")]
+    for t in threads:
+        t.start()
+    selesai.wait(detik)
+    selesai.set()
+    for t in threads:
+        t.join()
+
+    # Akhir: library harus sama dengan tabel songs
+    try:
+        ids = periksa_library(db)
+        with db.get_connection() as conn:
+            ids_db = {row[0] for row in conn.execute("SELECT id FROM songs")}
+        if ids_db != ids:
+            errors.append(f"library ({len(db.library)}) tidak sama dengan tabel songs ({len(ids_db)})")
+    except AssertionError as e:
+        errors.append(f"akhir: {e}")
+    print(f"{detik} s, {workers} player, katalog {n} lagu: " + ", ".join(f"{k} {v}" for k, v in hitung.items()))
+    for e in errors[:20]:
+        print("  ERROR", e)
+    print("OK" if not errors else f"GAGAL ({len(errors)} error)")
+    db.pool.close_all()
+    return 1 if errors else 0
+
+
+# --- WSGI (server threaded Werkzeug, `python app.py`) vs ASGI (uvicorn asgi:app) ---
+SERVER_WSGI = ("import logging, app; logging.getLogger('werkzeug').setLevel(logging.ERROR); "
+               "app.app.run(port={port}, threaded=True)")
+
+
+def port_bebas():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def tunggu_port(port, proses, batas=30):
+    import socket
+    akhir = time.time() + batas
+    while time.time() < akhir:
+        if proses.poll() is not None:
+            raise RuntimeError("server berhenti saat start")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server di port {port} tidak merespons")
+
+
+async def kirim_http(port, method, path, cookie):
+    import asyncio
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nCookie: session={cookie}\r\n"
+                  f"Content-Length: 0\r\nConnection: close\r\n\r\n").encode())
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return int(data.split(b" ", 2)[1])
+
+
+def beban_http(port, method, path_fn, cookies, jumlah):
+    # len(cookies) klien bersamaan, masing-masing `jumlah` request berurutan
+    import asyncio
+
+    async def klien(i, latensi):
+        for k in range(jumlah):
+            mulai = time.perf_counter()
+            status = await kirim_http(port, method, path_fn(i, k), cookies[i])
+            latensi.append(time.perf_counter() - mulai)
+            if status >= 400:
+                raise RuntimeError(f"{method} {path_fn(i, k)}: HTTP {status}")
+
+    async def semua():
+        latensi = []
+        mulai = time.perf_counter()
+        await asyncio.gather(*(klien(i, latensi) for i in range(len(cookies))))
+        return latensi, time.perf_counter() - mulai
+    return asyncio.run(semua())
+
+
+def bench_asgi(n, concurrency, jumlah):
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        sys.exit("uvicorn tidak terpasang: pip install uvicorn")
+    import asyncio
+    import app as aplikasi
+
+    db = buat_dataset(n, concurrency, concurrency * 2)
+    path = db.pool.db_name
+    db.pool.close_all()
+    serializer = aplikasi.app.session_interface.get_signing_serializer(aplikasi.app)
+    cookies = [serializer.dumps({"email": f"user{i}@bench", "role": "user"}) for i in range(concurrency)]
+    # playlist ke-i milik user (i % users), lihat buat_dataset
+    routes = [
+        ("POST", "/api/next", lambda i, k: "/api/next"),
+        ("GET", "/playlist/<id>", lambda i, k: f"/playlist/{i + 1 + concurrency * (k % 2)}"),
+        ("GET", "/playlists", lambda i, k: "/playlists"),
+        ("GET", "/main", lambda i, k: "/main"),
+    ]
+    repo = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, REMUSIC_DB=path)
+    print(f"katalog {n} lagu, {concurrency} klien bersamaan, {jumlah} request per klien per route")
+    print(f"{'mode':<6} {'route':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode in ("wsgi", "asgi"):
+        port = port_bebas()
+        if mode == "wsgi":
+            cmd = [sys.executable, "-c", SERVER_WSGI.format(port=port)]
+        else:
+            cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+                   "--log-level", "warning", "--no-access-log"]
+        proses = subprocess.Popen(cmd, cwd=repo, env=env, stdout=subprocess.DEVNULL)
+        try:
+            tunggu_port(port, proses)
+
+            async def siapkan():
+                for i in range(concurrency):
+                    await kirim_http(port, "POST", f"/api/play/s{i:07d}", cookies[i])
+            asyncio.run(siapkan())
+            for method, nama, path_fn in routes:
+                latensi, durasi = beban_http(port, method, path_fn, cookies, jumlah)
+                st = statistik(nama, n, latensi, durasi)
+                print(f"{mode:<6} {nama:<16} {st['ops_per_s']:>8.0f} {st['p50_us'] / 1000:>8.1f} "
+                      f"{st['p95_us'] / 1000:>8.1f} {st['p99_us'] / 1000:>8.1f}")
+        finally:
+            proses.terminate()
+            proses.wait()
+
+
+# --- SSE: ribuan koneksi /events di mode ASGI (uvicorn asgi:app) ---
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def cpu_detik(pid):
+    # utime + stime dari /proc/<pid>/stat (kolom 14 dan 15)
+    with open(f"/proc/{pid}/stat") as f:
+        kolom = f.read().rsplit(")", 1)[1].split()
+    return (int(kolom[11]) + int(kolom[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def jumlah_fd(pid):
+    return len(os.listdir(f"/proc/{pid}/fd"))
+
+
+def bench_sse(n, koneksi, users, putaran, idle, heartbeat):
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        sys.exit("uvicorn tidak terpasang: pip install uvicorn")
+    import asyncio
+    import resource
+    import app as aplikasi
+
+    # Satu file descriptor per koneksi, di klien (proses ini) dan di server
+    lunak, keras = resource.getrlimit(resource.RLIMIT_NOFILE)
+    perlu = koneksi + 1000
+    if lunak < perlu:
+        if keras != resource.RLIM_INFINITY and keras < perlu:
+            sys.exit(f"ulimit -n {keras} terlalu kecil untuk {koneksi} koneksi")
+        resource.setrlimit(resource.RLIMIT_NOFILE, (perlu, keras))
+
+    db = buat_dataset(n, users, users)
+    path = db.pool.db_name
+    db.pool.close_all()
+    serializer = aplikasi.app.session_interface.get_signing_serializer(aplikasi.app)
+    cookies = [serializer.dumps({"email": f"user{u}@bench", "role": "user"}) for u in range(users)]
+    repo = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, REMUSIC_DB=path, REMUSIC_SSE_HEARTBEAT=str(heartbeat))
+    port = port_bebas()
+    cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--backlog", "4096",
+           "--log-level", "warning", "--no-access-log"]
+    proses = subprocess.Popen(cmd, cwd=repo, env=env, stdout=subprocess.DEVNULL)
+
+    async def jalankan():
+        pertama = []           # detik sampai event pertama (state awal) per koneksi
+        menunggu = {}          # user -> [waktu publish, sisa tab, asyncio.Event]
+        kirim = []             # latensi publish -> diterima, per tab
+        hitung = {"ping": 0, "player": 0}
+        writers, tasks = [], []
+        batas_buka = asyncio.Semaphore(256)
+
+        async def baca(reader, u, siap):
+            while True:
+                try:
+                    data = await reader.readuntil(b"\n\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                if b": ping" in data:
+                    hitung["ping"] += 1
+                elif b"event: player" in data:
+                    hitung["player"] += 1
+                    if not siap.is_set():
+                        siap.set()
+                        continue
+                    w = menunggu.get(u)
+                    if w:
+                        kirim.append(time.perf_counter() - w[0])
+                        w[1] -= 1
+                        if w[1] == 0:
+                            w[2].set()
+
+        async def buka(i):
+            u = i % users
+            async with batas_buka:
+                mulai = time.perf_counter()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write((f"GET /events HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+                              f"Cookie: session={cookies[u]}\r\nAccept: text/event-stream\r\n\r\n").encode())
+                header = await reader.readuntil(b"\r\n\r\n")
+                if b" 200 " not in header.split(b"\r\n", 1)[0]:
+                    raise RuntimeError(f"/events: {header[:40]!r}")
+                siap = asyncio.Event()
+                tasks.append(asyncio.ensure_future(baca(reader, u, siap)))
+                await siap.wait()
+                pertama.append(time.perf_counter() - mulai)
+                writers.append(writer)
+
+        # Pemanasan: library dan session dimuat sebelum RSS awal diukur
+        for u in range(users):
+            await kirim_http(port, "GET", "/api/player", cookies[u])
+        rss0, fd0 = rss_kb(proses.pid), jumlah_fd(proses.pid)
+
+        mulai = time.perf_counter()
+        await asyncio.gather(*(buka(i) for i in range(koneksi)))
+        durasi_buka = time.perf_counter() - mulai
+        rss1, fd1 = rss_kb(proses.pid), jumlah_fd(proses.pid)
+        st = statistik("buka", n, pertama, durasi_buka)
+        print(f"{koneksi} koneksi /events ({users} user, {koneksi // users} tab per user) dibuka dalam "
+              f"{durasi_buka:.2f} s ({koneksi / durasi_buka:.0f}/s)")
+        print(f"  sampai state awal diterima: p50 {st['p50_us'] / 1000:.1f} ms, p99 {st['p99_us'] / 1000:.1f} ms")
+        print(f"  memori server: {rss0 / 1024:.1f} MB -> {rss1 / 1024:.1f} MB "
+              f"({(rss1 - rss0) / koneksi:.1f} KB per koneksi), fd {fd0} -> {fd1}")
+
+        # Idle: hanya heartbeat
+        hitung["ping"] = 0
+        cpu0 = cpu_detik(proses.pid)
+        await asyncio.sleep(idle)
+        cpu = cpu_detik(proses.pid) - cpu0
+        print(f"  idle {idle:.0f} s (heartbeat tiap {heartbeat:g} s): {hitung['ping']} heartbeat diterima, "
+              f"CPU server {cpu:.2f} s ({cpu / idle * 100:.1f}%)")
+
+        # Fan-out: satu perubahan queue -> semua tab user tersebut
+        tab = [koneksi // users + (1 if u < koneksi % users else 0) for u in range(users)]
+        mulai = time.perf_counter()
+        for r in range(putaran):
+            u = r % users
+            w = menunggu[u] = [time.perf_counter(), tab[u], asyncio.Event()]
+            status = await kirim_http(port, "POST", f"/api/queue/s{r % n:07d}", cookies[u])
+            if status != 200:
+                raise RuntimeError(f"/api/queue: HTTP {status}")
+            await asyncio.wait_for(w[2].wait(), 10)
+            del menunggu[u]
+        durasi = time.perf_counter() - mulai
+        st = statistik("kirim", n, kirim, durasi)
+        print(f"  {putaran} perubahan, {len(kirim)} event terkirim: latensi publish -> diterima "
+              f"p50 {st['p50_us'] / 1000:.1f} ms, p95 {st['p95_us'] / 1000:.1f} ms, p99 {st['p99_us'] / 1000:.1f} ms")
+
+        # Tutup semua: server harus melepas pelanggan dan socket-nya
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*tasks)
+        for _ in range(50):
+            if jumlah_fd(proses.pid) <= fd0 + 5:
+                break
+            await asyncio.sleep(0.1)
+        print(f"  setelah semua klien putus: fd {jumlah_fd(proses.pid)}, memori {rss_kb(proses.pid) / 1024:.1f} MB")
+
+    try:
+        tunggu_port(port, proses)
+        asyncio.run(jalankan())
+    finally:
+        proses.terminate()
+        proses.wait()
+
+
+# --- Backend session: stand-in RESP (tanpa server Redis) + uji lost update ---
+class RespStandIn(socketserver.ThreadingTCPServer):
+    """Server RESP minimal di memori (PING, GET, SET [EX], DEL) untuk menguji
+    session_store.RedisBackend tanpa server Redis sungguhan."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _RespHandler)
+        self.data = {}      # key -> (value, waktu kedaluwarsa atau None)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "redis://%s:%d" % self.server_address
+
+    def jalankan(self, args):
+        cmd = args[0].upper()
+        with self.lock:
+            if cmd == b"PING":
+                return b"+PONG\r\n"
+            if cmd == b"GET" and len(args) == 2:
+                value, akhir = self.data.get(args[1], (None, None))
+                if value is None or (akhir is not None and akhir <= time.monotonic()):
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(value), value)
+            if cmd == b"SET" and len(args) in (3, 5):
+                akhir = None
+                if len(args) == 5:
+                    if args[3].upper() != b"EX":
+                        return b"-ERR syntax error\r\n"
+                    akhir = time.monotonic() + int(args[4])
+                self.data[args[1]] = (args[2], akhir)
+                return b"+OK\r\n"
+            if cmd == b"DEL":
+                return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args[1:])
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                size = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(size + 2)[:-2])
+            self.wfile.write(self.server.jalankan(args))
+
+
+def uji_redis_backend(url, jumlah):
+    from session_store import RedisBackend, RedisError
+    backend = RedisBackend.from_url(url)
+    states = {f"user{i}@bench": {"u": f"user{i}", "q": [f"s{j:07d}" for j in range(i % 20)]} for i in range(jumlah)}
+    mulai = time.perf_counter()
+    backend.save_many(states)
+    durasi = time.perf_counter() - mulai
+    assert all(backend.load(email) == state for email, state in states.items()), "load != save_many"
+    backend.delete("user0@bench")
+    assert backend.load("user0@bench") is None, "delete tidak menghapus"
+    assert backend.load("tidak-ada@bench") is None
+    try:
+        backend._pipeline([("PERINTAH-ASING",)])
+        raise AssertionError("error server tidak menjadi RedisError")
+    except RedisError:
+        pass
+    # Koneksi dibuka ulang setelah error
+    assert backend.load("user1@bench") == states["user1@bench"]
+    backend.close()
+    print(f"  RedisBackend: save_many {jumlah} session dalam satu pipeline {durasi * 1000:.1f} ms, "
+          f"load/delete/error OK")
+
+
+def uji_lost_update(nama, backend, db):
+    from session_store import SessionManager
+    from models import UserSession
+    library = db.library
+
+    def manager(max_age):
+        return SessionManager(backend, UserSession.to_state, lambda state: UserSession.from_state(state, library),
+                              lambda user, state: user.muat_state(state, library), max_age=max_age)
+
+    lagu = [library.cari(f"s{i:07d}").lagu for i in range(3)]
+    email = f"{nama}@bench"
+    a = manager(0)      # max_age 0: setiap get menyegarkan dari backend
+    a[email] = UserSession(nama, email)
+    a.flush()
+
+    # 1. Request memegang session, lalu session disegarkan oleh request lain
+    dipegang = a.get(email)
+    disegarkan = a.get(email)
+    assert disegarkan is dipegang, "session disegarkan sebagai objek baru"
+    with dipegang.lock:
+        dipegang.queue.enqueue(lagu[0])
+        a.tandai(email, dipegang)
+    a.flush()
+    assert backend.load(email)["q"] == [lagu[0].id], f"perubahan hilang: {backend.load(email)}"
+
+    # 2. Worker A punya salinan lama; worker B mengubah. GET di A tidak menimpa B.
+    a_lama = manager(3600)
+    a_lama.get(email)
+    b = manager(0)
+    user_b = b.get(email)
+    with user_b.lock:
+        user_b.queue.enqueue(lagu[1])
+        b.tandai(email, user_b)
+    b.flush()
+    a_lama.get(email)   # request baca saja
+    a_lama.flush()
+    assert backend.load(email)["q"] == [lagu[0].id, lagu[1].id], f"state B tertimpa: {backend.load(email)}"
+
+    # 3. Worker A menyegarkan dan melihat perubahan dari B di objek yang sama
+    assert [s.id for s in a.get(email).queue] == [lagu[0].id, lagu[1].id]
+    assert a.get(email) is dipegang
+    print(f"  {nama}: refresh di tempat, tanpa lost update, GET tidak menimpa worker lain: OK")
+
+
+def bench_sessions(jumlah):
+    from session_store import SQLiteBackend, RedisBackend
+    server = RespStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"stand-in RESP di {server.url}")
+    try:
+        uji_redis_backend(server.url, jumlah)
+        db = buat_db(100)
+        uji_lost_update("sqlite", SQLiteBackend(db.get_connection), db)
+        uji_lost_update("redis", RedisBackend.from_url(server.url), db)
+    except AssertionError as e:
+        print(f"GAGAL: {e}")
+        return 1
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("library", help="latensi cari/hapus DoublyLinkedList vs ukuran katalog")
+    p.add_argument("--sizes", default="1000,10000,100000,300000")
+    p.add_argument("--lookups", type=int, default=20000)
+    p = sub.add_parser("shuffle", help="smart shuffle: SQL ORDER BY RANDOM() vs GenreIndex")
+    p.add_argument("--sizes", default="1000,10000,100000")
+    p.add_argument("--picks", type=int, default=2000)
+    p = sub.add_parser("playlists", help="query plan + latensi query playlist sebelum/sesudah migrasi indeks")
+    p.add_argument("--entries", type=int, default=200000)
+    p.add_argument("--repeat", type=int, default=200)
+    p = sub.add_parser("playback", help="load test /next: redirect + render vs API JSON")
+    p.add_argument("--songs", type=int, default=10000)
+    p.add_argument("--requests", type=int, default=300)
+    p.add_argument("--workers", type=int, default=4)
+    p = sub.add_parser("memory", help="memori library per lagu: __dict__ vs __slots__ + intern")
+    p.add_argument("--songs", type=int, default=100000)
+    p.add_argument("--playlists", type=int, default=1000)
+    p = sub.add_parser("suite", help="library + query + route (test client, worker konkuren), hasil JSON")
+    p.add_argument("--sizes", default="1000,10000,100000", help="ukuran katalog, mis. 1000,100000,1000000")
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--playlists", type=int, default=500)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--requests", type=int, default=200, help="request per worker per route")
+    p.add_argument("--ops", type=int, default=20000, help="operasi per benchmark library")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", default="-", help="file output (default stdout)")
+    p = sub.add_parser("compare", help="bandingkan dua hasil suite, exit 1 jika ada regresi")
+    p.add_argument("sebelum")
+    p.add_argument("sesudah")
+    p.add_argument("--threshold", type=float, default=0.2, help="regresi jika p50 naik lebih dari ini (0.2 = 20%%)")
+    p = sub.add_parser("asgi", help="latensi di bawah beban konkuren: server WSGI threaded vs ASGI (uvicorn)")
+    p.add_argument("--songs", type=int, default=10000)
+    p.add_argument("--concurrency", type=int, default=64)
+    p.add_argument("--requests", type=int, default=20, help="request per klien per route")
+    p = sub.add_parser("plays", help="log putar: commit per event vs buffer + rollup")
+    p.add_argument("--songs", type=int, default=10000)
+    p.add_argument("--events", type=int, default=100000)
+    p = sub.add_parser("stress", help="stress test: play/next/queue bersamaan dengan edit admin")
+    p.add_argument("--songs", type=int, default=5000)
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--seconds", type=float, default=10)
+    p = sub.add_parser("rekomendasi", help="indeks co-occurrence playlist: waktu build, memori, latensi")
+    p.add_argument("--songs", type=int, default=100000)
+    p.add_argument("--entries", type=int, default=1000000, help="jumlah baris playlist_songs")
+    p.add_argument("--playlist-size", type=int, default=20)
+    p.add_argument("--clusters", type=int, default=2000, help="jumlah kelompok selera di dataset sintetis")
+    p = sub.add_parser("startup", help="cold start: import models + pemakaian pertama library, proses baru")
+    p.add_argument("--sizes", default="1000,10000,100000")
+    p.add_argument("--repeat", type=int, default=3)
+    p = sub.add_parser("sse", help="ribuan koneksi SSE /events idle: memori, heartbeat, latensi fan-out (ASGI)")
+    p.add_argument("--songs", type=int, default=10000)
+    p.add_argument("--connections", type=int, default=5000)
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--rounds", type=int, default=500, help="jumlah perubahan queue yang dikirim")
+    p.add_argument("--idle", type=float, default=10, help="detik koneksi dibiarkan idle")
+    p.add_argument("--heartbeat", type=float, default=2, help="interval heartbeat server (detik)")
+    p = sub.add_parser("sessions", help="backend session: RedisBackend lawan stand-in RESP, uji lost update")
+    p.add_argument("--sessions", type=int, default=1000, help="jumlah session per save_many")
+    args = parser.parse_args()
+    if args.cmd == "sessions":
+        sys.exit(bench_sessions(args.sessions))
+    if args.cmd == "sse":
+        return bench_sse(args.songs, args.connections, args.users, args.rounds, args.idle, args.heartbeat)
+    if args.cmd == "startup":
+        return bench_startup([int(x) for x in args.sizes.split(",")], args.repeat)
+    if args.cmd == "rekomendasi":
+        return bench_rekomendasi(args.songs, args.entries, args.playlist_size, args.clusters)
+    if args.cmd == "stress":
+        sys.exit(bench_stress(args.songs, args.workers, args.seconds))
+    if args.cmd == "plays":
+        return bench_plays(args.songs, args.events)
+    if args.cmd == "asgi":
+        return bench_asgi(args.songs, args.concurrency, args.requests)
+    if args.cmd == "suite":
+        return bench_suite([int(x) for x in args.sizes.split(",")], args.users, args.playlists,
+                           args.workers, args.requests, args.ops, args.json, args.seed)
+    if args.cmd == "compare":
+        sys.exit(bench_compare(args.sebelum, args.sesudah, args.threshold))
+    if args.cmd == "memory":
+        return bench_memory(args.songs, args.playlists)
+    if args.cmd == "playlists":
+        return bench_playlists(args.entries, args.repeat)
+    if args.cmd == "playback":
+        return bench_playback(args.songs, args.requests, args.workers)
+    sizes = [int(x) for x in args.sizes.split(",")]
+    if args.cmd == "library":
+        bench_library(sizes, args.lookups)
+    elif args.cmd == "shuffle":
+        bench_shuffle(sizes, args.picks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Pub/sub di dalam proses untuk server-sent events (SSE).
+
+Tiap koneksi /events adalah satu `Pelanggan` pada kanal (kunci = email user).
+`EventHub.terbitkan()` meng-encode event sekali lalu memasukkan bytes yang
+sama ke antrean setiap pelanggan kanal tersebut. Antrean dibatasi
+SUBSCRIBER_BUFFER; jika klien lambat dan antrean penuh, event tertua
+dibuang (event pemutar berisi state lengkap, jadi event terbaru sudah cukup).
+
+Pelanggan bisa dibaca dua cara:
+- iterasi biasa (server WSGI, satu thread per koneksi);
+- `aliran()` async generator (mode ASGI): koneksi idle hanya coroutine yang
+  menunggu asyncio.Event, tanpa thread dan tanpa timer per koneksi.
+
+Heartbeat dikirim oleh satu thread untuk semua koneksi: tiap
+HEARTBEAT_INTERVAL detik pelanggan yang tidak menerima apa pun diberi komentar
+SSE, agar proxy tidak menutup koneksi idle dan koneksi yang putus terdeteksi.
+
+Hub hanya menjangkau koneksi di proses ini. Dengan beberapa worker, tab yang
+terhubung ke worker lain tidak menerima event (mereka tetap sinkron lewat
+session_store saat request berikutnya).
+"""
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+HEARTBEAT_INTERVAL = float(os.environ.get('REMUSIC_SSE_HEARTBEAT', 15))
+SUBSCRIBER_BUFFER = 16
+# Klien EventSource menyambung ulang setelah sekian milidetik jika koneksi putus
+RETRY_MS = 3000
+HEARTBEAT = b": ping\n\n"
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(id, nama, data):
+    # json.dumps tanpa indent tidak menghasilkan newline, jadi cukup satu baris data:
+    return f"id: {id}\nevent: {nama}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def _set_semua(events):
+    for event in events:
+        event.set()
+
+
+class Pelanggan:
+    __slots__ = ('hub', 'kunci', 'antrean', 'tertutup', 'terakhir', '_event', '_loop', '_thread')
+
+    def __init__(self, hub, kunci, awal):
+        self.hub = hub
+        self.kunci = kunci
+        self.antrean = deque([awal], maxlen=hub.buffer)
+        self.tertutup = False
+        self.terakhir = time.monotonic()   # waktu terakhir data diambil (untuk heartbeat)
+        self._event = None                  # threading.Event / asyncio.Event, dibuat saat mulai dibaca
+        self._loop = None
+        self._thread = None
+
+    def _dorong(self, data):
+        # Dipanggil hub (di bawah hub.lock), dari thread mana pun
+        if len(self.antrean) == self.antrean.maxlen:
+            self.hub.dibuang += 1
+        self.antrean.append(data)
+        self._bangunkan()
+
+    def _bangunkan(self):
+        event = self._event
+        if event is None:
+            return
+        if self._loop is None or self._thread == threading.get_ident():
+            event.set()
+            return
+        try:
+            # asyncio.Event tidak thread-safe: set dari thread event loop
+            self._loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass   # event loop sudah ditutup
+
+    def __iter__(self):
+        # Mode WSGI: thread ini menunggu sampai ada event atau heartbeat
+        self._event = event = threading.Event()
+        antrean = self.antrean
+        while not self.tertutup:
+            event.clear()
+            while antrean and not self.tertutup:
+                self.terakhir = time.monotonic()
+                yield antrean.popleft()
+            event.wait()
+
+    async def aliran(self):
+        """Async generator bytes SSE untuk mode ASGI; selesai setelah close()."""
+        import asyncio
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.get_ident()
+        self._event = event = asyncio.Event()
+        antrean = self.antrean
+        while not self.tertutup:
+            event.clear()
+            while antrean and not self.tertutup:
+                self.terakhir = time.monotonic()
+                yield antrean.popleft()
+            await event.wait()
+
+    def close(self):
+        # Dipanggil server WSGI saat response selesai, atau saat klien putus
+        if not self.tertutup:
+            self.tertutup = True
+            self.hub._lepas(self)
+            self._bangunkan()
+
+
+class EventHub:
+    def __init__(self, heartbeat=HEARTBEAT_INTERVAL, buffer=SUBSCRIBER_BUFFER):
+        self.heartbeat = heartbeat
+        self.buffer = buffer
+        self.saluran = {}           # kunci -> set Pelanggan
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.dibuang = 0            # event yang dibuang karena antrean pelanggan penuh
+        self._ticker = None
+
+    def __len__(self):
+        # Jumlah koneksi aktif
+        with self.lock:
+            return sum(len(pelanggan) for pelanggan in self.saluran.values())
+
+    def punya_pelanggan(self, kunci):
+        return kunci in self.saluran
+
+    def langganan(self, kunci, nama=None, data=None):
+        """Pelanggan baru pada kanal `kunci`. (nama, data) opsional dikirim
+        sebagai event pertama (mis. state saat ini, agar tab yang baru
+        terhubung atau menyambung ulang langsung sinkron)."""
+        awal = f"retry: {RETRY_MS}\n\n".encode()
+        if nama is not None:
+            awal += format_event(next(self._ids), nama, data)
+        pelanggan = Pelanggan(self, kunci, awal)
+        with self.lock:
+            self.saluran.setdefault(kunci, set()).add(pelanggan)
+        self._start_ticker()
+        return pelanggan
+
+    def terbitkan(self, kunci, nama, data):
+        """Kirim event ke semua pelanggan `kunci`. Mengembalikan jumlah pelanggan."""
+        with self.lock:
+            pelanggan = self.saluran.get(kunci)
+            if not pelanggan:
+                return 0
+            pesan = format_event(next(self._ids), nama, data)
+            for p in pelanggan:
+                p._dorong(pesan)
+            return len(pelanggan)
+
+    def _lepas(self, pelanggan):
+        with self.lock:
+            kanal = self.saluran.get(pelanggan.kunci)
+            if kanal is not None:
+                kanal.discard(pelanggan)
+                if not kanal:
+                    del self.saluran[pelanggan.kunci]
+
+    def detak(self):
+        """Kirim heartbeat ke pelanggan yang idle sejak interval terakhir.
+        Mengembalikan jumlah heartbeat yang dikirim."""
+        batas = time.monotonic() - self.heartbeat
+        per_loop = {}   # event loop -> asyncio.Event yang harus di-set
+        jumlah = 0
+        with self.lock:
+            for kanal in self.saluran.values():
+                for p in kanal:
+                    if p.antrean or p.terakhir > batas:
+                        continue
+                    p.antrean.append(HEARTBEAT)
+                    jumlah += 1
+                    if p._loop is None:
+                        p._bangunkan()
+                    elif p._event is not None:
+                        per_loop.setdefault(p._loop, []).append(p._event)
+        # Satu call_soon_threadsafe per event loop, bukan satu per koneksi
+        for loop, events in per_loop.items():
+            try:
+                loop.call_soon_threadsafe(_set_semua, events)
+            except RuntimeError:
+                pass
+        return jumlah
+
+    def _start_ticker(self):
+        if self._ticker is not None:
+            return
+        with self.lock:
+            if self._ticker is None:
+                self._ticker = threading.Thread(target=self._tick_loop, name="sse-heartbeat", daemon=True)
+                self._ticker.start()
+
+    def _tick_loop(self):
+        # Setengah interval: pelanggan idle menerima heartbeat paling lambat 1.5x interval
+        while True:
+            time.sleep(self.heartbeat / 2)
+            try:
+                self.detak()
+            except Exception:
+                logger.exception("heartbeat SSE gagal")
@@ -0,0 +1,133 @@
+"""Pipeline gambar untuk cover lagu dan avatar.
+
+Upload disimpan dengan nama berdasarkan hash isi file (`<sha256>.<ext>`), jadi
+file yang sama hanya tersimpan sekali dan URL-nya tidak pernah berubah isi
+(aman di-cache selamanya). Varian WebP yang lebih kecil dibuat di thread pool
+terpisah sehingga request upload tidak menunggu proses resize.
+
+Pillow opsional: tanpa Pillow, hanya file asli yang disimpan dan template
+otomatis memakai file asli.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow tidak terpasang
+    Image = None
+
+# nama varian -> sisi terpanjang (px)
+VARIANTS = {
+    'thumb': 320,   # kartu di grid lagu, player bar
+    'detail': 720,  # cover playlist/halaman detail
+}
+WEBP_QUALITY = 80
+HASH_LENGTH = 20
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-worker")
+_lock = threading.Lock()
+_pending = set()
+# Gambar yang gagal diproses (rusak/format tidak dikenal); tidak dijadwalkan
+# ulang setiap kali halaman dirender
+_gagal = set()
+# Naik setiap kali worker selesai memproses gambar; HTML yang menyimpan hasil
+# pilih_varian (cache fragmen, ETag) memakai nomor ini sebagai bagian kuncinya
+_versi = 0
+
+
+def nama_varian(filename, variant):
+    return f"{os.path.splitext(filename)[0]}_{variant}.webp"
+
+
+def simpan_upload(file, folder):
+    """Simpan FileStorage dengan nama hash isi file, lalu jadwalkan varian.
+
+    Mengembalikan nama file (relatif terhadap `folder`)."""
+    return simpan_data(file.read(), file.filename, folder)
+
+
+def simpan_data(data, nama_asli, folder):
+    # Sama seperti simpan_upload, untuk isi file yang sudah dibaca ke memori
+    ext = os.path.splitext(nama_asli)[1].lower() or '.jpg'
+    filename = hashlib.sha256(data).hexdigest()[:HASH_LENGTH] + ext
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        _tulis_atomik(path, lambda f: f.write(data))
+    jadwalkan_varian(folder, filename)
+    return filename
+
+
+def _tulis_atomik(path, tulis):
+    # Tulis lewat file sementara bernama unik (mkstemp: aman antar thread dan
+    # antar proses worker) di folder yang sama, lalu ganti nama
+    fd, tmp = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            tulis(f)
+        os.chmod(tmp, 0o644)   # mkstemp membuat file 0600
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def jadwalkan_varian(folder, filename):
+    if Image is None:
+        return
+    with _lock:
+        if filename in _pending or filename in _gagal:
+            return
+        _pending.add(filename)
+    _executor.submit(_buat_varian, folder, filename)
+
+
+def _buat_varian(folder, filename):
+    global _versi
+    try:
+        with Image.open(os.path.join(folder, filename)) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+            for variant, size in VARIANTS.items():
+                target = os.path.join(folder, nama_varian(filename, variant))
+                if os.path.exists(target):
+                    continue
+                resized = img.copy()
+                resized.thumbnail((size, size), Image.LANCZOS)
+                _tulis_atomik(target, lambda f: resized.save(f, 'WEBP', quality=WEBP_QUALITY, method=4))
+    except Exception as e:
+        # Biasanya file upload yang rusak, bukan bug: cukup satu baris peringatan
+        logger.warning("gagal membuat varian %s: %s", filename, e)
+        with _lock:
+            _gagal.add(filename)
+    finally:
+        with _lock:
+            _pending.discard(filename)
+            _versi += 1
+
+
+def versi_varian():
+    """Nomor yang berubah setelah ada varian baru (lihat _buat_varian)."""
+    return _versi
+
+
+def pilih_varian(folder, filename, variant):
+    """Nama file varian jika sudah ada, selain itu file asli.
+
+    Gambar lama yang belum punya varian dijadwalkan untuk diproses (sekali
+    saja jika pemrosesannya gagal)."""
+    if not filename or variant not in VARIANTS:
+        return filename
+    name = nama_varian(filename, variant)
+    if os.path.exists(os.path.join(folder, name)):
+        return name
+    if os.path.exists(os.path.join(folder, filename)):
+        jadwalkan_varian(folder, filename)
+    return filename
@@ -0,0 +1,272 @@
+"""Instrumentasi REMusic: latensi route, waktu method, jumlah query SQLite.
+
+Aktifkan dengan env REMUSIC_METRICS=1 atau dari /admin/metrics. Saat tidak
+aktif, method kelas yang diinstrumentasi adalah fungsi aslinya (wrapper
+dipasang/dilepas saat toggle) dan hook request hanya mengecek satu flag, jadi
+overhead-nya hampir nol.
+
+Data yang dicatat:
+- remusic_http_request_duration_seconds{route,method,status}
+- remusic_db_queries_per_request{route}
+- remusic_call_duration_seconds{target}  (method DatabaseManager, LibrarySnapshot, ...)
+- remusic_template_render_seconds{template}
+- remusic_db_queries_total
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Batas atas bucket (detik); operasi struktur data di orde mikrodetik
+BUCKETS = (1e-6, 1e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+enabled = False
+_lock = threading.Lock()
+
+
+class _Request:
+    __slots__ = ('mulai', 'query', 'status', 'render')
+
+    def __init__(self):
+        self.mulai = time.perf_counter()
+        self.query = 0
+        self.status = 500
+        self.render = []   # stack: template bisa dirender di dalam render lain
+
+
+# Request yang sedang dilayani. ContextVar, bukan threading.local: di mode ASGI
+# banyak request bergantian di thread event loop, dan query-nya berjalan di
+# thread executor yang menerima salinan konteks request (lihat async_store.py)
+_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # + bucket +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def kuantil(self, q):
+        # Perkiraan kuantil dari batas atas bucket
+        target = q * self.count
+        total = 0
+        for i, n in enumerate(self.counts):
+            total += n
+            if total >= target and n:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return 0.0
+
+
+# nama metrik -> {label (tuple pasangan) -> Histogram}
+_histograms = {}
+_counters = {}
+
+
+def observe(nama, labels, value, buckets=BUCKETS):
+    with _lock:
+        seri = _histograms.setdefault(nama, {})
+        h = seri.get(labels)
+        if h is None:
+            h = seri[labels] = Histogram(buckets)
+        h.observe(value)
+
+
+def inc(nama, value=1):
+    with _lock:
+        _counters[nama] = _counters.get(nama, 0) + value
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+# --- Instrumentasi kelas ---
+_targets = []      # (kelas, prefix)
+_asli = {}         # (kelas, nama method) -> fungsi asli
+_pool_patch = []   # (kelas pool, connection asli, connection terinstrumentasi)
+
+
+def _bungkus(fn, target):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        mulai = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observe('remusic_call_duration_seconds', (('target', target),), time.perf_counter() - mulai)
+    return wrapper
+
+
+def _method_publik(cls):
+    for nama, fn in vars(cls).items():
+        if nama.startswith('_') or not inspect.isfunction(fn) or inspect.isgeneratorfunction(fn):
+            continue
+        yield nama, fn
+
+
+def daftarkan(cls, prefix=None):
+    """Catat waktu semua method publik `cls` selama metrics aktif."""
+    _targets.append((cls, prefix or cls.__name__))
+    if enabled:
+        _pasang_wrapper(cls, prefix or cls.__name__)
+
+
+def _pasang_wrapper(cls, prefix):
+    for nama, fn in list(_method_publik(cls)):
+        if (cls, nama) not in _asli:
+            _asli[(cls, nama)] = fn
+            setattr(cls, nama, _bungkus(fn, f"{prefix}.{nama}"))
+
+
+def _lepas_wrapper():
+    for (cls, nama), fn in _asli.items():
+        setattr(cls, nama, fn)
+    _asli.clear()
+
+
+def _hitung_query(statement):
+    req = _request.get()
+    with _lock:
+        _counters['remusic_db_queries_total'] = _counters.get('remusic_db_queries_total', 0) + 1
+        if req is not None:
+            req.query += 1
+
+
+def daftarkan_pool(pool_cls):
+    """Hitung query SQLite lewat trace callback pada koneksi dari pool."""
+    asli = pool_cls.connection
+
+    @contextmanager
+    def connection(self):
+        with asli(self) as conn:
+            conn.set_trace_callback(_hitung_query)
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+    _pool_patch.append((pool_cls, asli, connection))
+    if enabled:
+        pool_cls.connection = connection
+
+
+def aktifkan(aktif=True):
+    global enabled
+    with _lock:
+        if aktif == enabled:
+            return
+        enabled = aktif
+    if aktif:
+        for cls, prefix in _targets:
+            _pasang_wrapper(cls, prefix)
+    else:
+        _lepas_wrapper()
+    for cls, asli, instrumentasi in _pool_patch:
+        cls.connection = instrumentasi if aktif else asli
+
+
+# --- Hook Flask ---
+def pasang(app):
+    from flask import request, before_render_template, template_rendered
+
+    @app.before_request
+    def _mulai_request():
+        if enabled:
+            _request.set(_Request())
+
+    @app.after_request
+    def _status_request(response):
+        req = _request.get()
+        if req is not None:
+            req.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _selesai_request(exc):
+        req = _request.get()
+        if req is None:
+            return
+        _request.set(None)
+        if not enabled:
+            return
+        route = request.url_rule.rule if request.url_rule else '<tidak ditemukan>'
+        observe('remusic_http_request_duration_seconds',
+                (('route', route), ('method', request.method), ('status', str(req.status))),
+                time.perf_counter() - req.mulai)
+        observe('remusic_db_queries_per_request', (('route', route),), req.query, QUERY_BUCKETS)
+
+    def _mulai_render(sender, template, context, **extra):
+        req = _request.get()
+        if enabled and req is not None:
+            req.render.append(time.perf_counter())
+
+    def _selesai_render(sender, template, context, **extra):
+        req = _request.get()
+        stack = req.render if req is not None else None
+        if stack:
+            observe('remusic_template_render_seconds', (('template', template.name or '?'),),
+                    time.perf_counter() - stack.pop())
+
+    before_render_template.connect(_mulai_render, app, weak=False)
+    template_rendered.connect(_selesai_render, app, weak=False)
+
+    if os.environ.get("REMUSIC_METRICS") == "1":
+        aktifkan(True)
+
+
+# --- Output ---
+def ringkasan():
+    """Snapshot metrik dalam bentuk dict (untuk JSON)."""
+    with _lock:
+        hasil = {'enabled': enabled, 'counters': dict(_counters), 'histograms': {}}
+        for nama, seri in _histograms.items():
+            hasil['histograms'][nama] = sorted((
+                dict(labels, count=h.count, sum=round(h.sum, 6), avg=round(h.sum / h.count, 6),
+                     p50=h.kuantil(0.5), p95=h.kuantil(0.95), max=round(h.max, 6))
+                for labels, h in seri.items()), key=lambda d: -d['sum'])
+    return hasil
+
+
+def _label(labels, extra=()):
+    pasangan = list(labels) + list(extra)
+    if not pasangan:
+        return ''
+    isi = ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pasangan)
+    return '{' + isi + '}'
+
+
+def prometheus():
+    """Metrik dalam format teks Prometheus (exposition format 0.0.4)."""
+    baris = []
+    with _lock:
+        for nama, value in sorted(_counters.items()):
+            baris.append(f"# TYPE {nama} counter")
+            baris.append(f"{nama} {value}")
+        for nama, seri in sorted(_histograms.items()):
+            baris.append(f"# TYPE {nama} histogram")
+            for labels, h in seri.items():
+                kumulatif = 0
+                for batas, n in zip(h.buckets, h.counts):
+                    kumulatif += n
+                    baris.append(f"{nama}_bucket{_label(labels, [('le', repr(float(batas)))])} {kumulatif}")
+                baris.append(f"{nama}_bucket{_label(labels, [('le', '+Inf')])} {h.count}")
+                baris.append(f"{nama}_sum{_label(labels)} {h.sum}")
+                baris.append(f"{nama}_count{_label(labels)} {h.count}")
+    return "\n".join(baris) + "\n"
@@ -0,0 +1,174 @@
+"""Migrasi skema database REMusic.
+
+Versi skema disimpan di `PRAGMA user_version`. Setiap migrasi dijalankan
+sekali, berurutan, masing-masing dalam satu transaksi. Untuk mengubah skema,
+tambahkan fungsi baru di akhir MIGRATIONS; jangan ubah migrasi yang sudah ada.
+"""
+import sqlite3
+
+
+def m001_skema_awal(c):
+    # Skema awal. Database lama (dibuat sebelum ada migrasi) sudah punya
+    # tabel-tabel ini, jadi kolom tambahan dicek satu per satu.
+    c.execute('''CREATE TABLE IF NOT EXISTS users
+                 (email TEXT PRIMARY KEY, username TEXT, password TEXT, role TEXT, profile_pic TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS songs
+                 (id TEXT PRIMARY KEY, judul TEXT, artis TEXT, album TEXT, durasi TEXT, genre TEXT, image TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS playlists
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT, user_email TEXT, name TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS playlist_songs
+                 (playlist_id INTEGER, song_id TEXT, position INTEGER)''')
+
+    c.execute("PRAGMA table_info(users)")
+    if 'profile_pic' not in [column[1] for column in c.fetchall()]:
+        c.execute("ALTER TABLE users ADD COLUMN profile_pic TEXT")
+
+    c.execute("PRAGMA table_info(songs)")
+    if 'image' not in [column[1] for column in c.fetchall()]:
+        c.execute("ALTER TABLE songs ADD COLUMN image TEXT")
+
+    c.execute("PRAGMA table_info(playlist_songs)")
+    if 'position' not in [column[1] for column in c.fetchall()]:
+        c.execute("ALTER TABLE playlist_songs ADD COLUMN position INTEGER")
+        # Isi posisi awal sesuai urutan lagu ditambahkan
+        posisi, terakhir, n = [], None, 0
+        for rowid, playlist_id in c.execute("SELECT rowid, playlist_id FROM playlist_songs ORDER BY playlist_id, rowid").fetchall():
+            n = n + 1 if playlist_id == terakhir else 0
+            terakhir = playlist_id
+            posisi.append((n, rowid))
+        c.executemany("UPDATE playlist_songs SET position=? WHERE rowid=?", posisi)
+
+    c.execute("INSERT OR IGNORE INTO users (email, username, password, role) VALUES (?, ?, ?, ?)",
+              ('admin@remusic.com', 'Admin Ganteng', 'admin123', 'admin'))
+
+
+def m002_indeks_pencarian(c):
+    # Indeks full-text untuk pencarian, rowid = rowid baris di tabel songs
+    try:
+        c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5
+                     (judul, artis, album, genre, tokenize="unicode61 remove_diacritics 2")''')
+    except sqlite3.OperationalError:
+        # SQLite tanpa FTS5: pencarian jatuh ke filter biasa
+        return
+    c.execute("DELETE FROM songs_fts")
+    c.execute("INSERT INTO songs_fts (rowid, judul, artis, album, genre) SELECT rowid, judul, artis, album, genre FROM songs")
+
+
+def m003_kunci_playlist_songs(c):
+    # playlist_songs dibangun ulang dengan primary key (playlist_id, song_id)
+    # dan foreign key. Baris duplikat atau yatim (playlist/lagu sudah dihapus)
+    # dibuang saat disalin.
+    c.execute('''CREATE TABLE playlist_songs_baru
+                 (playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+                  song_id TEXT NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+                  position INTEGER NOT NULL,
+                  PRIMARY KEY (playlist_id, song_id)) WITHOUT ROWID''')
+    c.execute('''INSERT INTO playlist_songs_baru (playlist_id, song_id, position)
+                 SELECT playlist_id, song_id, MIN(COALESCE(position, 0)) FROM playlist_songs
+                 WHERE playlist_id IN (SELECT id FROM playlists) AND song_id IN (SELECT id FROM songs)
+                 GROUP BY playlist_id, song_id''')
+    c.execute("DROP TABLE playlist_songs")
+    c.execute("ALTER TABLE playlist_songs_baru RENAME TO playlist_songs")
+    # Urutan lagu dalam playlist (ORDER BY position, MAX(position)) tanpa sort
+    c.execute("CREATE INDEX idx_playlist_songs_position ON playlist_songs (playlist_id, position, song_id)")
+    # Cascade saat lagu dihapus
+    c.execute("CREATE INDEX idx_playlist_songs_song ON playlist_songs (song_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_playlists_user ON playlists (user_email, name)")
+
+
+def m004_riwayat_putar(c):
+    # Log mentah setiap lagu diputar (ditulis per batch oleh PlayLog)
+    c.execute('''CREATE TABLE play_events
+                 (id INTEGER PRIMARY KEY, user_email TEXT NOT NULL, song_id TEXT NOT NULL, played_at REAL NOT NULL)''')
+    # Rollup dari play_events; query "paling sering"/"terakhir diputar" hanya membaca tabel ini
+    c.execute('''CREATE TABLE song_play_counts
+                 (song_id TEXT PRIMARY KEY, plays INTEGER NOT NULL, last_played REAL NOT NULL) WITHOUT ROWID''')
+    c.execute("CREATE INDEX idx_song_play_counts_plays ON song_play_counts (plays DESC)")
+    c.execute('''CREATE TABLE genre_play_counts
+                 (genre TEXT PRIMARY KEY, plays INTEGER NOT NULL, last_played REAL NOT NULL) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE user_song_plays
+                 (user_email TEXT NOT NULL, song_id TEXT NOT NULL, plays INTEGER NOT NULL, last_played REAL NOT NULL,
+                  PRIMARY KEY (user_email, song_id)) WITHOUT ROWID''')
+    c.execute("CREATE INDEX idx_user_song_plays_recent ON user_song_plays (user_email, last_played DESC)")
+    # id event terakhir yang sudah masuk rollup
+    c.execute("CREATE TABLE rollup_state (name TEXT PRIMARY KEY, last_event_id INTEGER NOT NULL)")
+    c.execute("INSERT INTO rollup_state VALUES ('plays', 0)")
+
+
+def m005_audio_lagu(c):
+    # Nama file audio (di folder audio, lihat audio.py); NULL = belum ada audio
+    c.execute("PRAGMA table_info(songs)")
+    if 'audio' not in [column[1] for column in c.fetchall()]:
+        c.execute("ALTER TABLE songs ADD COLUMN audio TEXT")
+
+
+def m006_versi_katalog(c):
+    # Versi isi tabel songs untuk snapshot library (lihat snapshot.py). Trigger
+    # menaikkan versi untuk setiap baris yang ditulis, dari proses mana pun.
+    c.execute('''CREATE TABLE catalog_state
+                 (id INTEGER PRIMARY KEY CHECK (id = 1), uid TEXT NOT NULL, version INTEGER NOT NULL)''')
+    c.execute("INSERT INTO catalog_state VALUES (1, lower(hex(randomblob(8))), 1)")
+    for aksi in ('INSERT', 'UPDATE', 'DELETE'):
+        c.execute(f'''CREATE TRIGGER songs_versi_{aksi.lower()} AFTER {aksi} ON songs
+                      BEGIN UPDATE catalog_state SET version = version + 1 WHERE id = 1; END''')
+
+
+def m007_id_indeks_pencarian(c):
+    # songs_fts menyimpan id lagu (UNINDEXED) dan pencarian join lewat id:
+    # rowid tabel songs (primary key TEXT) bisa berubah oleh VACUUM
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='songs_fts'").fetchone() is None:
+        return   # SQLite tanpa FTS5
+    c.execute("DROP TABLE songs_fts")
+    c.execute('''CREATE VIRTUAL TABLE songs_fts USING fts5
+                 (id UNINDEXED, judul, artis, album, genre, tokenize="unicode61 remove_diacritics 2")''')
+    c.execute('''INSERT INTO songs_fts (rowid, id, judul, artis, album, genre)
+                 SELECT rowid, id, judul, artis, album, genre FROM songs''')
+
+
+def m008_normalisasi_genre_putar(c):
+    # genre_play_counts dulu dikelompokkan dengan lower(trim(genre)); samakan
+    # dengan models.normalisasi_genre (huruf kecil Unicode, spasi diringkas)
+    gabung = {}
+    for genre, plays, last_played in c.execute("SELECT genre, plays, last_played FROM genre_play_counts").fetchall():
+        genre = " ".join((genre or "").lower().split())
+        lama = gabung.get(genre)
+        gabung[genre] = (plays + lama[0], max(last_played, lama[1])) if lama else (plays, last_played)
+    c.execute("DELETE FROM genre_play_counts")
+    c.executemany("INSERT INTO genre_play_counts (genre, plays, last_played) VALUES (?, ?, ?)",
+                  [(genre, plays, last_played) for genre, (plays, last_played) in gabung.items()])
+
+
+MIGRATIONS = [
+    m001_skema_awal,
+    m002_indeks_pencarian,
+    m003_kunci_playlist_songs,
+    m004_riwayat_putar,
+    m005_audio_lagu,
+    m006_versi_katalog,
+    m007_id_indeks_pencarian,
+    m008_normalisasi_genre_putar,
+]
+
+
+def versi_skema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def jalankan_migrasi(conn):
+    """Jalankan migrasi yang belum diterapkan. Mengembalikan versi akhir.
+
+    Versi dibaca ulang di dalam transaksi (BEGIN IMMEDIATE), jadi beberapa
+    worker yang start bersamaan tidak menjalankan migrasi yang sama dua kali."""
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            versi = versi_skema(conn)
+            if versi >= len(MIGRATIONS):
+                conn.commit()
+                return versi
+            MIGRATIONS[versi](conn.cursor())
+            conn.execute(f"PRAGMA user_version = {versi + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
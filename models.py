@@ -1,78 +1,503 @@
+import atexit
+import gc
+import logging
 import sqlite3
 import os
+import re
+import sys
+import queue
+import random
+import itertools
+import uuid
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 
-DB_NAME = "remusic.db"
+import auth
+import snapshot
+from migrations import jalankan_migrasi
+from session_store import SessionManager, buat_backend
+from play_log import PlayLog
+from rekomendasi import Rekomendasi
+from event_hub import EventHub
+
+DB_NAME = os.environ.get("REMUSIC_DB", "remusic.db")
+POOL_SIZE = 8
+SEARCH_PAGE_SIZE = 20
+LIBRARY_PAGE_SIZE = 40
+HISTORY_LIMIT = 100
+SHUFFLE_RECENT = 20
+BULK_BATCH_SIZE = 5000
+USER_CACHE_TTL = 300
+USER_CACHE_SIZE = 10000
+PLAYLIST_ORDER_CACHE_SIZE = 2000
+SNAPSHOT_SUFFIX = snapshot.SUFFIX
+REKOMENDASI_ACAK = 5
+# Node mati yang boleh menumpuk sebelum dilepas dari library
+NODE_MATI_MIN = 1024
+# Node lagu terhapus yang diingat untuk melanjutkan cursor pagination
+KURSOR_TERHAPUS = 1024
+
+logger = logging.getLogger(__name__)
+
+@contextmanager
+def tanpa_gc():
+    # Saat membangun ratusan ribu objek sekaligus, GC siklik berjalan berulang
+    # kali memindai objek yang pasti hidup; matikan sementara
+    aktif = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if aktif:
+            gc.enable()
+
+def teks(value):
+    # Genre/artis/album banyak berulang di katalog: satu objek string per nilai
+    return sys.intern(value) if isinstance(value, str) else value
+
+def parse_durasi(durasi):
+    """"m:ss", "h:mm:ss" atau jumlah detik -> detik (int), None jika tidak valid."""
+    if isinstance(durasi, int):
+        return durasi if durasi > 0 else None
+    s = str(durasi if durasi is not None else '').strip()
+    try:
+        if ':' in s:
+            bagian = [int(x) for x in s.split(':')]
+            if len(bagian) > 3 or any(x < 0 for x in bagian) or any(x > 59 for x in bagian[1:]):
+                return None
+            detik = 0
+            for x in bagian:
+                detik = detik * 60 + x
+        else:
+            detik = int(round(float(s)))
+    except ValueError:
+        return None
+    return detik if detik > 0 else None
+
+def format_durasi(detik):
+    return f"{detik // 60}:{detik % 60:02d}"
 
 class Lagu:
-    def __init__(self, id, judul, artis, album, durasi, genre, image=None):
+    # Tanpa __dict__: satu Lagu per lagu di library, dipakai bersama oleh semua
+    # session (queue/history) dan hasil query.
+    __slots__ = ('id', 'judul', 'artis', 'album', '_durasi', 'genre', 'image', 'audio')
+
+    def __init__(self, id, judul, artis, album, durasi, genre, image=None, audio=None):
         self.id = id
         self.judul = judul
-        self.artis = artis
-        self.album = album
+        self.artis = teks(artis)
+        self.album = teks(album)
         self.durasi = durasi
-        self.genre = genre
+        self.genre = teks(genre)
         self.image = image 
+        self.audio = audio
+
+    # Durasi disimpan sebagai detik (int); teks lama yang tidak bisa diparse
+    # disimpan apa adanya.
+    @property
+    def durasi(self):
+        return format_durasi(self._durasi) if isinstance(self._durasi, int) else self._durasi
+
+    @durasi.setter
+    def durasi(self, value):
+        detik = parse_durasi(value)
+        self._durasi = detik if detik is not None else value
+
+    def to_dict(self):
+        return {'id': self.id, 'judul': self.judul, 'artis': self.artis, 'album': self.album,
+                'durasi': self.durasi, 'genre': self.genre, 'image': self.image, 'audio': self.audio}
 
 class Node:
-    def __init__(self, lagu):
+    # lahir/mati: versi library saat node ditambahkan/dihapus (lihat LibrarySnapshot);
+    # lama: node sebelumnya untuk id yang sama, selama masih bisa terlihat snapshot lama
+    __slots__ = ('lagu', 'prev', 'next', 'lahir', 'mati', 'lama')
+
+    def __init__(self, lagu, lahir=0):
         self.lagu = lagu
         self.prev = None
         self.next = None
+        self.lahir = lahir
+        self.mati = None
+        self.lama = None
+
+def normalisasi_genre(genre):
+    return " ".join((genre or "").lower().split())
+
+class GenreIndex:
+    """Genre (dinormalisasi) -> array song id, untuk pilih lagu acak O(1).
+
+    Setiap bucket menyimpan list id plus posisi tiap id, jadi hapus cukup
+    menukar dengan elemen terakhir lalu pop. Bucket diubah di tempat oleh
+    penulis (di bawah _library_lock); pembaca tanpa lock hanya melihat satu
+    slot berubah atau list memendek satu elemen (lihat pilih_acak)."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.posisi = {}
+
+    def tambah(self, lagu):
+        genre = normalisasi_genre(lagu.genre)
+        ids = self.buckets.setdefault(genre, [])
+        self.posisi[lagu.id] = (genre, len(ids))
+        ids.append(lagu.id)
+
+    def hapus(self, id):
+        entry = self.posisi.pop(id, None)
+        if not entry:
+            return
+        genre, i = entry
+        ids = self.buckets[genre]
+        # Isi slot yang dikosongkan dulu, baru pop: pembaca tidak pernah
+        # melihat id yang sudah dihapus di posisi lain
+        last = ids[-1]
+        if last != id:
+            ids[i] = last
+            self.posisi[last] = (genre, i)
+        ids.pop()
+        if not ids:
+            del self.buckets[genre]
+
+    def pilih_acak(self, genre, hindari=(), percobaan=8):
+        # Coba beberapa sampel acak dulu; jika bucket didominasi id yang harus
+        # dihindari, baru saring seluruh bucket.
+        ids = self.buckets.get(normalisasi_genre(genre))
+        if not ids:
+            return None
+        for _ in range(percobaan):
+            try:
+                id = random.choice(ids)
+            except IndexError:   # bucket memendek di tengah pilihan (penulis pop)
+                continue
+            if id not in hindari:
+                return id
+        kandidat = [id for id in ids if id not in hindari]
+        return random.choice(kandidat) if kandidat else None
+
+def _terlihat(node, versi):
+    return node.lahir <= versi and (node.mati is None or node.mati > versi)
+
+def _maju(p, versi):
+    # Node pertama mulai dari p yang terlihat pada `versi`. Node hanya ditambah
+    # di akhir, jadi `lahir` tidak pernah turun sepanjang list.
+    while p is not None:
+        if p.lahir > versi:
+            return None
+        if p.mati is None or p.mati > versi:
+            return p
+        p = p.next
+    return None
 
 class DoublyLinkedList:
+    """Library lagu, diubah di tempat oleh satu penulis (DatabaseManager
+    memegang _library_lock) dan dibaca tanpa lock lewat LibrarySnapshot.
+
+    Node baru diisi lengkap sebelum disambungkan ke tail, dan node yang dihapus
+    hanya ditandai `mati` lalu dibiarkan tersambung, sehingga snapshot lama
+    tetap melihat isi library pada versinya. Node mati dilepas dari list
+    (_bersihkan) setelah tidak ada snapshot yang masih bisa melihatnya;
+    pointer next-nya tetap, jadi pembaca yang sedang berada di node itu tetap
+    bisa melanjutkan. Method di kelas ini melihat isi terbaru."""
+
     def __init__(self):
         self.head = None
         self.tail = None
+        # Index id -> Node terbaru untuk id itu (bisa node mati yang belum dilepas)
+        self.index = {}
+        self.genres = GenreIndex()
+        self.versi = 0      # versi terakhir yang diterbitkan; perubahan baru memakai versi + 1
+        self.jumlah = 0
+        self._mati = []     # node mati yang masih tersambung
+        self._batas_mati = NODE_MATI_MIN
+        self._snapshots = weakref.WeakSet()
+        # id -> node yang sudah dilepas (terbaru di akhir); pointer next-nya
+        # tetap, jadi cursor ke lagu yang dihapus bisa dilanjutkan (lihat kursor)
+        self.terhapus = OrderedDict()
+
+    @classmethod
+    def dari_lagu(cls, songs):
+        # Bangun list dari lagu-lagu dengan id unik (urutan dipertahankan)
+        library = cls()
+        index = library.index
+        buckets, posisi = library.genres.buckets, library.genres.posisi
+        # Genre mentah -> (genre normal, bucket); nilai genre banyak berulang
+        per_genre = {}
+        prev = None
+        for lagu in songs:
+            n = Node(lagu)
+            if prev:
+                prev.next = n
+                n.prev = prev
+            else:
+                library.head = n
+            index[lagu.id] = n
+            g = per_genre.get(lagu.genre)
+            if g is None:
+                genre = normalisasi_genre(lagu.genre)
+                g = per_genre[lagu.genre] = (genre, buckets.setdefault(genre, []))
+            posisi[lagu.id] = (g[0], len(g[1]))
+            g[1].append(lagu.id)
+            prev = n
+        library.tail = prev
+        library.jumlah = len(index)
+        return library
+
+    def __len__(self):
+        return self.jumlah
+
+    def __contains__(self, id):
+        return self.cari(id) is not None
+
+    def terbitkan(self):
+        """Snapshot isi library saat ini (O(1)); perubahan berikutnya tidak
+        terlihat dari snapshot ini."""
+        self.versi += 1
+        tail = self.tail
+        while tail is not None and tail.mati is not None:
+            tail = tail.prev
+        snap = LibrarySnapshot(self, self.versi, self.jumlah, tail)
+        self._snapshots.add(snap)
+        return snap
 
     def tambah_last(self, lagu):
-        n = Node(lagu)
+        if self.cari(lagu.id):
+            self.hapus(lagu.id)
+        n = Node(lagu, self.versi + 1)
+        n.lama = self.index.get(lagu.id)
+        # Node sudah lengkap sebelum terlihat dari tail.next
         if not self.head:
             self.head = self.tail = n
         else:
-            self.tail.next = n
             n.prev = self.tail
+            self.tail.next = n
             self.tail = n
+        self.index[lagu.id] = n
+        self.jumlah += 1
+        self.genres.tambah(lagu)
+        return n
 
     def hapus(self, id):
-        p = self.head
-        while p:
-            if p.lagu.id == id:
-                if p.prev: p.prev.next = p.next
-                else: self.head = p.next
-                if p.next: p.next.prev = p.prev
-                else: self.tail = p.prev
-                return True
-            p = p.next
-        return False
+        p = self.cari(id)
+        if not p:
+            return False
+        self.genres.hapus(id)
+        p.mati = self.versi + 1
+        self.jumlah -= 1
+        if not self._snapshots:
+            # Belum ada snapshot yang bisa melihat node ini: lepas sekarang
+            self._lepas(p)
+            return True
+        self._mati.append(p)
+        if len(self._mati) >= self._batas_mati:
+            self._bersihkan()
+        return True
+
+    def _bersihkan(self):
+        # Lepas node mati yang tidak terlihat lagi dari snapshot mana pun
+        batas = min((s.versi for s in list(self._snapshots)), default=sys.maxsize)
+        sisa = []
+        for p in self._mati:
+            if p.mati > batas:
+                sisa.append(p)
+            else:
+                self._lepas(p)
+        self._mati = sisa
+        self._batas_mati = max(NODE_MATI_MIN, 2 * len(sisa))
+
+    def _lepas(self, p):
+        if p.prev: p.prev.next = p.next
+        else: self.head = p.next
+        if p.next: p.next.prev = p.prev
+        else: self.tail = p.prev
+        self.terhapus[p.lagu.id] = p
+        self.terhapus.move_to_end(p.lagu.id)
+        if len(self.terhapus) > KURSOR_TERHAPUS:
+            self.terhapus.popitem(last=False)
+        # Versi yang lebih lama dari p juga sudah mati sebelum p
+        n = self.index.get(p.lagu.id)
+        if n is p:
+            del self.index[p.lagu.id]
+        else:
+            while n is not None and n.lama is not p:
+                n = n.lama
+            if n is not None:
+                n.lama = None
 
     def cari(self, id):
-        p = self.head
-        while p:
-            if p.lagu.id == id: return p
-            p = p.next
-        return None
+        n = self.index.get(id)
+        return n if n is not None and n.mati is None else None
+
+    def kursor(self, id):
+        # Node untuk melanjutkan pagination setelah `id`, termasuk lagu yang
+        # sudah dihapus sejak halaman sebelumnya (node mati tetap menunjuk ke
+        # node berikutnya; node mati sesudahnya dilewati _maju)
+        return self.index.get(id) or self.terhapus.get(id)
+
+    def berikutnya(self, id):
+        # Lagu setelah `id` dalam urutan library, None jika tidak ada/terakhir
+        p = self.cari(id)
+        p = p and _maju(p.next, sys.maxsize)
+        return p.lagu if p else None
+
+    def halaman(self, setelah_id=None, limit=LIBRARY_PAGE_SIZE):
+        return _halaman(self, self.head, sys.maxsize, setelah_id, limit)
 
     def get_all(self):
-        songs = []
-        p = self.head
-        while p:
-            songs.append(p.lagu)
-            p = p.next
-        return songs
+        return _semua(self.head, sys.maxsize)
+
+def _halaman(library, head, versi, setelah_id, limit):
+    # Pagination berbasis cursor: ambil `limit` lagu setelah node `setelah_id`
+    # (dari head jika None). Mengembalikan (songs, cursor halaman berikutnya).
+    if setelah_id is None:
+        p = _maju(head, versi)
+    else:
+        node = library.cari(setelah_id) or library.kursor(setelah_id)
+        if not node:
+            return [], None
+        p = _maju(node.next, versi)
+    songs = []
+    while p and len(songs) < limit:
+        songs.append(p.lagu)
+        p = _maju(p.next, versi)
+    cursor = songs[-1].id if p and songs else None
+    return songs, cursor
+
+def _semua(p, versi):
+    songs = []
+    p = _maju(p, versi)
+    while p:
+        songs.append(p.lagu)
+        p = _maju(p.next, versi)
+    return songs
+
+class LibrarySnapshot:
+    """Isi library pada satu versi (lihat DoublyLinkedList.terbitkan).
+
+    Berbagi node dengan library; lagu yang ditambahkan setelah versi ini
+    (lahir > versi) dan yang dihapus sebelumnya (mati <= versi) dilewati.
+    Ini objek yang dipasang sebagai `store.library` dan dibaca tanpa lock."""
+
+    __slots__ = ('dasar', 'versi', 'jumlah', 'tail', '__weakref__')
+
+    def __init__(self, dasar, versi, jumlah, tail):
+        self.dasar = dasar
+        self.versi = versi
+        self.jumlah = jumlah
+        self.tail = tail
+
+    @property
+    def head(self):
+        return _maju(self.dasar.head, self.versi)
+
+    @property
+    def genres(self):
+        # GenreIndex selalu terbaru: id hasil pilih_acak dicek lagi dengan cari()
+        return self.dasar.genres
+
+    def __len__(self):
+        return self.jumlah
+
+    def __contains__(self, id):
+        return self.cari(id) is not None
+
+    def cari(self, id):
+        n = self.dasar.index.get(id)
+        while n is not None and n.lahir > self.versi:
+            n = n.lama
+        return n if n is not None and _terlihat(n, self.versi) else None
+
+    def berikutnya(self, id):
+        p = self.cari(id)
+        p = p and _maju(p.next, self.versi)
+        return p.lagu if p else None
+
+    def kursor(self, id):
+        return self.dasar.kursor(id)
+
+    def halaman(self, setelah_id=None, limit=LIBRARY_PAGE_SIZE):
+        return _halaman(self, self.dasar.head, self.versi, setelah_id, limit)
+
+    def get_all(self):
+        return _semua(self.dasar.head, self.versi)
 
 class Queue:
-    def __init__(self):
-        self.q = []
+    def __init__(self, items=()):
+        self.q = deque(items)
+    def __len__(self): return len(self.q)
+    def __iter__(self): return iter(self.q)
     def enqueue(self, item): self.q.append(item)
-    def dequeue(self): return self.q.pop(0) if self.q else None
+    def dequeue(self): return self.q.popleft() if self.q else None
     def get_all(self): return self.q
 
+    def hapus_posisi(self, pos):
+        # Hapus item ke-`pos` (0 = depan antrian), None jika posisi tidak valid
+        if not 0 <= pos < len(self.q):
+            return None
+        item = self.q[pos]
+        del self.q[pos]
+        return item
+
+    def pindah(self, dari, ke):
+        # Pindahkan item dari posisi `dari` ke posisi `ke`
+        item = self.hapus_posisi(dari)
+        if item is None:
+            return False
+        self.q.insert(min(max(ke, 0), len(self.q)), item)
+        return True
+
 class Stack:
-    def __init__(self):
-        self.s = []
-    def push(self, item): self.s.append(item)
-    def pop(self): return self.s.pop() if self.s else None
-    def get_all(self): return self.s[::-1]
+    """Riwayat berkapasitas tetap (ring buffer).
+
+    Jika penuh, push menimpa item paling lama sehingga memori per user
+    tetap terbatas. Iterasi berjalan dari yang terbaru tanpa menyalin list."""
+
+    def __init__(self, kapasitas=HISTORY_LIMIT):
+        self.s = [None] * kapasitas
+        self.top = 0    # posisi tulis berikutnya
+        self.size = 0
+    def __len__(self): return self.size
+
+    def push(self, item):
+        self.s[self.top] = item
+        self.top = (self.top + 1) % len(self.s)
+        self.size = min(self.size + 1, len(self.s))
+
+    def pop(self):
+        if not self.size:
+            return None
+        self.top = (self.top - 1) % len(self.s)
+        item, self.s[self.top] = self.s[self.top], None
+        self.size -= 1
+        return item
+
+    def peek(self):
+        return self.s[(self.top - 1) % len(self.s)] if self.size else None
+
+    def __iter__(self):
+        i = self.top
+        for _ in range(self.size):
+            i = (i - 1) % len(self.s)
+            yield self.s[i]
+
+    def get_all(self): return self
+
+class PlaylistOrder:
+    # Urutan lagu satu playlist: posisi -> song id dan song id -> posisi
+    def __init__(self, song_ids):
+        self.song_ids = list(song_ids)
+        self.posisi = {id: i for i, id in enumerate(self.song_ids)}
+
+    def __len__(self):
+        return len(self.song_ids)
+
+    def geser(self, song_id, langkah):
+        # Song id `langkah` posisi dari `song_id` (1 = berikutnya, -1 = sebelumnya)
+        i = self.posisi.get(song_id)
+        if i is None or not 0 <= i + langkah < len(self.song_ids):
+            return None
+        return self.song_ids[i + langkah]
 
 class UserSession:
     def __init__(self, username, email, role="user", profile_pic=None):
@@ -85,201 +510,624 @@ class UserSession:
         self.current_song = None
         # TAMBAHAN: Menyimpan ID playlist yang sedang aktif diputar
         self.active_playlist_id = None 
+        # Dipegang selama queue/history/lagu aktif diubah atau dibaca bersamaan
+        self.lock = threading.RLock()
 
-class DatabaseManager:
-    def __init__(self):
-        self.init_db()
-        self.library = DoublyLinkedList()
-        self.reload_library()
-        self.active_sessions = {}
+    def to_state(self):
+        # Bentuk ringkas untuk session_store: hanya id lagu, history lama -> baru
+        with self.lock:
+            return {'u': self.username, 'e': self.email, 'r': self.role, 'p': self.profile_pic,
+                    'c': self.current_song.id if self.current_song else None,
+                    'q': [s.id for s in self.queue],
+                    'h': [s.id for s in self.history][::-1],
+                    'pl': self.active_playlist_id}
 
-    def get_connection(self):
-        conn = sqlite3.connect(DB_NAME)
+    @classmethod
+    def from_state(cls, state, library):
+        user = cls(state['u'], state['e'], state['r'], state['p'])
+        user.muat_state(state, library)
+        return user
+
+    def muat_state(self, state, library):
+        # Ganti isi session ini dengan state dari backend (objek tetap sama,
+        # jadi request yang sedang memegangnya ikut melihat state baru)
+        def lagu(id):
+            node = library.cari(id) if id else None
+            return node.lagu if node else None
+        with self.lock:
+            self.username, self.role, self.profile_pic = state['u'], state['r'], state['p']
+            self.current_song = lagu(state['c'])
+            self.queue = Queue(filter(None, map(lagu, state['q'])))
+            self.history = Stack()
+            for item in filter(None, map(lagu, state['h'])):
+                self.history.push(item)
+            self.active_playlist_id = state['pl']
+
+class ConnectionPool:
+    """Pool koneksi SQLite berukuran tetap (checkout/return).
+
+    Koneksi dibuat sekali lalu dipakai ulang antar request, sehingga
+    pragma dan cache prepared statement milik koneksi tidak hilang."""
+
+    def __init__(self, db_name, size=POOL_SIZE):
+        self.db_name = db_name
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=10, check_same_thread=False,
+                               cached_statements=256)
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-16000")    # 16 MB page cache
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        # Normalisasi genre yang sama dengan GenreIndex, untuk rollup play_log
+        conn.create_function('normalisasi_genre', 1, normalisasi_genre, deterministic=True)
         return conn
 
+    @contextmanager
+    def connection(self):
+        # Commit jika blok selesai normal, rollback jika ada exception;
+        # koneksi selalu dikembalikan ke pool.
+        self.slots.acquire()
+        conn = None
+        try:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    # Koneksi yang rusak tidak dikembalikan ke pool
+                    conn.close()
+                    conn = None
+                raise
+        finally:
+            if conn is not None:
+                self.idle.put_nowait(conn)
+            self.slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class DatabaseManager:
+    """Akses database + library di memori.
+
+    Membuat DatabaseManager tidak menyentuh database: migrasi dijalankan saat
+    koneksi pertama dipinjam, dan library dimuat saat `library` pertama kali
+    dipakai (dari snapshot di disk jika masih sesuai dengan database, lihat
+    snapshot.py; selain itu dari tabel songs)."""
+
+    def __init__(self, db_name=DB_NAME):
+        # Nomor versi data untuk ETag/cache halaman: 'library', 'playlist:<id>',
+        # 'playlists:<email>'. Diawali id instance agar unik per proses.
+        self.instance_id = uuid.uuid4().hex[:8]
+        self.versions = {}
+        self._version_counter = itertools.count(1)
+        self.pool = ConnectionPool(db_name)
+        self._db_siap = False
+        self._init_lock = threading.Lock()
+        # Hanya satu penulis library pada satu waktu; pembaca tidak perlu lock
+        self._library_lock = threading.RLock()
+        self.snapshot_path = db_name + SNAPSHOT_SUFFIX
+        # Kunci katalog (uid, versi) yang isinya sama dengan library di memori;
+        # None jika tidak diketahui (mis. setelah tulis yang gagal)
+        self._katalog = None
+        self._katalog_snapshot = None
+        atexit.register(self.tutup_snapshot)
+        backend = buat_backend(os.environ.get('REMUSIC_SESSION_BACKEND', 'memory'), self.get_connection)
+        self.active_sessions = SessionManager(backend, UserSession.to_state,
+                                              lambda state: UserSession.from_state(state, self.library),
+                                              lambda user, state: user.muat_state(state, self.library))
+        # Kanal SSE per user (email): perubahan pemutar dikirim ke semua tab/perangkat
+        self.event_hub = EventHub()
+        # Cache LRU urutan playlist (playlist_id -> PlaylistOrder) untuk next/prev
+        self.playlist_orders = OrderedDict()
+        self._playlist_orders_lock = threading.Lock()
+        # email -> (profil, waktu kedaluwarsa); lihat get_user
+        self.user_cache = {}
+        self.play_log = PlayLog(self.get_connection)
+        # Lagu mirip dari co-occurrence playlist, untuk next di konteks library
+        self.rekomendasi = Rekomendasi(self.get_connection)
+
+    def __getattr__(self, name):
+        # Hanya dipanggil jika atribut belum ada: inisialisasi tertunda
+        if name == 'library':
+            self._muat_library()
+            return self.__dict__['library']
+        if name == 'fts_enabled':
+            self.init_db()
+            return self.__dict__['fts_enabled']
+        raise AttributeError(name)
+
+    def versi(self, *keys):
+        return (self.instance_id,) + tuple(self.versions.get(key, 0) for key in keys)
+
+    def naikkan_versi(self, key):
+        self.versions[key] = next(self._version_counter)
+
+    def get_connection(self):
+        """Pinjam koneksi dari pool: `with store.get_connection() as conn:`"""
+        if not self._db_siap:
+            self.init_db()
+        return self.pool.connection()
+
     def init_db(self):
-        conn = self.get_connection()
-        c = conn.cursor()
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS users 
-                     (email TEXT PRIMARY KEY, username TEXT, password TEXT, role TEXT)''')
-        
-        c.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in c.fetchall()]
-        if 'profile_pic' not in columns:
-            c.execute("ALTER TABLE users ADD COLUMN profile_pic TEXT")
+        with self._init_lock:
+            if self._db_siap:
+                return
+            with self.pool.connection() as conn:
+                jalankan_migrasi(conn)
+                self.fts_enabled = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='songs_fts'").fetchone() is not None
+            self._db_siap = True
 
-        c.execute('''CREATE TABLE IF NOT EXISTS songs 
-                     (id TEXT PRIMARY KEY, judul TEXT, artis TEXT, album TEXT, durasi TEXT, genre TEXT, image TEXT)''')
+    # --- SNAPSHOT LIBRARY (cold start) ---
+    def _muat_library(self):
+        with self._library_lock:
+            if 'library' in self.__dict__:
+                return
+            with self.get_connection() as conn:
+                katalog = tuple(conn.execute("SELECT uid, version FROM catalog_state").fetchone())
+            kolom = snapshot.muat(self.snapshot_path, katalog)
+            if kolom is None:
+                self.reload_library()
+                return
+            with tanpa_gc():
+                self.library = DoublyLinkedList.dari_lagu(
+                    Lagu(*baris) for baris in zip(*(kolom[nama] for nama in snapshot.KOLOM))).terbitkan()
+            self._katalog = self._katalog_snapshot = katalog
+            self.naikkan_versi('library')
 
-        c.execute('''CREATE TABLE IF NOT EXISTS playlists 
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT, user_email TEXT, name TEXT)''')
+    def _catat_tulis(self, jumlah):
+        # Trigger songs menaikkan versi katalog sekali per baris yang ditulis
+        if self._katalog is not None:
+            self._katalog = (self._katalog[0], self._katalog[1] + jumlah)
 
-        c.execute('''CREATE TABLE IF NOT EXISTS playlist_songs 
-                     (playlist_id INTEGER, song_id TEXT)''')
+    def simpan_snapshot(self):
+        """Tulis library ke snapshot jika isinya masih sama dengan database
+        (tidak ada proses lain yang menulis tabel songs sejak dimuat)."""
+        with self._library_lock:
+            library, katalog = self.__dict__.get('library'), self._katalog
+            if library is None or katalog is None or katalog == self._katalog_snapshot:
+                return False
+            with self.get_connection() as conn:
+                if tuple(conn.execute("SELECT uid, version FROM catalog_state").fetchone()) != katalog:
+                    return False
+            songs = library.get_all()
+        kolom = {'id': [l.id for l in songs], 'judul': [l.judul for l in songs],
+                 'artis': [l.artis for l in songs], 'album': [l.album for l in songs],
+                 'durasi': [l._durasi for l in songs], 'genre': [l.genre for l in songs],
+                 'image': [l.image for l in songs], 'audio': [l.audio for l in songs]}
+        snapshot.simpan(self.snapshot_path, katalog, kolom)
+        self._katalog_snapshot = katalog
+        return True
 
+    def tutup_snapshot(self):
+        # Database tidak pernah dibuka proses ini: tidak ada yang perlu disimpan
+        if not self._db_siap:
+            return
         try:
-            c.execute("SELECT image FROM songs LIMIT 1")
-        except sqlite3.OperationalError:
-            c.execute("ALTER TABLE songs ADD COLUMN image TEXT")
-
-        c.execute("SELECT * FROM users WHERE email='admin@remusic.com'")
-        if not c.fetchone():
-            c.execute("INSERT INTO users (email, username, password, role) VALUES (?, ?, ?, ?)", 
-                      ('admin@remusic.com', 'Admin Ganteng', 'admin123', 'admin'))
-            
-        conn.commit()
-        conn.close()
+            self.simpan_snapshot()
+        except Exception:
+            logger.exception("gagal menyimpan snapshot library")
+
+    # Repair penuh: bangun ulang indeks pencarian dan library dari database
+    def resync(self):
+        if self.fts_enabled:
+            with self.get_connection() as conn:
+                self.rebuild_search_index(conn.cursor())
+        self.reload_library()
+        self.rekomendasi.reset()
 
+    # Bangun ulang library dari tabel songs. Operasi tulis biasa sudah
+    # memperbarui library secara inkremental, jadi ini hanya untuk resync/repair.
     def reload_library(self):
-        self.library = DoublyLinkedList()
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT * FROM songs")
-        rows = c.fetchall()
-        for row in rows:
-            img = row['image'] if 'image' in row.keys() else None
-            lagu = Lagu(row['id'], row['judul'], row['artis'], row['album'], row['durasi'], row['genre'], img)
-            self.library.tambah_last(lagu)
-        conn.close()
+        with self._library_lock:
+            lama = self.__dict__.get('library') or DoublyLinkedList()
+            songs = []
+            with tanpa_gc(), self.get_connection() as conn:
+                # Versi katalog dan isi songs dari snapshot baca (transaksi) yang sama
+                conn.execute("BEGIN")
+                katalog = tuple(conn.execute("SELECT uid, version FROM catalog_state").fetchone())
+                rows = conn.execute("SELECT id, judul, artis, album, durasi, genre, image, audio FROM songs")
+                for id, judul, artis, album, durasi, genre, image, audio in rows:
+                    node = lama.cari(id)
+                    if node:
+                        # Lagu yang sama dipertahankan agar referensi di session tetap valid
+                        lagu = node.lagu
+                        lagu.judul, lagu.artis, lagu.album, lagu.durasi = judul, teks(artis), teks(album), durasi
+                        lagu.genre, lagu.image, lagu.audio = teks(genre), image, audio
+                    else:
+                        lagu = Lagu(id, judul, artis, album, durasi, genre, image, audio)
+                    songs.append(lagu)
+                self.library = DoublyLinkedList.dari_lagu(songs).terbitkan()
+            self._katalog = katalog
+            self.buang_playlist_order()
+            self.naikkan_versi('library')
+            self.simpan_snapshot()
+
+    @contextmanager
+    def ubah_library(self):
+        """Blok menerima DoublyLinkedList di balik `library` untuk diubah di
+        tempat; setelah blok selesai snapshot barunya dipasang (satu
+        assignment). Pembaca yang memegang snapshot lama tidak melihat
+        perubahan ini."""
+        with self._library_lock:
+            library = self.library.dasar
+            try:
+                yield library
+            finally:
+                self.library = library.terbitkan()
+                self.naikkan_versi('library')
+
+    # songs_fts menyimpan id lagu; rowid-nya disamakan dengan rowid songs hanya
+    # agar hapus/ubah tidak perlu memindai kolom id (UNINDEXED)
+    def rebuild_search_index(self, c):
+        c.execute("DELETE FROM songs_fts")
+        c.execute('''INSERT INTO songs_fts (rowid, id, judul, artis, album, genre)
+                     SELECT rowid, id, judul, artis, album, genre FROM songs''')
+
+    def _index_song(self, c, id, baru=False):
+        if not self.fts_enabled:
+            return
+        if not baru:
+            self._hapus_index_song(c, id)
+        # rowid songs bisa sudah dipakai entri lain (rowid berubah setelah VACUUM)
+        c.execute('''INSERT INTO songs_fts (rowid, id, judul, artis, album, genre)
+                     SELECT CASE WHEN EXISTS (SELECT 1 FROM songs_fts WHERE rowid = s.rowid) THEN NULL
+                            ELSE s.rowid END, id, judul, artis, album, genre FROM songs s WHERE id=?''', (id,))
+
+    def _hapus_index_song(self, c, id):
+        if c.execute("DELETE FROM songs_fts WHERE rowid = (SELECT rowid FROM songs WHERE id=?) AND id=?",
+                     (id, id)).rowcount == 0:
+            # rowid tidak cocok lagi: cari lewat kolom id (memindai seluruh indeks)
+            c.execute("DELETE FROM songs_fts WHERE id=?", (id,))
+
+    def search_songs(self, query, page=1, per_page=SEARCH_PAGE_SIZE):
+        """Cari lagu (prefix match per kata) diurutkan berdasarkan relevansi.
+
+        Mengembalikan (list Lagu dari library, total hasil)."""
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return [], 0
+        offset = (max(page, 1) - 1) * per_page
+        if not self.fts_enabled:
+            q = query.lower()
+            hasil = [s for s in self.library.get_all() if q in s.judul.lower() or q in s.artis.lower()]
+            return hasil[offset:offset + per_page], len(hasil)
+
+        match = " ".join(f'"{t}"*' for t in terms)
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM songs_fts WHERE songs_fts MATCH ?", (match,))
+            total = c.fetchone()[0]
+            # Bobot bm25: judul paling penting, lalu artis, album dan genre
+            c.execute('''SELECT s.id FROM songs_fts f JOIN songs s ON s.id = f.id
+                         WHERE songs_fts MATCH ? ORDER BY bm25(songs_fts, 0.0, 10.0, 5.0, 1.0, 1.0)
+                         LIMIT ? OFFSET ?''', (match, per_page, offset))
+            ids = [row[0] for row in c.fetchall()]
+        songs = []
+        for id in ids:
+            node = self.library.cari(id)
+            if node:
+                songs.append(node.lagu)
+        return songs, total
 
     def add_user(self, username, email, password, role='user'):
+        password_hash = auth.hash_password(password)
         try:
-            conn = self.get_connection()
-            c = conn.cursor()
-            c.execute("INSERT INTO users (email, username, password, role) VALUES (?, ?, ?, ?)", (email, username, password, role))
-            conn.commit()
-            conn.close()
+            with self.get_connection() as conn:
+                conn.execute("INSERT INTO users (email, username, password, role) VALUES (?, ?, ?, ?)", (email, username, password_hash, role))
+            self.user_cache.pop(email, None)
             return True
         except sqlite3.IntegrityError:
             return False
 
     def check_user(self, email, password):
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE email=? AND password=?", (email, password))
-        user_data = c.fetchone()
-        conn.close()
-        return user_data
+        """Profil user jika email dan password cocok, selain itu None.
+
+        Password plaintext lama dan hash dengan biaya lama di-hash ulang."""
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT email, username, role, profile_pic, password FROM users WHERE email=?",
+                               (email,)).fetchone()
+        if not auth.verifikasi(row['password'] if row else None, password):
+            return None
+        if auth.perlu_rehash(row['password']):
+            password_hash = auth.hash_password(password)
+            with self.get_connection() as conn:
+                conn.execute("UPDATE users SET password=? WHERE email=? AND password=?",
+                             (password_hash, email, row['password']))
+        profil = {'email': row['email'], 'username': row['username'], 'role': row['role'],
+                  'profile_pic': row['profile_pic']}
+        self.user_cache[email] = (profil, time.monotonic() + USER_CACHE_TTL)
+        return profil
+
+    def get_user(self, email):
+        # Profil (username, role, profile_pic) di-cache USER_CACHE_TTL detik
+        entry = self.user_cache.get(email)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT email, username, role, profile_pic FROM users WHERE email=?", (email,)).fetchone()
+        profil = dict(row) if row else None
+        if profil:
+            if len(self.user_cache) >= USER_CACHE_SIZE:
+                self.user_cache.clear()
+            self.user_cache[email] = (profil, time.monotonic() + USER_CACHE_TTL)
+        return profil
 
     def add_song_db(self, lagu):
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO songs VALUES (?, ?, ?, ?, ?, ?, ?)", 
-                  (lagu.id, lagu.judul, lagu.artis, lagu.album, lagu.durasi, lagu.genre, lagu.image))
-        conn.commit()
-        conn.close()
-        self.reload_library()
+        with self.ubah_library() as library:
+            with self.get_connection() as conn:
+                c = conn.cursor()
+                c.execute("INSERT INTO songs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", 
+                          (lagu.id, lagu.judul, lagu.artis, lagu.album, lagu.durasi, lagu.genre, lagu.image, lagu.audio))
+                self._index_song(c, lagu.id, baru=True)
+            self._catat_tulis(1)
+            library.tambah_last(lagu)
+
+    def add_songs_bulk(self, songs, batch_size=BULK_BATCH_SIZE):
+        """Insert/update banyak lagu (iterable Lagu) per batch dalam satu transaksi.
+
+        Library dan indeks pencarian dibangun ulang sekali di akhir.
+        Mengembalikan jumlah baris yang ditulis."""
+        sql = '''INSERT INTO songs (id, judul, artis, album, durasi, genre, image, audio) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT(id) DO UPDATE SET judul=excluded.judul, artis=excluded.artis, album=excluded.album,
+                 durasi=excluded.durasi, genre=excluded.genre, image=COALESCE(excluded.image, songs.image),
+                 audio=COALESCE(excluded.audio, songs.audio)'''
+        total = 0
+        batch = []
+        try:
+            for lagu in songs:
+                batch.append((lagu.id, lagu.judul, lagu.artis, lagu.album, lagu.durasi, lagu.genre, lagu.image,
+                              lagu.audio))
+                if len(batch) >= batch_size:
+                    with self.get_connection() as conn:
+                        conn.executemany(sql, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                with self.get_connection() as conn:
+                    conn.executemany(sql, batch)
+                total += len(batch)
+        finally:
+            # Batch yang sudah tersimpan tetap masuk indeks walau import berhenti di tengah
+            self.resync()
+        return total
+
+    def iter_songs(self, batch_size=BULK_BATCH_SIZE):
+        # Baca seluruh tabel songs secara streaming (tanpa memuat semua baris sekaligus)
+        with self.get_connection() as conn:
+            c = conn.execute("SELECT id, judul, artis, album, durasi, genre, image, audio FROM songs ORDER BY rowid")
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
 
     def delete_song_db(self, id):
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("DELETE FROM songs WHERE id=?", (id,))
-        conn.commit()
-        conn.close()
-        self.reload_library()
+        with self.ubah_library() as library:
+            with self.get_connection() as conn:
+                c = conn.cursor()
+                if self.fts_enabled:
+                    self._hapus_index_song(c, id)
+                terhapus = c.execute("DELETE FROM songs WHERE id=?", (id,)).rowcount
+                c.execute("DELETE FROM song_play_counts WHERE song_id=?", (id,))
+                c.execute("DELETE FROM user_song_plays WHERE song_id=?", (id,))
+            self._catat_tulis(terhapus)
+            library.hapus(id)
+            self.buang_playlist_order()
+        self.rekomendasi.hapus_lagu(id)
     
-    def update_song_db(self, id, judul, artis, genre, durasi, image=None):
-        conn = self.get_connection()
-        c = conn.cursor()
-        if image:
-            c.execute('''UPDATE songs SET judul=?, artis=?, genre=?, durasi=?, image=? WHERE id=?''',
-                      (judul, artis, genre, durasi, image, id))
-        else:
-            c.execute('''UPDATE songs SET judul=?, artis=?, genre=?, durasi=? WHERE id=?''',
-                      (judul, artis, genre, durasi, id))
-        conn.commit()
-        conn.close()
-        self.reload_library()
+    def update_song_db(self, id, judul, artis, genre, durasi, image=None, audio=None):
+        with self._library_lock:
+            node = self.library.cari(id)
+            with self.get_connection() as conn:
+                c = conn.cursor()
+                # image/audio None = tidak diganti
+                diubah = c.execute('''UPDATE songs SET judul=?, artis=?, genre=?, durasi=?,
+                                      image=COALESCE(?, image), audio=COALESCE(?, audio) WHERE id=?''',
+                                   (judul, artis, genre, durasi, image, audio, id)).rowcount
+                self._index_song(c, id)
+            self._catat_tulis(diubah)
+            # Ubah objek Lagu yang sudah ada agar referensi di queue/history ikut terbarui
+            if node:
+                lagu = node.lagu
+                if genre != lagu.genre:
+                    # GenreIndex berubah: terbitkan snapshot baru
+                    with self.ubah_library() as library:
+                        library.genres.hapus(id)
+                        lagu.genre = teks(genre)
+                        library.genres.tambah(lagu)
+                lagu.judul, lagu.artis, lagu.durasi = judul, teks(artis), durasi
+                if image:
+                    lagu.image = image
+                if audio:
+                    lagu.audio = audio
+            self.naikkan_versi('library')
 
     def update_user_avatar(self, email, filename):
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE users SET profile_pic=? WHERE email=?", (filename, email))
-        conn.commit()
-        conn.close()
-        if email in self.active_sessions:
-            self.active_sessions[email].profile_pic = filename
+        with self.get_connection() as conn:
+            conn.execute("UPDATE users SET profile_pic=? WHERE email=?", (filename, email))
+        self.user_cache.pop(email, None)
+        user = self.active_sessions.get(email)
+        if user is not None:
+            with user.lock:
+                user.profile_pic = filename
+                self.active_sessions.tandai(email, user)
 
     def create_playlist(self, user_email, name):
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO playlists (user_email, name) VALUES (?, ?)", (user_email, name))
-        conn.commit()
-        conn.close()
+        with self.get_connection() as conn:
+            conn.execute("INSERT INTO playlists (user_email, name) VALUES (?, ?)", (user_email, name))
+        self.naikkan_versi(f'playlists:{user_email}')
 
     def get_user_playlists(self, user_email, search_query=None):
-        conn = self.get_connection()
-        c = conn.cursor()
-        if search_query:
-            query = "SELECT * FROM playlists WHERE user_email=? AND name LIKE ?"
-            c.execute(query, (user_email, f'%{search_query}%'))
-        else:
-            c.execute("SELECT * FROM playlists WHERE user_email=?", (user_email,))
-        playlists = c.fetchall()
-        conn.close()
-        return playlists
+        with self.get_connection() as conn:
+            if search_query:
+                query = "SELECT * FROM playlists WHERE user_email=? AND name LIKE ?"
+                c = conn.execute(query, (user_email, f'%{search_query}%'))
+            else:
+                c = conn.execute("SELECT * FROM playlists WHERE user_email=?", (user_email,))
+            return c.fetchall()
     
     def add_song_to_playlist(self, playlist_id, song_id):
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT * FROM playlist_songs WHERE playlist_id=? AND song_id=?", (playlist_id, song_id))
-        if not c.fetchone():
-            c.execute("INSERT INTO playlist_songs VALUES (?, ?)", (playlist_id, song_id))
-            conn.commit()
-            conn.close()
-            return True
-        conn.close()
-        return False
+        try:
+            with self.get_connection() as conn:
+                # Duplikat ditolak oleh primary key (playlist_id, song_id)
+                c = conn.execute('''INSERT OR IGNORE INTO playlist_songs (playlist_id, song_id, position)
+                                    SELECT ?, ?, COALESCE(MAX(position), -1) + 1 FROM playlist_songs WHERE playlist_id=?''',
+                                 (playlist_id, song_id, playlist_id))
+                if c.rowcount == 0:
+                    return False
+        except sqlite3.IntegrityError:
+            # Playlist atau lagu tidak ada
+            return False
+        self.rekomendasi.tambah(playlist_id, song_id)
+        self.buang_playlist_order(playlist_id)
+        self.naikkan_versi(f'playlist:{playlist_id}')
+        return True
 
     def remove_song_from_playlist(self, playlist_id, song_id):
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("DELETE FROM playlist_songs WHERE playlist_id=? AND song_id=?", (playlist_id, song_id))
-        conn.commit()
-        conn.close()
+        with self.get_connection() as conn:
+            conn.execute("DELETE FROM playlist_songs WHERE playlist_id=? AND song_id=?", (playlist_id, song_id))
+        self.rekomendasi.hapus(playlist_id, song_id)
+        self.buang_playlist_order(playlist_id)
+        self.naikkan_versi(f'playlist:{playlist_id}')
 
     def get_playlist_by_id(self, playlist_id):
-        conn = self.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT * FROM playlists WHERE id=?", (playlist_id,))
-        playlist = c.fetchone()
-        conn.close()
-        return playlist
+        with self.get_connection() as conn:
+            return conn.execute("SELECT * FROM playlists WHERE id=?", (playlist_id,)).fetchone()
 
     def get_playlist_songs(self, playlist_id):
-        conn = self.get_connection()
-        c = conn.cursor()
         query = """
             SELECT s.* FROM songs s
             JOIN playlist_songs ps ON s.id = ps.song_id
             WHERE ps.playlist_id = ?
+            ORDER BY ps.position
         """
-        c.execute(query, (playlist_id,))
-        rows = c.fetchall()
-        conn.close()
+        with self.get_connection() as conn:
+            rows = conn.execute(query, (playlist_id,)).fetchall()
         
-        songs = []
-        for row in rows:
-            img = row['image'] if 'image' in row.keys() else None
-            lagu = Lagu(row['id'], row['judul'], row['artis'], row['album'], row['durasi'], row['genre'], img)
-            songs.append(lagu)
-        return songs
+        return [self.lagu_dari_row(row) for row in rows]
 
-    # --- FITUR SMART SHUFFLE (GENRE) ---
-    def get_random_song_by_genre(self, genre, exclude_id):
-        conn = self.get_connection()
-        c = conn.cursor()
-        # Ambil lagu acak dengan genre sama, tapi bukan lagu yang sedang diputar
-        query = "SELECT * FROM songs WHERE genre LIKE ? AND id != ? ORDER BY RANDOM() LIMIT 1"
-        c.execute(query, (f'%{genre}%', exclude_id))
-        row = c.fetchone()
-        conn.close()
-        
-        if row:
-            img = row['image'] if 'image' in row.keys() else None
-            return Lagu(row['id'], row['judul'], row['artis'], row['album'], row['durasi'], row['genre'], img)
+    def lagu_dari_row(self, row):
+        # Objek Lagu yang sudah ada di library dipakai ulang, bukan dibuat baru
+        node = self.library.cari(row['id'])
+        if node:
+            return node.lagu
+        return Lagu(row['id'], row['judul'], row['artis'], row['album'], row['durasi'], row['genre'], row['image'],
+                    row['audio'])
+
+    def buang_playlist_order(self, playlist_id=None):
+        """Hapus urutan playlist dari cache (semua jika playlist_id None)."""
+        with self._playlist_orders_lock:
+            if playlist_id is None:
+                self.playlist_orders.clear()
+            else:
+                self.playlist_orders.pop(playlist_id, None)
+
+    def get_playlist_order(self, playlist_id):
+        with self._playlist_orders_lock:
+            order = self.playlist_orders.get(playlist_id)
+            if order is not None:
+                self.playlist_orders.move_to_end(playlist_id)
+                return order
+        with self.get_connection() as conn:
+            rows = conn.execute("SELECT song_id FROM playlist_songs WHERE playlist_id=? ORDER BY position",
+                                (playlist_id,)).fetchall()
+        order = PlaylistOrder(row[0] for row in rows)
+        with self._playlist_orders_lock:
+            self.playlist_orders[playlist_id] = order
+            self.playlist_orders.move_to_end(playlist_id)
+            if len(self.playlist_orders) > PLAYLIST_ORDER_CACHE_SIZE:
+                self.playlist_orders.popitem(last=False)
+        return order
+
+    def playlist_neighbor(self, playlist_id, song_id, langkah=1):
+        """Lagu sebelum/sesudah `song_id` di playlist, tanpa query ke database
+        selama urutan playlist masih ada di cache."""
+        order = self.get_playlist_order(playlist_id)
+        library = self.library
+        next_id = order.geser(song_id, langkah)
+        while next_id is not None:
+            node = library.cari(next_id)
+            if node:
+                return node.lagu
+            next_id = order.geser(next_id, langkah)
         return None
 
-store = DatabaseManager()
\ No newline at end of file
+    # --- STATISTIK PUTAR (dari tabel rollup, lihat play_log.py) ---
+    def most_played(self, limit=10):
+        # [(Lagu, jumlah putar)], lagu yang sudah dihapus dilewati
+        with self.get_connection() as conn:
+            rows = conn.execute("SELECT song_id, plays FROM song_play_counts ORDER BY plays DESC LIMIT ?",
+                                (limit,)).fetchall()
+        hasil = []
+        for song_id, plays in rows:
+            node = self.library.cari(song_id)
+            if node:
+                hasil.append((node.lagu, plays))
+        return hasil
+
+    def most_played_genres(self, limit=10):
+        with self.get_connection() as conn:
+            return conn.execute("SELECT genre, plays FROM genre_play_counts ORDER BY plays DESC LIMIT ?",
+                                (limit,)).fetchall()
+
+    def recently_played(self, email, limit=20):
+        # [(Lagu, waktu terakhir diputar, jumlah putar oleh user ini)]
+        with self.get_connection() as conn:
+            rows = conn.execute('''SELECT song_id, last_played, plays FROM user_song_plays
+                                    WHERE user_email=? ORDER BY last_played DESC LIMIT ?''',
+                                (email, limit)).fetchall()
+        hasil = []
+        for song_id, last_played, plays in rows:
+            node = self.library.cari(song_id)
+            if node:
+                hasil.append((node.lagu, last_played, plays))
+        return hasil
+
+    # --- REKOMENDASI (CO-OCCURRENCE PLAYLIST) ---
+    def get_similar_song(self, song_id, hindari=()):
+        """Lagu acak dari REKOMENDASI_ACAK lagu paling mirip dengan `song_id`
+        yang masih ada di library dan tidak ada di `hindari`."""
+        library = self.library
+        kandidat = []
+        for id in self.rekomendasi.mirip(song_id):
+            node = library.cari(id)
+            if node and id not in hindari:
+                kandidat.append(node.lagu)
+                if len(kandidat) == REKOMENDASI_ACAK:
+                    break
+        return random.choice(kandidat) if kandidat else None
+
+    # --- FITUR SMART SHUFFLE (GENRE) ---
+    def get_random_song_by_genre(self, genre, exclude_id, hindari=()):
+        """Lagu acak dengan genre sama dari GenreIndex library.
+
+        Lagu sedang diputar selalu dilewati; id di `hindari` (mis. riwayat
+        terakhir) dilewati selama masih ada pilihan lain."""
+        library = self.library
+        genres = library.genres
+        id = genres.pilih_acak(genre, set(hindari) | {exclude_id})
+        if id is None:
+            id = genres.pilih_acak(genre, {exclude_id})
+        node = library.cari(id) if id else None
+        return node.lagu if node else None
+
+store = DatabaseManager()
@@ -0,0 +1,119 @@
+"""Log riwayat putar dan rollup jumlah putar.
+
+`PlayLog.catat()` hanya menambah event ke buffer di memori; thread penulis
+menyimpan buffer ke tabel play_events dengan satu executemany tiap
+FLUSH_INTERVAL detik (atau lebih cepat jika buffer penuh), jadi /play dan
+/next tidak menunggu commit. Tiap ROLLUP_INTERVAL detik event baru
+dijumlahkan ke song_play_counts, genre_play_counts dan user_song_plays;
+query statistik hanya membaca tabel rollup tersebut.
+"""
+import atexit
+import logging
+import threading
+import time
+
+FLUSH_INTERVAL = 2.0
+ROLLUP_INTERVAL = 30.0
+MAX_BUFFER = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class PlayLog:
+    def __init__(self, get_connection, flush_interval=FLUSH_INTERVAL, rollup_interval=ROLLUP_INTERVAL):
+        self.get_connection = get_connection
+        self.flush_interval = flush_interval
+        self.rollup_interval = rollup_interval
+        self.buffer = []           # (email, song_id, waktu)
+        self.lock = threading.Lock()
+        self.bangun = threading.Event()
+        self._writer = None
+        self.ada_event = False     # proses ini pernah mencatat event
+        atexit.register(self.tutup)
+
+    def catat(self, email, song_id):
+        with self.lock:
+            self.buffer.append((email, song_id, time.time()))
+            self.ada_event = True
+            penuh = len(self.buffer) >= MAX_BUFFER
+        self._start_writer()
+        if penuh:
+            self.bangun.set()
+
+    def flush(self):
+        """Tulis semua event di buffer dalam satu transaksi. Mengembalikan jumlahnya."""
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+        if not batch:
+            return 0
+        try:
+            with self.get_connection() as conn:
+                conn.executemany("INSERT INTO play_events (user_email, song_id, played_at) VALUES (?, ?, ?)", batch)
+        except Exception:
+            # Jangan hilangkan event; coba lagi pada flush berikutnya
+            with self.lock:
+                self.buffer[:0] = batch
+            raise
+        return len(batch)
+
+    def rollup(self):
+        """Jumlahkan event yang belum masuk rollup. Mengembalikan jumlah event."""
+        with self.get_connection() as conn:
+            # IMMEDIATE: worker lain tidak bisa me-rollup rentang yang sama bersamaan
+            conn.execute("BEGIN IMMEDIATE")
+            dari = conn.execute("SELECT last_event_id FROM rollup_state WHERE name='plays'").fetchone()[0]
+            sampai = conn.execute("SELECT MAX(id) FROM play_events").fetchone()[0]
+            if sampai is None or sampai <= dari:
+                return 0
+            rentang = (dari, sampai)
+            conn.execute('''INSERT INTO song_play_counts (song_id, plays, last_played)
+                            SELECT song_id, COUNT(*), MAX(played_at) FROM play_events
+                            WHERE id > ? AND id <= ? GROUP BY song_id
+                            ON CONFLICT(song_id) DO UPDATE SET plays = plays + excluded.plays,
+                                last_played = MAX(last_played, excluded.last_played)''', rentang)
+            # normalisasi_genre: fungsi SQL dari ConnectionPool (models.normalisasi_genre)
+            conn.execute('''INSERT INTO genre_play_counts (genre, plays, last_played)
+                            SELECT normalisasi_genre(s.genre) AS g, COUNT(*), MAX(e.played_at)
+                            FROM play_events e JOIN songs s ON s.id = e.song_id
+                            WHERE e.id > ? AND e.id <= ? GROUP BY g
+                            ON CONFLICT(genre) DO UPDATE SET plays = plays + excluded.plays,
+                                last_played = MAX(last_played, excluded.last_played)''', rentang)
+            conn.execute('''INSERT INTO user_song_plays (user_email, song_id, plays, last_played)
+                            SELECT user_email, song_id, COUNT(*), MAX(played_at) FROM play_events
+                            WHERE id > ? AND id <= ? GROUP BY user_email, song_id
+                            ON CONFLICT(user_email, song_id) DO UPDATE SET plays = plays + excluded.plays,
+                                last_played = MAX(last_played, excluded.last_played)''', rentang)
+            conn.execute("UPDATE rollup_state SET last_event_id=? WHERE name='plays'", (sampai,))
+        return sampai - dari
+
+    def tutup(self):
+        # Proses yang tidak pernah memutar lagu (mis. hanya `import models`)
+        # tidak membuka database saat exit
+        if not self.ada_event:
+            return
+        try:
+            self.flush()
+            self.rollup()
+        except Exception:
+            logger.exception("gagal menyimpan riwayat putar")
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self.lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="play-log-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        rollup_berikutnya = time.monotonic() + self.rollup_interval
+        while True:
+            self.bangun.wait(self.flush_interval)
+            self.bangun.clear()
+            try:
+                self.flush()
+                if time.monotonic() >= rollup_berikutnya:
+                    rollup_berikutnya = time.monotonic() + self.rollup_interval
+                    self.rollup()
+            except Exception:
+                logger.exception("flush/rollup gagal")
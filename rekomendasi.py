@@ -0,0 +1,201 @@
+"""Rekomendasi "lagu berikutnya" dari co-occurrence playlist.
+
+Dua lagu dianggap mirip jika sering muncul di playlist yang sama. Skornya
+cosine antar kolom matriks playlist x lagu:
+
+    skor(a, b) = playlist berisi a dan b / sqrt(playlist(a) * playlist(b))
+
+Matriks disimpan sparse dua arah: tiap playlist punya array index lagu dan
+tiap lagu punya array id playlist. Baris co-occurrence satu lagu dihitung
+sekaligus dengan Counter.update atas isi playlist-nya (loop di C), lalu hanya
+top_k lagu terbaik yang disimpan; /next cukup mengambil daftar itu.
+
+Perubahan playlist memperbarui kedua array secara inkremental dan menandai
+lagu-lagu di playlist tersebut kotor; top-k lagu kotor dihitung ulang saat
+diminta berikutnya. Indeks dimuat dari playlist_songs di thread latar saat
+pertama dipakai, tanpa memegang lock selama scan; selama belum siap mirip()
+mengembalikan list kosong (next memakai fallback genre), jadi request tidak
+menunggu pemuatan.
+"""
+import logging
+import math
+import threading
+from array import array
+from collections import Counter
+from heapq import nlargest
+
+TOP_K = 20
+# Playlist sangat panjang (mis. "semua lagu") hampir tidak memberi sinyal,
+# tapi biayanya kuadratik; tidak dihitung sebagai co-occurrence
+MAX_PLAYLIST_LEN = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class Rekomendasi:
+    def __init__(self, get_connection, top_k=TOP_K):
+        self.get_connection = get_connection
+        self.top_k = top_k
+        self.lock = threading.RLock()
+        self._loader = None
+        self.generasi = 0        # naik setiap reset; hasil muat dari generasi lama dibuang
+        self.reset()
+
+    def reset(self):
+        """Buang indeks; dimuat ulang dari database saat dipakai lagi."""
+        with self.lock:
+            self.dimuat = False
+            self.generasi += 1
+            self.tertunda = None     # perubahan selama muat() berjalan (None = tidak sedang memuat)
+            self.idx = {}            # song id -> index
+            self.ids = []            # index -> song id
+            self.playlist_lagu = []  # index lagu -> array id playlist
+            self.isi_playlist = {}   # id playlist -> array index lagu
+            self.top = {}            # index lagu -> array index lagu mirip (skor menurun)
+            self.kotor = set()       # index lagu yang top-k-nya harus dihitung ulang
+
+    def muat(self):
+        # Scan playlist_songs tanpa lock (tambah/hapus/mirip dari request tidak
+        # menunggu); perubahan yang datang selama scan dicatat di `tertunda`
+        # lalu diulang setelah hasilnya dipasang (tambah/hapus idempoten)
+        with self.lock:
+            if self.dimuat:
+                return
+            generasi = self.generasi
+            if self.tertunda is None:
+                self.tertunda = []
+        idx, ids, playlist_lagu, isi_playlist = {}, [], [], {}
+        with self.get_connection() as conn:
+            rows = conn.execute("SELECT playlist_id, song_id FROM playlist_songs ORDER BY playlist_id, position")
+            for playlist_id, song_id in rows:
+                i = idx.get(song_id)
+                if i is None:
+                    i = idx[song_id] = len(ids)
+                    ids.append(song_id)
+                    playlist_lagu.append(array('q'))
+                isi = isi_playlist.get(playlist_id)
+                if isi is None:
+                    isi = isi_playlist[playlist_id] = array('i')
+                isi.append(i)
+                playlist_lagu[i].append(playlist_id)
+        with self.lock:
+            if self.dimuat or generasi != self.generasi:
+                return   # didahului muat lain, atau reset() selama scan
+            self.idx, self.ids, self.playlist_lagu, self.isi_playlist = idx, ids, playlist_lagu, isi_playlist
+            self.top, self.kotor = {}, set()
+            tertunda, self.tertunda = self.tertunda, None
+            self.dimuat = True
+            for fn, args in tertunda:
+                fn(*args)
+
+    def _tunda(self, fn, *args):
+        # Dipanggil di bawah lock saat indeks belum dimuat. Mengembalikan True
+        # jika perubahan harus menunggu (dicatat bila muat() sedang berjalan).
+        if self.dimuat:
+            return False
+        if self.tertunda is not None:
+            self.tertunda.append((fn, args))
+        return True
+
+    def _muat_latar(self):
+        if self._loader is not None and self._loader.is_alive():
+            return
+        with self.lock:
+            if self.dimuat or (self._loader is not None and self._loader.is_alive()):
+                return
+            self._loader = threading.Thread(target=self._muat_aman, name="rekomendasi-loader", daemon=True)
+            self._loader.start()
+
+    def _muat_aman(self):
+        try:
+            self.muat()
+        except Exception:
+            logger.exception("gagal memuat indeks rekomendasi")
+
+    def _indeks(self, song_id):
+        i = self.idx.get(song_id)
+        if i is None:
+            i = self.idx[song_id] = len(self.ids)
+            self.ids.append(song_id)
+            self.playlist_lagu.append(array('q'))
+        return i
+
+    def _hitung(self, i):
+        co = Counter()
+        for playlist_id in self.playlist_lagu[i]:
+            isi = self.isi_playlist[playlist_id]
+            if len(isi) <= MAX_PLAYLIST_LEN:
+                co.update(isi)
+        co.pop(i, None)
+        # sqrt(playlist(a)) sama untuk semua kandidat, cukup bagi dengan sqrt(playlist(b))
+        playlist_lagu = self.playlist_lagu
+        terbaik = nlargest(self.top_k, co.items(), key=lambda kv: kv[1] / math.sqrt(len(playlist_lagu[kv[0]])))
+        self.top[i] = array('i', [j for j, _ in terbaik])
+        self.kotor.discard(i)
+
+    def hitung_semua(self):
+        """Hitung top-k semua lagu sekaligus (mis. setelah import besar)."""
+        with self.lock:
+            self.muat()
+            for i, playlist in enumerate(self.playlist_lagu):
+                if playlist:
+                    self._hitung(i)
+                else:
+                    self.top.pop(i, None)
+            self.kotor.clear()
+
+    def mirip(self, song_id):
+        """List song id paling mirip dengan `song_id`, skor menurun (maks top_k)."""
+        if not self.dimuat:
+            self._muat_latar()
+            return []
+        i = self.idx.get(song_id)
+        if i is None:
+            return []
+        top = self.top.get(i)
+        if top is None or i in self.kotor:
+            with self.lock:
+                self._hitung(i)
+                top = self.top[i]
+        ids = self.ids
+        return [ids[j] for j in top]
+
+    # --- Update inkremental (dipanggil setelah tabel playlist_songs berubah) ---
+    def tambah(self, playlist_id, song_id):
+        with self.lock:
+            if self._tunda(self.tambah, playlist_id, song_id):
+                return
+            i = self._indeks(song_id)
+            isi = self.isi_playlist.get(playlist_id)
+            if isi is None:
+                isi = self.isi_playlist[playlist_id] = array('i')
+            if i in isi:
+                return
+            isi.append(i)
+            self.playlist_lagu[i].append(playlist_id)
+            self.kotor.update(isi)
+
+    def hapus(self, playlist_id, song_id):
+        with self.lock:
+            if self._tunda(self.hapus, playlist_id, song_id):
+                return
+            i = self.idx.get(song_id)
+            isi = self.isi_playlist.get(playlist_id)
+            if i is None or isi is None or i not in isi:
+                return
+            isi.remove(i)
+            self.playlist_lagu[i].remove(playlist_id)
+            self.kotor.update(isi)
+            self.kotor.add(i)
+
+    def hapus_lagu(self, song_id):
+        # Lagu dihapus dari katalog: playlist_songs ikut terhapus (cascade)
+        with self.lock:
+            if self._tunda(self.hapus_lagu, song_id):
+                return
+            i = self.idx.get(song_id)
+            if i is None:
+                return
+            for playlist_id in list(self.playlist_lagu[i]):
+                self.hapus(playlist_id, song_id)
+            self.top.pop(i, None)
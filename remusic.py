@@ -0,0 +1,169 @@
+"""Alat command line REMusic untuk import/export katalog lagu.
+
+Jalankan: python -m remusic import katalog.csv
+          python -m remusic import katalog.jsonl --batch 10000
+          python -m remusic export katalog.jsonl
+          python -m remusic export - --format csv      (ke stdout)
+          REMUSIC_DB=lain.db python -m remusic import katalog.csv
+
+Kolom: id, judul, artis, album, durasi, genre, image, audio. `judul` dan `artis`
+wajib; id kosong dibuat otomatis, album default "Single". Durasi diterima
+sebagai "m:ss", "h:mm:ss" atau jumlah detik dan disimpan sebagai "m:ss".
+Lagu dengan id yang sudah ada diperbarui.
+
+Input dibaca baris per baris dan ditulis per batch, jadi katalog besar tidak
+perlu dimuat ke memori. Library dan indeks pencarian dibangun ulang sekali di
+akhir import. Server yang sedang berjalan punya library sendiri di memori;
+gunakan tombol Resync di dashboard admin setelah import.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+import uuid
+
+from models import store, Lagu, normalisasi_genre, parse_durasi, format_durasi, BULK_BATCH_SIZE
+
+KOLOM = ['id', 'judul', 'artis', 'album', 'durasi', 'genre', 'image', 'audio']
+
+
+class BarisTidakValid(ValueError):
+    pass
+
+
+def normalisasi_durasi(durasi):
+    # "3:05" / "1:02:03" / "185" / 185 -> "3:05"
+    detik = parse_durasi(durasi)
+    if detik is None:
+        raise BarisTidakValid(f"durasi tidak valid: {durasi!r}")
+    return format_durasi(detik)
+
+
+def baris_ke_lagu(row):
+    judul = (row.get('judul') or '').strip()
+    artis = (row.get('artis') or '').strip()
+    if not judul or not artis:
+        raise BarisTidakValid("judul dan artis wajib diisi")
+    genre = normalisasi_genre(row.get('genre'))
+    if not genre:
+        raise BarisTidakValid("genre wajib diisi")
+    # id 8 karakter seperti form admin mulai bertabrakan di katalog ratusan ribu lagu
+    return Lagu((row.get('id') or '').strip() or uuid.uuid4().hex[:12],
+                judul, artis,
+                (row.get('album') or '').strip() or "Single",
+                normalisasi_durasi(row.get('durasi')),
+                genre,
+                (row.get('image') or '').strip() or None,
+                (row.get('audio') or '').strip() or None)
+
+
+def deteksi_format(path, format):
+    if format:
+        return format
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+
+
+def baca_baris(f, format):
+    # Generator (nomor baris, dict); baris JSON rusak diteruskan sebagai error
+    if format == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for nomor, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield nomor, BarisTidakValid(f"JSON tidak valid: {e}")
+                continue
+            yield nomor, row if isinstance(row, dict) else BarisTidakValid("baris bukan objek JSON")
+
+
+def lagu_valid(rows, statistik, strict):
+    for nomor, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            yield baris_ke_lagu(row)
+        except BarisTidakValid as e:
+            if strict:
+                raise BarisTidakValid(f"baris {nomor}: {e}")
+            statistik['dilewati'] += 1
+            print(f"baris {nomor} dilewati: {e}", file=sys.stderr)
+
+
+def buka(path, mode):
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def cmd_import(args):
+    format = deteksi_format(args.file, args.format)
+    statistik = {'dilewati': 0}
+    mulai = time.perf_counter()
+    f = buka(args.file, 'r')
+    try:
+        total = store.add_songs_bulk(lagu_valid(baca_baris(f, format), statistik, args.strict), args.batch)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    durasi = time.perf_counter() - mulai
+    print(f"{total} lagu diimport ({statistik['dilewati']} dilewati) dalam {durasi:.2f} s "
+          f"({total / durasi if durasi else 0:.0f} baris/s)", file=sys.stderr)
+
+
+def cmd_export(args):
+    format = deteksi_format(args.file, args.format)
+    mulai = time.perf_counter()
+    total = 0
+    f = buka(args.file, 'w')
+    try:
+        if format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(KOLOM)
+            for row in store.iter_songs(args.batch):
+                writer.writerow(row)
+                total += 1
+        else:
+            for row in store.iter_songs(args.batch):
+                f.write(json.dumps(dict(zip(KOLOM, row)), ensure_ascii=False) + "\n")
+                total += 1
+    finally:
+        if f is sys.stdout:
+            f.flush()
+        else:
+            f.close()
+    durasi = time.perf_counter() - mulai
+    print(f"{total} lagu diexport dalam {durasi:.2f} s ({total / durasi if durasi else 0:.0f} baris/s)",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m remusic", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="import katalog dari CSV/JSONL")
+    p.add_argument("file", help="path file, atau - untuk stdin")
+    p.add_argument("--format", choices=["csv", "jsonl"])
+    p.add_argument("--batch", type=int, default=BULK_BATCH_SIZE, help="jumlah baris per transaksi")
+    p.add_argument("--strict", action="store_true", help="berhenti pada baris tidak valid pertama (batch sebelumnya tetap tersimpan)")
+    p = sub.add_parser("export", help="export katalog ke CSV/JSONL")
+    p.add_argument("file", help="path file, atau - untuk stdout")
+    p.add_argument("--format", choices=["csv", "jsonl"])
+    p.add_argument("--batch", type=int, default=BULK_BATCH_SIZE)
+    args = parser.parse_args()
+    try:
+        if args.cmd == "import":
+            cmd_import(args)
+        else:
+            cmd_export(args)
+    except BarisTidakValid as e:
+        sys.exit(f"import dibatalkan, {e}")
+
+
+if __name__ == "__main__":
+    main()
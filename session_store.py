@@ -0,0 +1,386 @@
+"""Penyimpanan state UserSession (queue, history, lagu aktif).
+
+`SessionManager` menggantikan dict `active_sessions`: session aktif disimpan
+di memori (LRU, jumlahnya dibatasi) dan perubahan ditulis ke backend secara
+berkala dalam satu batch (write-behind). Backend yang tersedia:
+
+- MemoryBackend  : hanya di proses ini (perilaku lama)
+- SQLiteBackend  : tabel session_state di database aplikasi
+- RedisBackend   : server Redis (atau apa pun yang bicara protokol RESP)
+
+State diserialisasi sebagai JSON ringkas berisi id lagu saja, bukan objek Lagu.
+Dengan beberapa worker, session yang tidak sedang diubah disegarkan dari
+backend setelah `max_age` detik sehingga semua worker melihat state yang sama.
+Hanya jalur yang benar-benar mengubah session memanggil `tandai()`, jadi
+request baca (mis. GET /main) tidak menimpa state yang lebih baru dari worker
+lain dengan salinan lama.
+"""
+import atexit
+import json
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ACTIVE_SESSIONS = 1000
+FLUSH_INTERVAL = 2.0
+SESSION_MAX_AGE = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+def encode_state(state):
+    return json.dumps(state, separators=(",", ":"))
+
+
+def decode_state(data):
+    return json.loads(data) if data else None
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.data = {}
+
+    def load(self, email):
+        return decode_state(self.data.get(email))
+
+    def save_many(self, states):
+        for email, state in states.items():
+            self.data[email] = encode_state(state)
+
+    def delete(self, email):
+        self.data.pop(email, None)
+
+
+class SQLiteBackend:
+    def __init__(self, get_connection):
+        self._get_connection = get_connection
+        self._siap = False
+
+    def get_connection(self):
+        # Tabel dibuat saat pertama dipakai, bukan saat backend dibuat
+        # (membuat DatabaseManager tidak menyentuh database)
+        if not self._siap:
+            with self._get_connection() as conn:
+                conn.execute('''CREATE TABLE IF NOT EXISTS session_state
+                                (email TEXT PRIMARY KEY, state TEXT, updated_at REAL)''')
+            self._siap = True
+        return self._get_connection()
+
+    def load(self, email):
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT state FROM session_state WHERE email=?", (email,)).fetchone()
+        return decode_state(row[0]) if row else None
+
+    def save_many(self, states):
+        now = time.time()
+        with self.get_connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO session_state (email, state, updated_at) VALUES (?, ?, ?)",
+                             [(email, encode_state(state), now) for email, state in states.items()])
+
+    def delete(self, email):
+        with self.get_connection() as conn:
+            conn.execute("DELETE FROM session_state WHERE email=?", (email,))
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend:
+    """Klien RESP minimal (GET/SET/DEL), tanpa dependensi tambahan.
+
+    Semua SET dalam satu flush dikirim sebagai pipeline dalam satu round trip."""
+
+    def __init__(self, host="localhost", port=6379, prefix="remusic:session:", ttl=7 * 24 * 3600):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.ttl = ttl
+        self.sock = None
+        self.reader = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url):
+        # redis://host:port
+        hostport = url.split("://", 1)[1].rstrip("/")
+        host, _, port = hostport.partition(":")
+        return cls(host or "localhost", int(port or 6379))
+
+    def _connect(self):
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, timeout=5)
+            self.reader = self.sock.makefile("rb")
+
+    def _encode(self, *args):
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise RedisError("koneksi ditutup server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self.reader.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            return [self._read_reply() for _ in range(int(rest))]
+        raise RedisError(f"balasan tidak dikenal: {line!r}")
+
+    def _pipeline(self, commands):
+        with self.lock:
+            try:
+                self._connect()
+                self.sock.sendall(b"".join(self._encode(*cmd) for cmd in commands))
+                return [self._read_reply() for _ in commands]
+            except (OSError, RedisError):
+                self.close()
+                raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = self.reader = None
+
+    def load(self, email):
+        data = self._pipeline([("GET", self.prefix + email)])[0]
+        return decode_state(data.decode()) if data else None
+
+    def save_many(self, states):
+        if states:
+            self._pipeline([("SET", self.prefix + email, encode_state(state), "EX", self.ttl)
+                            for email, state in states.items()])
+
+    def delete(self, email):
+        self._pipeline([("DEL", self.prefix + email)])
+
+
+class SessionManager:
+    """Pengganti dict `active_sessions` dengan LRU dan write-behind.
+
+    Mendukung operasi dict yang dipakai app (`in`, `[]`, `[]=`, `get`, `pop`).
+    `to_state(session)` dan `from_state(state)` mengubah UserSession ke/dari
+    dict yang bisa diserialisasi; `perbarui(session, state)` mengganti isi
+    session yang sudah ada dengan state dari backend (session harus punya
+    atribut `lock`). Session hanya ditulis ke backend setelah ditandai berubah
+    lewat `tandai()`."""
+
+    def __init__(self, backend, to_state, from_state, perbarui, capacity=MAX_ACTIVE_SESSIONS,
+                 flush_interval=FLUSH_INTERVAL, max_age=SESSION_MAX_AGE):
+        self.backend = backend
+        self.to_state = to_state
+        self.from_state = from_state
+        self.perbarui = perbarui
+        self.capacity = capacity
+        self.max_age = max_age
+        self.sessions = OrderedDict()   # email -> (UserSession, waktu dimuat)
+        self.dirty = set()
+        self.ditulis = set()            # email yang sedang ditulis oleh flush
+        # Session berubah yang sudah keluar dari LRU (tergusur/pop), menunggu flush.
+        # to_state() mengambil lock session, jadi tidak pernah dipanggil di bawah
+        # self.lock: jalur yang mengubah session memanggil tandai() sambil
+        # memegang lock session.
+        self.keluar = {}
+        self.lock = threading.RLock()
+        self.flush_interval = flush_interval
+        self._writer = None
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _segar(self, email, entry):
+        return email in self.dirty or time.monotonic() - entry[1] < self.max_age \
+            or isinstance(self.backend, MemoryBackend)
+
+    def _load(self, email):
+        with self.lock:
+            entry = self.sessions.get(email)
+            if entry and self._segar(email, entry):
+                self.sessions.move_to_end(email)
+                return entry[0]
+            if entry is None and email in self.keluar:
+                # Belum ditulis ke backend: versi di memori yang terbaru
+                user = self.keluar[email]
+                self._put(email, user)
+                return user
+        # Backend dibaca di luar lock manager
+        try:
+            state = self.backend.load(email)
+        except Exception:
+            logger.exception("gagal memuat session %s", email)
+            state = None
+        if entry:
+            # Session bersih yang sudah lama dimuat disegarkan dari backend agar
+            # perubahan dari worker lain terlihat. Isinya diganti di tempat:
+            # request yang sedang memegang objek ini tidak menulis ke salinan lama.
+            user = entry[0]
+            if state is not None:
+                with user.lock:
+                    # Perubahan lokal yang belum/sedang ditulis lebih baru dari backend
+                    if email not in self.dirty and email not in self.ditulis:
+                        self.perbarui(user, state)
+        elif state is None:
+            return None
+        else:
+            user = self.from_state(state)
+        with self.lock:
+            entry = self.sessions.get(email)
+            if entry and entry[0] is not user:
+                # Thread lain memuat session yang sama lebih dulu
+                self.sessions.move_to_end(email)
+                return entry[0]
+            self._put(email, user)
+        self._tulis_keluar()
+        return user
+
+    def _put(self, email, user):
+        self.sessions[email] = (user, time.monotonic())
+        self.sessions.move_to_end(email)
+        while len(self.sessions) > self.capacity:
+            old_email, (old_user, _) = self.sessions.popitem(last=False)
+            if old_email in self.dirty:
+                self.keluar[old_email] = old_user
+
+    def cached(self, email):
+        """UserSession di memori jika bisa dipakai tanpa membaca backend, selain itu None."""
+        with self.lock:
+            entry = self.sessions.get(email)
+            if entry and self._segar(email, entry):
+                self.sessions.move_to_end(email)
+                return entry[0]
+        return None
+
+    def __contains__(self, email):
+        return self._load(email) is not None
+
+    def __getitem__(self, email):
+        user = self._load(email)
+        if user is None:
+            raise KeyError(email)
+        return user
+
+    def get(self, email, default=None):
+        user = self._load(email)
+        return default if user is None else user
+
+    def __setitem__(self, email, user):
+        with self.lock:
+            self.keluar.pop(email, None)
+            self._put(email, user)
+            self.tandai(email)
+        self._tulis_keluar()
+
+    def setdefault(self, email, user):
+        """Session yang sudah ada, atau pasang `user` jika belum ada (atomik:
+        dua request bersamaan tidak membuat dua UserSession untuk email sama)."""
+        existing = self._load(email)
+        if existing is not None:
+            return existing
+        with self.lock:
+            entry = self.sessions.get(email)
+            if entry:
+                return entry[0]
+            self._put(email, user)
+            self.tandai(email)
+        self._tulis_keluar()
+        return user
+
+    def pop(self, email, default=None):
+        with self.lock:
+            entry = self.sessions.pop(email, None)
+            if entry and email in self.dirty:
+                self.keluar[email] = entry[0]
+        self._tulis_keluar()
+        return entry[0] if entry else default
+
+    def _tulis_keluar(self):
+        # Session berubah yang keluar dari LRU ditulis segera (di luar self.lock)
+        if self.keluar:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("flush session gagal")
+
+    def tandai(self, email, user=None):
+        """Tandai session berubah; ditulis ke backend pada flush berikutnya.
+        Boleh dipanggil sambil memegang lock session (tidak pernah menulis)."""
+        with self.lock:
+            if user is not None and email not in self.sessions and email not in self.keluar:
+                # Session yang dipegang request ini sudah tergusur LRU; masukkan lagi
+                # lewat _put agar kapasitas tetap terjaga. Session berubah yang
+                # tergusur karenanya masuk self.keluar dan ditulis oleh writer.
+                self._put(email, user)
+            if email in self.sessions or email in self.keluar:
+                self.dirty.add(email)
+        self._start_writer()
+
+    def flush(self):
+        with self.lock:
+            tulis = {}
+            for email in self.dirty:
+                entry = self.sessions.get(email)
+                user = entry[0] if entry else self.keluar.get(email)
+                if user is not None:
+                    tulis[email] = user
+            self.dirty.clear()
+            self.ditulis.update(tulis)
+        if not tulis:
+            return
+        try:
+            # Perubahan setelah titik ini menandai session dirty lagi (flush berikutnya)
+            self.backend.save_many({email: self.to_state(user) for email, user in tulis.items()})
+        except Exception:
+            # Jangan hilangkan perubahan; coba lagi pada flush berikutnya
+            with self.lock:
+                self.dirty.update(tulis)
+            raise
+        finally:
+            with self.lock:
+                self.ditulis.difference_update(tulis)
+        with self.lock:
+            for email, user in tulis.items():
+                if self.keluar.get(email) is user and email not in self.dirty:
+                    del self.keluar[email]
+
+    def _start_writer(self):
+        if self._writer is not None or isinstance(self.backend, MemoryBackend):
+            return
+        with self.lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="session-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("flush session gagal")
+
+
+def buat_backend(url, get_connection):
+    """Backend dari string konfigurasi: memory | sqlite | redis://host:port"""
+    if not url or url == "memory":
+        return MemoryBackend()
+    if url == "sqlite":
+        return SQLiteBackend(get_connection)
+    if url.startswith("redis://"):
+        return RedisBackend.from_url(url)
+    raise ValueError(f"Session backend tidak dikenal: {url}")
@@ -0,0 +1,71 @@
+"""Snapshot library di disk untuk cold start cepat.
+
+File `<database>.library` menyimpan isi tabel songs per kolom. Kolom yang
+nilainya banyak berulang (artis, album, genre) disimpan sekali per nilai unik
+ditambah array kode. Semuanya diserialisasi dengan marshal, jadi memuat
+100 ribu lagu cukup beberapa kali alokasi list, tanpa query dan tanpa parsing
+per baris.
+
+Header berisi kunci katalog: uid database dan nomor versi dari catalog_state.
+Nomor versi dinaikkan trigger setiap INSERT/UPDATE/DELETE pada songs, dari
+proses mana pun (server, CLI import, sqlite3 manual). Snapshot dengan kunci
+atau versi Python yang berbeda dianggap basi, dan library dimuat dari database.
+"""
+import marshal
+import os
+import struct
+import sys
+import threading
+from array import array
+
+SUFFIX = ".library"
+MAGIC = b"REMLIB1\n"
+FORMAT = 1
+KOLOM = ('id', 'judul', 'artis', 'album', 'durasi', 'genre', 'image', 'audio')
+# Kolom dengan sedikit nilai unik: disimpan sebagai (nilai unik, kode)
+KOLOM_KODE = ('artis', 'album', 'genre')
+
+
+def _kode(values):
+    unik = {}
+    kode = array('I', [unik.setdefault(v, len(unik)) for v in values])
+    return list(unik), kode.tobytes()
+
+
+def _dekode(unik, kode):
+    a = array('I')
+    a.frombytes(kode)
+    return [unik[i] for i in a]
+
+
+def simpan(path, kunci, kolom):
+    """Tulis snapshot (atomik: file sementara lalu rename).
+
+    kolom: dict nama kolom (KOLOM) -> list nilai, semua sama panjang."""
+    header = marshal.dumps((FORMAT, tuple(sys.version_info[:2]), tuple(kunci)))
+    isi = marshal.dumps({nama: _kode(kolom[nama]) if nama in KOLOM_KODE else kolom[nama] for nama in KOLOM})
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header + isi)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def muat(path, kunci):
+    """dict kolom dari snapshot, None jika tidak ada, rusak atau basi."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            panjang = struct.unpack('<I', f.read(4))[0]
+            format, python, k = marshal.loads(f.read(panjang))
+            if format != FORMAT or tuple(python) != tuple(sys.version_info[:2]) or tuple(k) != tuple(kunci):
+                return None
+            data = marshal.loads(f.read())
+        return {nama: _dekode(*data[nama]) if nama in KOLOM_KODE else data[nama] for nama in KOLOM}
+    except (OSError, EOFError, ValueError, TypeError, KeyError, IndexError, struct.error):
+        return None